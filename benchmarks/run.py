@@ -0,0 +1,174 @@
+"""Micro-benchmarks of the model and parameters hot paths
+
+Run from the root of the project:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json
+
+The results are written as JSON. With a baseline, each benchmark is compared to the baseline
+and the exit code is 1 if one of them got slower than the threshold.
+"""
+import argparse
+import datetime
+import io
+import json
+import logging
+import platform
+import statistics
+import sys
+import timeit
+import parameters_loader
+import model.shipdata as sd
+from model import coordinates
+from model.turrets_torps import Turret, Torpedo, occupied_mask, rel_tur_or_torp_position
+from benchmarks import synthetic
+
+DEFAULT_OUTPUT = "bench.json"
+# relative slowdown from the baseline reported as a regression
+DEFAULT_THRESHOLD = 0.25
+
+_REPEAT = 7
+_QUICK_REPEAT = 3
+# each measure lasts at least that long, in seconds
+_MIN_MEASURE_TIME = 0.05
+
+
+def _benchmarks(parameters):
+    """All the benchmarks
+
+    Returns:
+        dict {name: function without args that does the work once}
+    """
+    cases = {}
+
+    def add_ship_cases(ship_type, is_rtw2, points):
+        game = "rtw2" if is_rtw2 else "rtw1"
+        text = synthetic.make_ship_text(ship_type, is_rtw2, points)
+        ship_data = sd.ShipData(synthetic.ship_file(text), parameters)
+        cases[f"shipdata_init[{ship_type},{game},{points}pts]"] = (
+            lambda: sd.ShipData(synthetic.ship_file(text), parameters))
+        cases[f"write_as_ini[{ship_type},{game},{points}pts]"] = (
+            lambda: ship_data.write_as_ini(file_object=io.StringIO()))
+        structure = ship_data.structures[0]
+        cases[f"structure_as_ini_section[{game},{points}pts]"] = structure.as_ini_section
+
+    for ship_type, is_rtw2 in synthetic.all_variants():
+        add_ship_cases(ship_type, is_rtw2, synthetic.max_points(is_rtw2))
+    for points in (1, 10):
+        add_ship_cases("BB", True, points)
+
+    turrets = {"A": 2, "B": 2, "C": 3, "X": 2, "Y": 3}
+    cases["turret_init"] = lambda: [Turret(12, pos, guns, 200, turrets, parameters)
+                                    for pos, guns in turrets.items()]
+    mount = {"Pos": "D", "Tubes": "3"}
+    cases["torpedo_init"] = lambda: Torpedo(mount, 200, parameters)
+
+    def turrets_positions():
+        # as ShipData does: the mask of the used positions is computed once per ship
+        occupied = occupied_mask(turrets)
+        return [rel_tur_or_torp_position(pos, occupied, parameters) for pos in turrets]
+    cases["rel_tur_or_torp_position"] = turrets_positions
+
+    angles = list(range(-1000000000, 1000000000, 2000000))
+    distances = [5000]*len(angles)
+    # points placed in the editor are on the integer grid of the funnel coordinates
+    xs, ys = coordinates.to_funnel(angles, distances, rounded=True)
+    cases["coordinates_to_funnel[1000pts]"] = lambda: coordinates.to_funnel(angles, distances)
+    cases["coordinates_to_rtw[1000pts]"] = lambda: coordinates.to_rtw(xs, ys)
+
+    cases["parameters_init"] = lambda: parameters_loader.Parameters("")
+
+    def cold_parameters():
+        store = parameters_loader.STORE
+        parameters_loader.STORE = parameters_loader.ParameterStore()
+        try:
+            parameters_loader.Parameters("")
+        finally:
+            parameters_loader.STORE = store
+    cases["parameters_init_cold"] = cold_parameters
+    return cases
+
+
+def measure(function, repeat):
+    """Time a function
+
+    Returns:
+        dict with the best and median time per call in microseconds
+    """
+    timer = timeit.Timer(function)
+    number, _time = timer.autorange()
+    number = max(1, int(number*_MIN_MEASURE_TIME/0.2))
+    times = [time/number*1e6 for time in timer.repeat(repeat=repeat, number=number)]
+    return {"min_us": min(times), "median_us": statistics.median(times),
+            "number": number, "repeat": repeat}
+
+
+def run(name_filter=None, repeat=_REPEAT):
+    """Run the benchmarks whose name contains name_filter
+
+    Returns:
+        dict, the content of the JSON file
+    """
+    parameters = parameters_loader.Parameters("")
+    results = {}
+    for name, function in _benchmarks(parameters).items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = measure(function, repeat)
+        print(f"{name:<45} {results[name]['min_us']:>12.1f} us", flush=True)
+    return {"meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "numpy": coordinates.get_numpy() is not None},
+            "results": results}
+
+
+def compare(results, baseline, threshold):
+    """Compare the results to a baseline, on the best time of each benchmark
+
+    Returns:
+        list of the names of the benchmarks slower than the baseline by more than threshold
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:<45} new")
+            continue
+        ratio = result["min_us"]/baseline["results"][name]["min_us"] - 1.0
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<45} {ratio:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    """Command line interface, see the module docstring"""
+    parser = argparse.ArgumentParser(prog="benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results")
+    parser.add_argument("--baseline", help="results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as a regression, 0.25 means 25%%")
+    parser.add_argument("--filter", help="only run the benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions")
+    args = parser.parse_args(argv)
+
+    # the cold parameters benchmark warns about the missing recent files at each run
+    logging.disable(logging.WARNING)
+    results = run(args.filter, _QUICK_REPEAT if args.quick else _REPEAT)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print(f"\ncompared to {args.baseline}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Synthetic ship files for the benchmarks
+
+The files look like the ones saved by RTW1 and RTW2, with random but reproducible content.
+"""
+import io
+import random
+import schemas
+from model.structure import STRUCTURE_POINTS_MAX_RTW1, STRUCTURE_POINTS_MAX_RTW2
+
+# displacement that gives a valid length for each ship type, see data/lengths.json
+_DISPLACEMENTS = {"BB": 30000, "BC": 28000, "B": 15000, "CA": 11000,
+                  "CL": 4000, "DD": 900, "MS": 500, "AMC": 8000}
+
+# turret positions that are drawn, and the other mounts
+_TURRET_POSITIONS = ["A", "B", "C", "X", "Y", "W", "V", "R"]
+_MOUNT_POSITIONS = ["D", "E", "F", "G", "H", "I"]
+
+STRUCTURES_PER_SHIP = 3
+FUNNELS_PER_SHIP = 2
+
+
+def max_points(is_rtw2):
+    """Most points a structure can have in a file"""
+    return STRUCTURE_POINTS_MAX_RTW2 if is_rtw2 else STRUCTURE_POINTS_MAX_RTW1
+
+
+def make_ship_text(ship_type="BC", is_rtw2=False, points=None, seed=0):
+    """Content of a ship file
+
+    Args:
+        ship_type (str): one of schemas.SHIP_TYPES
+        is_rtw2 (bool): RTW2 file, with the FlightDeck option and polar funnel coordinates
+        points (int): points per structure, all the possible points if None
+        seed (int): seed of the random content
+    Returns:
+        str
+    """
+    rand = random.Random(seed)
+    if points is None:
+        points = max_points(is_rtw2)
+    lines = ["[Data]", "PictureName=", f"ShipType={ship_type}",
+             f"Displacement={_DISPLACEMENTS[ship_type]}"]
+    if is_rtw2:
+        lines.append("FlightDeck=0")
+    lines += ["", "[Guns]", "TurretStyle=1", f"Main={rand.randint(3, 18)}", ""]
+
+    for index, position in enumerate(rand.sample(_TURRET_POSITIONS, 5)):
+        lines += [f"[Turret{index + 1}]", f"Pos={position}", f"Guns={rand.randint(1, 4)}", ""]
+    for index, position in enumerate(rand.sample(_MOUNT_POSITIONS, 2)):
+        lines += [f"[TorpedoMount{index + 1}]", f"Pos={position}",
+                  f"Tubes={rand.randint(1, 4)}", ""]
+
+    lines.append("[Funnels]")
+    for index in range(1, FUNNELS_PER_SHIP + 1):
+        if is_rtw2:
+            lines += [f"Funnel{index}Angle={rand.randint(-1500000000, 1500000000)}",
+                      f"Funnel{index}Distance={rand.randint(0, 3000)}"]
+        else:
+            lines.append(f"Funnel{index}Pos={rand.randint(-60, 60)}")
+        lines.append(f"Funnel{index}Oval={rand.randint(0, 1)}")
+    lines.append("")
+
+    for index in range(1, STRUCTURES_PER_SHIP + 1):
+        lines.append(f"[Superstructure{index}]")
+        for point in range(max_points(is_rtw2)):
+            if point < points:
+                angle = rand.randint(-3000000000, 3000000000)
+                distance = rand.randint(1, 9000)
+            else:
+                angle = distance = 0
+            lines += [f"Point{point}Angle={angle}", f"Point{point}Distance={distance}"]
+        lines += [f"IsLine={rand.randint(0, 1)}", ""]
+    return "\n".join(lines)
+
+
+def ship_file(text, name="synthetic.00d"):
+    """A file-like object that ShipData can read, without touching the disk"""
+    file = io.StringIO(text)
+    file.name = name
+    return file
+
+
+def all_variants():
+    """(ship_type, is_rtw2) for all the ship types and both games"""
+    return [(ship_type, is_rtw2) for ship_type in schemas.SHIP_TYPES
+            for is_rtw2 in (False, True)]
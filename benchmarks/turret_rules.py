@@ -0,0 +1,124 @@
+"""Exhaustive check of the turret position rules against the game's logic
+
+The rules of data/turrets_rules.json and schemas.DEFAULT_TURRETS_RULES, compiled to a
+PositionRules, must choose the same position as the if/elif chain they replace, kept here
+as the reference. Every subset of the turrets the rules look at is checked, alone and
+with each of the other turret positions, for every turret position.
+
+Run from the root of the project:
+    python -m benchmarks.turret_rules
+
+The exit code is 1 if a combination gives another position than the reference.
+"""
+import argparse
+import itertools
+import json
+import sys
+import schemas
+from model.turrets_torps import PositionRules, occupied_mask
+
+# the turrets the reference logic looks at
+_RULES_TURRETS = ["A", "B", "C", "R", "V", "W", "X", "Y"]
+
+
+def reference_position_index(pos, all_turrs):
+    """The game's logic, as the former rel_tur_or_torp_position if/elif chain
+
+    Args:
+        pos (string): the letter of the turret
+        all_turrs (set[string]): the turret positions used on the ship
+    Returns:
+        index in the turret's positions list of turrets_positions.json
+    """
+    index = 0
+
+    if pos == "X":
+        if ("W" in all_turrs or "V" in all_turrs or
+                "R" in all_turrs or "C" in all_turrs):
+            index = 1
+
+    elif pos == "W":
+        if ("X" in all_turrs or "V" in all_turrs or "B" in all_turrs):
+            index = 1
+
+    elif pos == "A":
+        if ("V" in all_turrs or
+                {"W", "X", "Y"}.issubset(all_turrs) or
+                "C" in all_turrs and "X" in all_turrs or
+                "B" in all_turrs and "R" in all_turrs and (
+                    ("W" in all_turrs or "X" in all_turrs or "Y" in all_turrs))):
+            index = 2
+        elif ("X" in all_turrs or "W" in all_turrs or
+              "B" in all_turrs and ("C" in all_turrs or "R" in all_turrs or "W" in all_turrs)):
+            index = 1
+
+    elif pos == "B":
+        if ("V" in all_turrs or
+                "W" in all_turrs or
+                "C" in all_turrs and ("X" in all_turrs or "Y" in all_turrs) or
+                "A" in all_turrs and "R" in all_turrs and ("X" in all_turrs or "Y" in all_turrs)):
+            index = 2
+        elif ("X" in all_turrs or "Y" in all_turrs or "C" in all_turrs or "R" in all_turrs):
+            index = 1
+
+    elif pos == "Y":
+        if (("X" in all_turrs and "W" in all_turrs) or
+                ("V" in all_turrs and "W" in all_turrs)):
+            index = 3
+        elif ("V" in all_turrs or "W" in all_turrs or
+              ({"A", "B", "C"}.issubset(all_turrs)) or
+              ({"A", "B", "R"}.issubset(all_turrs))):
+            index = 2
+        elif ("B" in all_turrs or "C" in all_turrs or "R" in all_turrs or "X" in all_turrs):
+            index = 1
+    return index
+
+
+def check(rules):
+    """Compare compiled rules with the reference logic
+
+    Args:
+        rules (dict): see schemas.TURRETS_RULES_SCHEMA
+    Returns:
+        (number of combinations checked, list of (pos, turrets, expected, got))
+    """
+    position_rules = PositionRules(rules)
+    others = [None] + [turret for turret in schemas.TURRETS if turret not in _RULES_TURRETS]
+    checked = 0
+    mismatches = []
+    for size in range(len(_RULES_TURRETS) + 1):
+        for subset in itertools.combinations(_RULES_TURRETS, size):
+            for other in others:
+                all_turrs = set(subset) if other is None else set(subset) | {other}
+                occupied = occupied_mask(all_turrs)
+                for pos in schemas.TURRETS:
+                    expected = reference_position_index(pos, all_turrs)
+                    got = position_rules.position_index(pos, occupied)
+                    checked += 1
+                    if got != expected:
+                        mismatches.append((pos, sorted(all_turrs), expected, got))
+    return checked, mismatches
+
+
+def main(argv=None):
+    """Command line interface, see the module docstring"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", default=str(schemas.TURRETS_RULES_PATH),
+                        help="rules file to check, along with the default rules")
+    args = parser.parse_args(argv)
+
+    with open(args.rules) as file:
+        sources = {args.rules: json.load(file),
+                   "schemas.DEFAULT_TURRETS_RULES": schemas.DEFAULT_TURRETS_RULES}
+    failed = False
+    for name, rules in sources.items():
+        checked, mismatches = check(rules)
+        print(f"{name}: {checked} combinations, {len(mismatches)} mismatches")
+        for pos, turrets, expected, got in mismatches[:20]:
+            print(f"  {pos} with {' '.join(turrets)}: position {got} instead of {expected}")
+        failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""On-disk catalog of ship files, to answer questions about a fleet without opening every file
+
+The catalog is a SQLite database in the application data folder.
+For each ship file, it records where it is, its signature (modification time, size and hash)
+and a summary of its content.
+A rescan only parses again the files that changed since the last scan.
+
+Command line use:
+    python catalog.py scan <directory or glob>
+    python catalog.py query --type BC --min-displacement 30000 --oval --path "*Game3*"
+    python catalog.py prune
+"""
+import argparse
+import hashlib
+import json
+import pathlib
+import sqlite3
+import sys
+import appdirs
+from model import fleet
+from model.turrets_torps import Turret
+
+CATALOG_PATH = pathlib.Path(appdirs.user_data_dir("Draftnought")).joinpath("catalog.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ships (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    valid INTEGER NOT NULL,
+    error TEXT,
+    ship_type TEXT,
+    displacement INTEGER,
+    is_rtw2 INTEGER,
+    picture_name TEXT,
+    main_caliber INTEGER,
+    structure_count INTEGER,
+    point_count INTEGER,
+    funnel_count INTEGER,
+    oval_funnel_count INTEGER,
+    funnels TEXT,
+    turret_count INTEGER,
+    turrets TEXT,
+    torpedo_mount_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS ships_type_displacement ON ships (ship_type, displacement);
+"""
+
+# columns filled from the summary of a parsed file
+_SUMMARY_COLUMNS = ["valid", "error", "ship_type", "displacement", "is_rtw2", "picture_name",
+                    "main_caliber", "structure_count", "point_count", "funnel_count",
+                    "oval_funnel_count", "funnels", "turret_count", "turrets",
+                    "torpedo_mount_count"]
+
+# read the files by blocks of that size to hash them
+_HASH_BLOCK = 1 << 16
+
+
+class ScanReport:
+    """What happened during a scan
+
+    Attrs:
+        parsed (int): files that were new or changed, and were parsed
+        touched (int): files whose modification time changed but not their content
+        unchanged (int): files skipped
+        invalid (int): parsed files that are not valid ship files
+    """
+
+    def __init__(self):
+        self.parsed = 0
+        self.touched = 0
+        self.unchanged = 0
+        self.invalid = 0
+
+    def __str__(self):
+        return (f"{self.parsed} parsed ({self.invalid} invalid), "
+                f"{self.touched} touched, {self.unchanged} unchanged")
+
+
+class Catalog:
+    """The catalog database
+
+    Args:
+        db_path (str or pathlib.Path): path to the SQLite file, created if needed
+    """
+
+    def __init__(self, db_path=CATALOG_PATH):
+        pathlib.Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(db_path))
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        """Close the database"""
+        self._connection.close()
+
+    def scan(self, location, workers=None):
+        """Bring the catalog up to date for all the ship files of a location
+
+        Only the new files and the files whose modification time, size and hash changed
+        are parsed, on a pool of processes.
+
+        Args:
+            location (str or pathlib.Path): directory, glob or file. See fleet.iter_ship_files
+            workers (int): see fleet.map_ship_files
+        Returns:
+            ScanReport
+        """
+        report = ScanReport()
+        to_parse = {}
+        for path in fleet.iter_ship_files(location):
+            path = path.resolve()
+            stat = path.stat()
+            row = self._connection.execute(
+                "SELECT mtime_ns, size, hash FROM ships WHERE path = ?", (str(path),)).fetchone()
+            if row is not None and (row["mtime_ns"], row["size"]) == (stat.st_mtime_ns,
+                                                                     stat.st_size):
+                report.unchanged += 1
+                continue
+            file_hash = hash_file(path)
+            if row is not None and row["hash"] == file_hash:
+                with self._connection:
+                    self._connection.execute(
+                        "UPDATE ships SET mtime_ns = ?, size = ? WHERE path = ?",
+                        (stat.st_mtime_ns, stat.st_size, str(path)))
+                report.touched += 1
+                continue
+            to_parse[path] = (stat.st_mtime_ns, stat.st_size, file_hash)
+
+        for path, summary in fleet.map_ship_files(summarize, to_parse, workers):
+            mtime_ns, size, file_hash = to_parse[path]
+            report.parsed += 1
+            if not summary["valid"]:
+                report.invalid += 1
+            columns = ["path", "mtime_ns", "size", "hash"] + _SUMMARY_COLUMNS
+            values = ([str(path), mtime_ns, size, file_hash]
+                      + [summary[column] for column in _SUMMARY_COLUMNS])
+            with self._connection:
+                self._connection.execute(
+                    f"INSERT OR REPLACE INTO ships ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})", values)
+        return report
+
+    def prune(self):
+        """Forget the files that do not exist anymore
+
+        Returns:
+            how many files were removed from the catalog
+        """
+        missing = [row["path"] for row in self._connection.execute("SELECT path FROM ships")
+                   if not pathlib.Path(row["path"]).is_file()]
+        with self._connection:
+            self._connection.executemany("DELETE FROM ships WHERE path = ?",
+                                         [(path,) for path in missing])
+        return len(missing)
+
+    def query(self, ship_type=None, min_displacement=None, max_displacement=None,
+              oval_funnels=None, is_rtw2=None, path_pattern=None, valid=True):
+        """Find ships in the catalog
+
+        All the criteria are optional and combined.
+        Args:
+            ship_type (str): like "BC", "DD"...
+            min_displacement (int): displacement strictly above, in tons
+            max_displacement (int): displacement strictly under, in tons
+            oval_funnels (bool): True: at least one oval funnel, False: none
+            is_rtw2 (bool): RTW2 or RTW1 files only
+            path_pattern (str): SQLite GLOB pattern on the absolute path, like "*Game3*"
+            valid (bool): valid files only, invalid files only, or both if None
+        Returns:
+            list of dict, one per ship, ordered by path.
+            "funnels" is a list of {"name", "x", "y", "oval"}, "turrets" a dict {position: guns}
+        """
+        conditions = []
+        values = []
+        for condition, value in (("ship_type = ?", ship_type),
+                                 ("displacement > ?", min_displacement),
+                                 ("displacement < ?", max_displacement),
+                                 ("path GLOB ?", path_pattern)):
+            if value is not None:
+                conditions.append(condition)
+                values.append(value)
+        if oval_funnels is not None:
+            conditions.append("oval_funnel_count > 0" if oval_funnels
+                              else "oval_funnel_count = 0")
+        if is_rtw2 is not None:
+            conditions.append("is_rtw2 = ?")
+            values.append(int(is_rtw2))
+        if valid is not None:
+            conditions.append("valid = ?")
+            values.append(int(valid))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection.execute(f"SELECT * FROM ships{where} ORDER BY path", values)
+        return [_row_as_dict(row) for row in rows]
+
+
+def hash_file(path):
+    """sha1 of the content of a file, as an hex string"""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(_HASH_BLOCK), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def summarize(path, parameters):
+    """Summary of a ship file for the catalog, run in the worker processes
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        parameters (parameters_loader.Parameters):
+    Returns:
+        dict with a value for each of _SUMMARY_COLUMNS
+    """
+    summary = dict.fromkeys(_SUMMARY_COLUMNS)
+    entry = fleet.load_ship_without_picture(path, parameters)
+    if not entry.ok:
+        summary["valid"] = 0
+        summary["error"] = str(entry.error)
+        return summary
+
+    ship_data = entry.ship_data
+    funnels = [{"name": name, "x": funnel.x, "y": funnel.y, "oval": bool(funnel.oval)}
+               for name, funnel in ship_data.funnels.items() if funnel.x != 0 or funnel.y != 0]
+    turrets = {mount.pos: mount.guns for mount in ship_data.turrets_torps
+               if isinstance(mount, Turret)}
+    summary.update({
+        "valid": 1,
+        "ship_type": ship_data.ship_type,
+        "displacement": ship_data.displacement,
+        "is_rtw2": int(ship_data.is_rtw2),
+        "picture_name": ship_data.picture_name,
+        "main_caliber": ship_data.caliber,
+        "structure_count": len(ship_data.structures),
+        "point_count": sum(len(structure.points) for structure in ship_data.structures),
+        "funnel_count": len(funnels),
+        "oval_funnel_count": sum(1 for funnel in funnels if funnel["oval"]),
+        "funnels": json.dumps(funnels),
+        "turret_count": len(turrets),
+        "turrets": json.dumps(turrets),
+        "torpedo_mount_count": len(ship_data.turrets_torps) - len(turrets)})
+    return summary
+
+
+def _row_as_dict(row):
+    ship = dict(row)
+    ship["is_rtw2"] = None if ship["is_rtw2"] is None else bool(ship["is_rtw2"])
+    ship["valid"] = bool(ship["valid"])
+    for column in ("funnels", "turrets"):
+        if ship[column] is not None:
+            ship[column] = json.loads(ship[column])
+    return ship
+
+
+def main(argv=None):
+    """Command line interface, see the module docstring"""
+    parser = argparse.ArgumentParser(prog="catalog", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=CATALOG_PATH, help="path to the catalog database")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    scan = commands.add_parser("scan", help="add or update ship files in the catalog")
+    scan.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+    scan.add_argument("--workers", type=int, default=None,
+                      help="number of processes, one per core by default")
+
+    query = commands.add_parser("query", help="list the ships matching all the criteria")
+    query.add_argument("--type", dest="ship_type", help="ship type, like BC")
+    query.add_argument("--min-displacement", type=int, help="displacement above, in tons")
+    query.add_argument("--max-displacement", type=int, help="displacement under, in tons")
+    oval = query.add_mutually_exclusive_group()
+    oval.add_argument("--oval", dest="oval_funnels", action="store_true", default=None,
+                      help="at least one oval funnel")
+    oval.add_argument("--no-oval", dest="oval_funnels", action="store_false",
+                      help="no oval funnel")
+    game = query.add_mutually_exclusive_group()
+    game.add_argument("--rtw2", dest="is_rtw2", action="store_true", default=None,
+                      help="RTW2 files only")
+    game.add_argument("--rtw1", dest="is_rtw2", action="store_false", help="RTW1 files only")
+    query.add_argument("--path", dest="path_pattern", help='glob on the full path, like "*Game3*"')
+    query.add_argument("--invalid", action="store_true", help="list the invalid files instead")
+    query.add_argument("--json", action="store_true", help="full records as JSON")
+
+    commands.add_parser("prune", help="forget the files that do not exist anymore")
+
+    args = parser.parse_args(argv)
+    catalog = Catalog(args.db)
+    try:
+        if args.command == "scan":
+            for location in args.location:
+                print(f"{location}: {catalog.scan(location, args.workers)}")
+        elif args.command == "prune":
+            print(f"{catalog.prune()} missing files removed")
+        else:
+            ships = catalog.query(ship_type=args.ship_type,
+                                  min_displacement=args.min_displacement,
+                                  max_displacement=args.max_displacement,
+                                  oval_funnels=args.oval_funnels,
+                                  is_rtw2=args.is_rtw2,
+                                  path_pattern=args.path_pattern,
+                                  valid=not args.invalid)
+            if args.json:
+                json.dump(ships, sys.stdout, indent=2)
+                print()
+            else:
+                for ship in ships:
+                    if ship["valid"]:
+                        print(f"{ship['path']}\t{ship['ship_type']}\t{ship['displacement']}t")
+                    else:
+                        print(f"{ship['path']}\t{ship['error']}")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Command line tool to inspect and edit many ship files at once, without the editor's window
+
+The files are processed on a pool of processes. The edits are done with the editor's commands
+and the changed files are written atomically, like the editor does.
+With --dry-run nothing is written, with --diff the changes are shown as unified diffs.
+
+Command line use:
+    python cli.py info <directories, globs or files>
+    python cli.py symmetrize "Save/Game3/*.?0d" --dry-run --diff
+    python cli.py set-fill off <location> --structures "Superstructure1"
+    python cli.py move-funnel Funnel1 -30 <location>
+    python cli.py set-oval Funnel2 on <location>
+    python cli.py roundtrip <location> --dry-run
+    python cli.py report "Save/Game3"
+"""
+import argparse
+import difflib
+import fnmatch
+import functools
+import itertools
+import json
+import sys
+from model import fleet, geometry
+from model.funnel import MoveFunnel, OvalFunnel
+from model.shipdata import atomic_write
+from model.structure import ApplySymmetry, SetFill
+from model.turrets_torps import Turret
+
+# what happened to a file
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+def info(ship_data):
+    """Summary of a ship, for the info command
+
+    Returns:
+        dict of JSON values
+    """
+    return {"ship_type": ship_data.ship_type,
+            "displacement": ship_data.displacement,
+            "game": "RTW2" if ship_data.is_rtw2 else "RTW1",
+            "structures": {structure.name: len(structure.points)
+                           for structure in ship_data.structures},
+            "funnels": {name: {"x": funnel.x, "y": funnel.y, "oval": bool(funnel.oval)}
+                        for name, funnel in ship_data.funnels.items()
+                        if funnel.x != 0 or funnel.y != 0},
+            "turrets": {mount.pos: mount.guns for mount in ship_data.turrets_torps
+                        if isinstance(mount, Turret)}}
+
+
+def symmetrize(ship_data, structures="*"):
+    """Make symmetrical the structures whose names match a pattern, see ApplySymmetry"""
+    for structure in _matching_structures(ship_data, structures):
+        old_points = list(structure.points)
+        ApplySymmetry(structure).execute()
+        if list(structure.points) == old_points:
+            # already symmetrical, nothing to encode again
+            structure.dirty = False
+
+
+def set_fill(ship_data, fill, structures="*"):
+    """Set the fill state of the structures whose names match a pattern"""
+    for structure in _matching_structures(ship_data, structures):
+        SetFill(structure, fill).execute()
+
+
+def move_funnel(ship_data, funnel, y, x=None):
+    """Move a funnel, x is kept as it is if None
+
+    Only the y position is written in RTW1 files.
+    """
+    target = _funnel(ship_data, funnel)
+    MoveFunnel(target, target.x if x is None else x, y).execute()
+
+
+def set_oval(ship_data, funnel, oval):
+    """Make a funnel oval or round"""
+    OvalFunnel(_funnel(ship_data, funnel), oval).execute()
+
+
+def roundtrip(ship_data):
+    """Encode again all the structures and funnels, as if they had all been edited
+
+    The files whose content changes are the ones the editor would change
+    after touching every structure and funnel.
+    """
+    for structure in ship_data.structures:
+        structure.dirty = True
+    for funnel in ship_data.funnels.values():
+        funnel.dirty = True
+
+
+# the operations that edit the ship files, by command name
+EDITS = {"symmetrize": symmetrize,
+         "set-fill": set_fill,
+         "move-funnel": move_funnel,
+         "set-oval": set_oval,
+         "roundtrip": roundtrip}
+
+
+def edit_file(path, parameters, edit, options=None, dry_run=False, diff=False):
+    """Apply an edit to one ship file and write it if it changed, run in the worker processes
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        parameters (parameters_loader.Parameters):
+        edit (str): one of EDITS
+        options (dict): keyword arguments of the edit function
+        dry_run (bool): do not write the file
+        diff (bool): also give the unified diff of the change
+    Returns:
+        (CHANGED, UNCHANGED or FAILED, error message or diff or None)
+    """
+    entry = fleet.load_ship_without_picture(path, parameters)
+    if not entry.ok:
+        return FAILED, str(entry.error)
+    ship_data = entry.ship_data
+    try:
+        with open(path) as file:
+            before = file.read()
+        EDITS[edit](ship_data, **(options or {}))
+    except (OSError, ValueError) as error:
+        return FAILED, str(error)
+    after = ship_data.ini_text()
+    if after == before:
+        return UNCHANGED, None
+    if not dry_run:
+        try:
+            atomic_write(path, after, ship_data.newline)
+        except OSError as error:
+            return FAILED, str(error)
+    if diff:
+        return CHANGED, "".join(difflib.unified_diff(before.splitlines(True),
+                                                     after.splitlines(True),
+                                                     str(path), f"{path} (edited)"))
+    return CHANGED, None
+
+
+def info_file(path, parameters):
+    """info of one ship file, run in the worker processes
+
+    Returns:
+        (UNCHANGED, info dict) or (FAILED, error message)
+    """
+    entry = fleet.load_ship_without_picture(path, parameters)
+    if not entry.ok:
+        return FAILED, str(entry.error)
+    return UNCHANGED, info(entry.ship_data)
+
+
+def geometry_file(path, parameters):
+    """Geometry hashes of one ship file, for the report command, run in the worker processes
+
+    Returns:
+        (UNCHANGED, geometry.ship_geometry dict) or (FAILED, error message)
+    """
+    entry = fleet.load_ship_without_picture(path, parameters)
+    if not entry.ok:
+        return FAILED, str(entry.error)
+    return UNCHANGED, geometry.ship_geometry(entry.ship_data)
+
+
+def print_report(report):
+    """Show the groups of a GeometryStore report, see GeometryStore.report"""
+    print(f"{report['structures']} structures, {report['distinct']} distinct")
+    if report["duplicates"]:
+        print("structures found more than once:")
+    for group in report["duplicates"]:
+        print(f"  {group['digest'][:12]}\t{group['points']} points\t"
+              f"{len(group['copies'])} copies")
+        for ship, name in group["copies"]:
+            print(f"    {ship}: {name}")
+    if report["variants"]:
+        print("outlines found at several places along the ship:")
+    for group in report["variants"]:
+        print(f"  {group['variant'][:12]}\t{group['points']} points\t"
+              f"{len(group['digests'])} places")
+        for digest, copies in group["digests"].items():
+            for ship, name in copies:
+                print(f"    {digest[:12]}\t{ship}: {name}")
+    if report["funnel_layouts"]:
+        print("funnel layouts found on several ships:")
+    for group in report["funnel_layouts"]:
+        print(f"  {group['digest'][:12]}\t{len(group['ships'])} ships")
+        for ship in group["ships"]:
+            print(f"    {ship}")
+
+
+def run(function, locations, workers=None):
+    """Run a function on all the ship files of the locations on a pool of processes
+
+    Args:
+        function (callable): function(path, parameters), see fleet.map_ship_files
+        locations (list): see fleet.iter_ship_files
+        workers (int): see fleet.map_ship_files
+    Returns:
+        a generator of (path, result) in completion order
+    """
+    paths = itertools.chain.from_iterable(fleet.iter_ship_files(location)
+                                          for location in locations)
+    return fleet.map_ship_files(function, paths, workers)
+
+
+def _matching_structures(ship_data, pattern):
+    return [structure for structure in ship_data.structures
+            if fnmatch.fnmatchcase(structure.name, pattern)]
+
+
+def _funnel(ship_data, name):
+    if name not in ship_data.funnels:
+        raise ValueError(f"no funnel named {name}")
+    return ship_data.funnels[name]
+
+
+def _on_off(value):
+    if value not in ("on", "off"):
+        raise argparse.ArgumentTypeError("on or off")
+    return value == "on"
+
+
+def main(argv=None):
+    """Command line interface, see the module docstring"""
+    parser = argparse.ArgumentParser(prog="draftnought", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    def add_command(name, help_text, edit=True):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--workers", type=int, default=None,
+                             help="number of processes, one per core by default")
+        if edit:
+            command.add_argument("--dry-run", action="store_true",
+                                 help="only tell which files would change, write nothing")
+            command.add_argument("--diff", action="store_true",
+                                 help="show the changes as unified diffs")
+        return command
+
+    command = add_command("info", "summary of each ship", edit=False)
+    command.add_argument("--json", action="store_true", help="one JSON object per ship")
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    command = add_command("report", "structures and funnel layouts found on several ships",
+                          edit=False)
+    command.add_argument("--json", action="store_true", help="the report as a JSON object")
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    command = add_command("symmetrize", "make the structures symmetrical")
+    command.add_argument("--structures", default="*",
+                         help='pattern of the structures names, like "Superstructure1"')
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    command = add_command("set-fill", "fill the structures or draw them as lines")
+    command.add_argument("fill", type=_on_off, help="on or off")
+    command.add_argument("--structures", default="*",
+                         help='pattern of the structures names, like "Superstructure1"')
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    command = add_command("move-funnel", "move a funnel along the ship")
+    command.add_argument("funnel", help="name of the funnel, like Funnel1")
+    command.add_argument("y", type=float, help="position along the ship, funnel coordinates")
+    command.add_argument("--x", type=float, default=None,
+                         help="position across the ship, RTW2 only. Unchanged by default")
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    command = add_command("set-oval", "make a funnel oval or round")
+    command.add_argument("funnel", help="name of the funnel, like Funnel1")
+    command.add_argument("oval", type=_on_off, help="on or off")
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    command = add_command("roundtrip", "encode again all the structures and funnels")
+    command.add_argument("location", nargs="+", help="directory, glob pattern or ship file")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        failures = 0
+        for path, (status, result) in run(info_file, args.location, args.workers):
+            if status == FAILED:
+                failures += 1
+                print(f"{path}: {result}", file=sys.stderr)
+            elif args.json:
+                print(json.dumps({"path": str(path), **result}))
+            else:
+                print(f"{path}\t{result['game']}\t{result['ship_type']}\t"
+                      f"{result['displacement']}t\t{len(result['structures'])} structures\t"
+                      f"{len(result['funnels'])} funnels")
+        return 1 if failures else 0
+
+    if args.command == "report":
+        store = geometry.GeometryStore()
+        failures = 0
+        for path, (status, result) in run(geometry_file, args.location, args.workers):
+            if status == FAILED:
+                failures += 1
+                print(f"{path}: {result}", file=sys.stderr)
+            else:
+                store.record(path, result)
+        if args.json:
+            print(json.dumps(store.report()))
+        else:
+            print_report(store.report())
+        return 1 if failures else 0
+
+    options = {"symmetrize": lambda: {"structures": args.structures},
+               "set-fill": lambda: {"fill": args.fill, "structures": args.structures},
+               "move-funnel": lambda: {"funnel": args.funnel, "y": args.y, "x": args.x},
+               "set-oval": lambda: {"funnel": args.funnel, "oval": args.oval},
+               "roundtrip": dict}[args.command]()
+    function = functools.partial(edit_file, edit=args.command, options=options,
+                                 dry_run=args.dry_run, diff=args.diff)
+    # with --diff, only the diffs go to stdout so they can be redirected to a patch file
+    messages = sys.stderr if args.diff else sys.stdout
+    counts = dict.fromkeys([CHANGED, UNCHANGED, FAILED], 0)
+    for path, (status, result) in run(function, args.location, args.workers):
+        counts[status] += 1
+        if status == FAILED:
+            print(f"{path}: {result}", file=sys.stderr)
+        elif status == CHANGED:
+            print(f"{path}: {'would change' if args.dry_run else 'changed'}", file=messages)
+            if result:
+                sys.stdout.write(result)
+    print(f"{counts[CHANGED]} {'to change' if args.dry_run else 'changed'}, "
+          f"{counts[UNCHANGED]} unchanged, {counts[FAILED]} failed", file=messages)
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,19 @@
 
 Builds the main window menu bar and associated keyboard shortcuts
 Manages root functions: load program config, load file, save file.
+
+The window is shown first, then the parameters and the last file are loaded.
+The slow imports (PIL, jsonschema, numpy) are only done when needed for that.
+Start with --profile-startup to get the timings of the startup steps.
 """
+import time
+_START_TIME = time.perf_counter()
+# pylint: disable=wrong-import-position
+import argparse
+import atexit
+import collections
+import contextlib
+import queue
 import tkinter as tk
 from tkinter import filedialog, Text
 from tkinter import ttk
@@ -10,10 +22,41 @@ import logging
 import logging.handlers
 import pathlib
 import appdirs
-from window import topview, structeditor, funnelseditor, sideview
-from window.framework import CommandStack
-import model.shipdata as sd
-import parameters_loader
+from window.framework import CommandStack, FrameScheduler
+
+# records waiting to be shown in the log widget, the oldest are dropped above that
+LOG_BUFFER_RECORDS = 1000
+# lines kept in the log widget
+LOG_WIDGET_LINES = 500
+# the log widget is updated with the new records that often, in ms
+LOG_WIDGET_TICK = 100
+# the results of the background saves are looked for that often while saves are written, in ms
+SAVER_POLL_MS = 100
+
+
+class LogBuffer(logging.Handler):
+    """Keeps the last records for the log widget
+
+    emit is called from the log listener's thread, the records are taken by the Tk loop
+    Args:
+        capacity (int): the oldest records are dropped when there are more than that
+    """
+
+    def __init__(self, capacity):
+        super().__init__()
+        # append and popleft of a deque are thread safe
+        self._records = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        self._records.append(record)
+
+    def take(self):
+        """Remove and return all the records in the buffer, oldest first"""
+        records = []
+        while self._records:
+            records.append(self._records.popleft())
+        return records
+
 
 summary = logging.getLogger("Summary")
 summary.setLevel(logging.DEBUG)
@@ -26,18 +69,62 @@ details = logging.getLogger("Details")
 details.setLevel(logging.WARNING)
 file_handler = logging.handlers.RotatingFileHandler(
     log_filename, maxBytes=500*1000, backupCount=5)
-details.addHandler(file_handler)
+file_handler.addFilter(logging.Filter("Details"))
+log_buffer = LogBuffer(LOG_BUFFER_RECORDS)
+log_buffer.addFilter(logging.Filter("Summary"))
+
+# both loggers only put the records in a queue: the log file is written from
+# the listener's thread, and the log widget takes its records in batches from the Tk loop
+log_queue = queue.Queue()
+for logger in (summary, details):
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, log_buffer,
+                                              respect_handler_level=True)
+log_listener.start()
+# write the records still in the queue before exiting
+atexit.register(log_listener.stop)
 
 _MAIN_ROW = 0
 
 _LOG_ROW = _MAIN_ROW + 1
 
 
-class MainWindow(tk.Tk):
-    """Base class for the whole UI"""
+class StartupProfile:
+    """Timings of the startup steps"""
 
     def __init__(self):
+        self._steps = []
+
+    @contextlib.contextmanager
+    def step(self, name):
+        """Time the code run in the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._steps.append((name, time.perf_counter() - start))
+
+    def mark(self, name):
+        """Record the time elapsed since the program started"""
+        self._steps.append((f"{name} (since start)", time.perf_counter() - _START_TIME))
+
+    def report(self):
+        """The timings as text, one step per line"""
+        return "\n".join(f"{name:<40}{duration*1000:8.1f} ms" for name, duration in self._steps)
+
+
+class MainWindow(tk.Tk):
+    """Base class for the whole UI
+
+    Args:
+        profile (StartupProfile): if not None, the startup steps are timed
+            and the timings are printed once the last file is loaded
+    """
+
+    def __init__(self, profile=None):
         super().__init__()
+        self._profile = profile if profile is not None else StartupProfile()
+        self._print_profile = profile is not None
         self.winfo_toplevel().title("Draftnought")
         self.iconbitmap('icon.ico')
         self.resizable(False, False)
@@ -52,11 +139,19 @@ class MainWindow(tk.Tk):
         logging_frame.grid_columnconfigure(0, weight=1)
         log_scroll.config(command=logging_text.yview)
 
-        summary.addHandler(LogToWidget(logging_text))
+        LogToWidget(logging_text, log_buffer)
 
         logging_frame.grid(row=_LOG_ROW, sticky=tk.W+tk.E)
 
-        self.parameters = parameters_loader.Parameters("")
+        # loaded after the window is shown, see _autoload
+        self.parameters = None
+        # created on the first save
+        self._saver = None
+        # the timer delivering the results of the saves, see _poll_saver
+        self._saver_poll = None
+        # the last save could not be written, its edits are still in the journal
+        self._save_failed = False
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         menubar = tk.Menu(self)
         self.config(menu=menubar)
@@ -78,7 +173,6 @@ class MainWindow(tk.Tk):
 
         viewmenu = tk.Menu(menubar, tearoff=0)
         self.grid_var = tk.IntVar()
-        self.grid_var.set(int(self.parameters.grid))
         self.grid_var.trace_add("write", self._set_grid)
         viewmenu.add_checkbutton(label="Grid", variable=self.grid_var)
 
@@ -96,13 +190,30 @@ class MainWindow(tk.Tk):
             self, text="Load ship file", command=self.do_load)
         self.center_frame.grid(row=_MAIN_ROW)
 
-        try:
-            with open(self.parameters.last_file_path) as file:
-                self.load(file.name)
-        except OSError:
-            return
+        self._profile.mark("main window built")
+        # once the window is displayed
+        self.after_idle(self.after, 0, self._autoload)
+
+    def _autoload(self):
+        """Load the parameters, then the last saved file if it still exists"""
+        self._profile.mark("window shown")
+        with self._profile.step("import parameters_loader"):
+            import parameters_loader
+        with self._profile.step("load parameters"):
+            parameters = parameters_loader.Parameters("")
+        if self.parameters is None:
+            self.parameters = parameters
+            self.grid_var.set(int(self.parameters.grid))
+            last_file_path = self.parameters.last_file_path
+            if last_file_path and pathlib.Path(last_file_path).is_file():
+                self.load(last_file_path)
+        self._profile.mark("startup done")
+        if self._print_profile:
+            print(self._profile.report())
 
     def _set_grid(self, _var_name, _list_index, _operation):
+        if self.parameters is None:
+            return
         self.parameters.grid = bool(self.grid_var.get())
         if isinstance(self.center_frame, ShipEditor):
             self.center_frame.set_grid(bool(self.grid_var.get()))
@@ -130,7 +241,8 @@ class MainWindow(tk.Tk):
 
     def do_save(self, *_args):
         """Save the current file to the same path"""
-        self.do_save_as(self.parameters.current_file_path)
+        if self.parameters is not None:
+            self.do_save_as(self.parameters.current_file_path)
 
     def load(self, path):
         """load a ship file and display it
@@ -140,11 +252,14 @@ class MainWindow(tk.Tk):
                 If none is given, a dialog box is opened to choose it.
         """
         summary.debug("loading %s", path)
+        with self._profile.step("import parameters_loader and shipdata"):
+            import parameters_loader
+            import model.shipdata as sd
         # save old parameters in case something goes wrong
         old_parameters = self.parameters
         self.parameters = parameters_loader.Parameters(path)
         try:
-            with open(path) as file:
+            with self._profile.step("read ship file"), open(path) as file:
                 self.current_ship_data = sd.ShipData(file, self.parameters)
         except sd.ShipFileInvalidException as error:
             details.error("The file is not correctly formatted to be a ship file:\n%s\n%s",
@@ -155,13 +270,22 @@ class MainWindow(tk.Tk):
             return
 
         summary.info("loading successful!")
+        # the edits of the previous file are not needed anymore
+        if self.command_stack.journal is not None:
+            self.command_stack.journal.discard()
+        from model.journal import Journal
+        journal = Journal(self.current_ship_data)
+        recovered = journal.recover()
+        if recovered:
+            summary.warning("%d unsaved edits recovered from the previous session", recovered)
         self.center_frame.destroy()
         # reset the command stack
-        new_command_stack = CommandStack()
-        self.center_frame = ShipEditor(self,
-                                       self.current_ship_data,
-                                       new_command_stack,
-                                       self.parameters)
+        new_command_stack = CommandStack(journal=journal)
+        with self._profile.step("build editor"):
+            self.center_frame = ShipEditor(self,
+                                           self.current_ship_data,
+                                           new_command_stack,
+                                           self.parameters)
         self.center_frame.grid(row=_MAIN_ROW, column=0,
                                sticky=tk.N+tk.E+tk.S+tk.W)
         self.grid_columnconfigure(0, weight=1)
@@ -170,6 +294,7 @@ class MainWindow(tk.Tk):
 
         # if load was OK, forget the old command stack
         self.command_stack = new_command_stack
+        self._save_failed = False
         self.grid_var.set(int(self.parameters.grid))
         self.winfo_toplevel().title(pathlib.Path(path).name)
 
@@ -177,40 +302,80 @@ class MainWindow(tk.Tk):
         """Save the current file, path choosable
 
         Also saves the path as "last file" to open on the next start
+        The file is written by a background thread, see model.saver
 
         Args:
             path (str): path to the file
                 If none given, a file picker dialog allows to choose a new or existing file
         """
         if path is None:
+            if self.parameters is None:
+                return
             current_file_path = self.parameters.current_file_path
             if not current_file_path:
                 return
             extension = pathlib.Path(current_file_path).suffix
-            file = filedialog.asksaveasfile(defaultextension=extension,
-                                            initialdir=pathlib.Path(
-                                                current_file_path).parent,
-                                            initialfile=pathlib.Path(
-                                                current_file_path).name,
-                                            filetypes=(("ship files", extension),
-                                                       ("all files", "*.*")))
-            if file is not None:
-                summary.debug("saving file to %s", file.name)
-                self.current_ship_data.write_as_ini(file_object=file)
-                file.close()
-                self.parameters.write_app_param(file.name)
-        elif path:
+            # only the name is asked: the file is written atomically by write_as_ini
+            path = filedialog.asksaveasfilename(defaultextension=extension,
+                                                initialdir=pathlib.Path(
+                                                    current_file_path).parent,
+                                                initialfile=pathlib.Path(
+                                                    current_file_path).name,
+                                                filetypes=(("ship files", extension),
+                                                           ("all files", "*.*")))
+        if path:
             summary.debug("saving file to %s", path)
-            try:
-                with open(path, "w") as file:
-                    self.current_ship_data.write_as_ini(file_object=file)
-            except OSError as error:
-                summary.error("Could not save file:\n%s", error)
-                details.error("Could not save file:\n%s", error)
-                return
-
-            summary.info("save successful!")
-            self.parameters.write_app_param(file.name)
+            if self._saver is None:
+                from model.saver import BackgroundSaver
+                self._saver = BackgroundSaver()
+            journal = self.command_stack.journal
+            mark = journal.mark() if journal is not None else None
+
+            def on_written(written):
+                self._on_saved(journal, mark, text, path, written)
+
+            # written in the background, the result is logged when it is done
+            text = self._saver.save(self.current_ship_data, path, self.parameters, on_written)
+            if self._saver_poll is None:
+                self._saver_poll = self.after(SAVER_POLL_MS, self._poll_saver)
+
+    def _poll_saver(self):
+        """Deliver the results of the saves written in the background, while some are waiting"""
+        self._saver_poll = None
+        if self._saver.deliver_results():
+            self._saver_poll = self.after(SAVER_POLL_MS, self._poll_saver)
+
+    def _on_saved(self, journal, mark, text, path, written):
+        """Start the journal again from the saved content, once the file is written
+
+        If it could not be written, the journal is kept: it still applies to the file on disk
+        Args:
+            journal (Journal): the journal when the ship was saved, None if none
+            mark (int): see Journal.mark
+            text (str): the content written
+            path (str): the file written
+            written (bool): False if the file could not be written
+        """
+        if journal is None or journal is not self.command_stack.journal:
+            # another file was loaded since
+            return
+        self._save_failed = not written
+        if written:
+            journal.restart(text, path, since=mark)
+
+    def _on_close(self):
+        """Wait for the saves still being written before closing, and drop the journal"""
+        if self._saver is not None:
+            if self._saver_poll is not None:
+                self.after_cancel(self._saver_poll)
+                self._saver_poll = None
+            self._saver.close()
+            self._saver.deliver_results()
+        # closed normally, there is nothing to recover on the next start,
+        # unless the last save could not be written
+        if self.command_stack.journal is not None and not self._save_failed:
+            self.command_stack.journal.discard()
+        self.destroy()
 
 
 class ShipEditor(tk.Frame):
@@ -226,7 +391,11 @@ class ShipEditor(tk.Frame):
     """
 
     def __init__(self, parent, ship_data, command_stack, parameters):
+        # imported on first use, they import PIL
+        from window import topview, structeditor, funnelseditor, sideview
         super().__init__(parent)
+        # the views share their frames: all their updates are done in the same flush
+        self._frames = FrameScheduler(self)
         funnels_editors = []
         for index, funnel in enumerate(ship_data.funnels.values()):
             funnel_editor = funnelseditor.FunnelEditor(
@@ -253,11 +422,12 @@ class ShipEditor(tk.Frame):
 
         views = tk.Frame(self)
         self._top_view = topview.TopView(views, ship_data, self._st_editors,
-                                         funnels_editors, command_stack, parameters)
+                                         funnels_editors, command_stack, parameters,
+                                         frames=self._frames)
         self._top_view.grid(row=1, column=0, sticky=tk.N+tk.E+tk.S+tk.W)
 
         self._side_view = sideview.SideView(
-            views, ship_data, parameters, self._top_view)
+            views, ship_data, parameters, self._top_view, frames=self._frames)
         self._side_view.grid(row=0, column=0, sticky=tk.N+tk.E+tk.S+tk.W)
         views.columnconfigure(0, weight=1)
         views.rowconfigure(0, weight=1)
@@ -270,6 +440,11 @@ class ShipEditor(tk.Frame):
         self._superstructure_listing.selection_set(0)
         self._on_select_superstructure(None)
 
+    def destroy(self):
+        """Stop the updates waiting for the next frame before the views are destroyed"""
+        self._frames.close()
+        super().destroy()
+
     def set_grid(self, grid_state):
         """set the grid for both top and side view according to grid_state"""
         self._side_view.refresh_grid(grid_state)
@@ -283,35 +458,66 @@ class ShipEditor(tk.Frame):
         self._st_editors[struct_index].focus_set()
 
 
-class LogToWidget(logging.Handler):
-    """Redirect the logger's output to a ttk text Widget
+class LogToWidget:
+    """Show the records of a LogBuffer in a text Widget
 
-    With colors according to debug/info/warning/critical
+    With colors according to debug/info/warning/error.
+    The new records are inserted in one go every LOG_WIDGET_TICK ms,
+    and only the last LOG_WIDGET_LINES lines are kept
+
+    Args:
+        text_widget (tk.Text):
+        buffer (LogBuffer): where the records come from
     """
 
-    def __init__(self, text_widget):
-        super().__init__()
+    def __init__(self, text_widget, buffer):
         self._text_widget = text_widget
+        self._buffer = buffer
         self._text_widget.tag_config("Debug")
         self._text_widget.tag_config("Info", background="spring green")
         self._text_widget.tag_config("Warning", background="orange")
         self._text_widget.tag_config("Error", background="red")
-
-    def emit(self, record):
-        if record.levelno == logging.DEBUG:
-            self._text_widget.insert(
-                tk.END, record.getMessage() + "\n", "Debug")
-        if record.levelno == logging.INFO:
-            self._text_widget.insert(
-                tk.END, record.getMessage() + "\n", "Info")
-        if record.levelno == logging.WARNING:
-            self._text_widget.insert(
-                tk.END, record.getMessage() + "\n", "Warning")
-        if record.levelno == logging.ERROR:
-            self._text_widget.insert(
-                tk.END, record.getMessage() + "\n", "Error")
-        self._text_widget.see(tk.END)
+        self._text_widget.after(LOG_WIDGET_TICK, self._tick)
+
+    @staticmethod
+    def _tag(record):
+        if record.levelno >= logging.ERROR:
+            return "Error"
+        if record.levelno >= logging.WARNING:
+            return "Warning"
+        if record.levelno >= logging.INFO:
+            return "Info"
+        return "Debug"
+
+    def _tick(self):
+        """Insert the new records, drop the oldest lines, and wait for the next tick"""
+        records = self._buffer.take()[-LOG_WIDGET_LINES:]
+        if records:
+            chunks = []
+            for record in records:
+                chunks += [record.getMessage() + "\n", self._tag(record)]
+            self._text_widget.insert(tk.END, *chunks)
+            # the last line is the empty one after the last newline
+            lines = int(self._text_widget.index("end-1c").split(".")[0]) - 1
+            if lines > LOG_WIDGET_LINES:
+                self._text_widget.delete("1.0", f"{lines - LOG_WIDGET_LINES + 1}.0")
+            self._text_widget.see(tk.END)
+        self._text_widget.after(LOG_WIDGET_TICK, self._tick)
+
+
+def main(argv=None):
+    """Start the editor"""
+    parser = argparse.ArgumentParser(prog="Draftnought")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the timings of the imports and initialization steps")
+    args = parser.parse_args(argv)
+    profile = None
+    if args.profile_startup:
+        profile = StartupProfile()
+        profile.mark("imports")
+    window = MainWindow(profile)
+    window.mainloop()
 
 
 if __name__ == "__main__":
-    MainWindow().mainloop()
+    main()
@@ -0,0 +1,195 @@
+"""Conversions between the polar coordinates of the ship files and the funnel coordinates
+
+The ship files give points as (angle, distance) pairs, the editor works in funnel coordinates:
+    origin in the middle of the ship, x to starboard, y to the stern.
+The conversions are batched: whole arrays of points, for all the structures of a ship
+or of a whole fleet, are converted in one call. NumPy is used if it is installed,
+it is only imported on the first conversion big enough to need it.
+
+The integer results are identical to a point by point conversion with the math module:
+the values too close to a rounding boundary for the vectorized maths to be trusted
+are computed again with the math module.
+"""
+from math import atan2, sin, cos, pi, sqrt
+
+# superstructures and funnels have different coordinates system
+# I decide to use the funnel
+# might be a bad idea
+STRUCTURE_TO_FUNNEL = 1.0/45.0
+
+# To convert the angle's value in superstructure's points to radiants
+ANGLE_TO_RADS = pi/972000000.0
+
+# under this amount of points, numpy is slower than plain python
+_NUMPY_MIN_POINTS = 64
+
+# relative and absolute distances to a rounding boundary under which a value is recomputed
+# far above the few ulps of difference between numpy and the math module
+_RELATIVE_TOLERANCE = 1e-12
+_ABSOLUTE_TOLERANCE = 1e-9
+
+# the numpy module once imported, False if it is not installed
+_numpy = None
+
+
+def get_numpy():
+    """The numpy module, imported on the first call. None if it is not installed"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def to_funnel(angles, distances, rounded=False):
+    """Convert points from the ship file's polar coordinates to funnel coordinates
+
+    Args:
+        angles (sequence of int): angles, as in the ship file
+        distances (sequence of int): distances, as in the ship file
+        rounded (bool): round the results to the nearest int, like the funnels positions
+    Returns:
+        (xs, ys): two lists of numbers, in funnel coordinates
+    """
+    numpy = get_numpy() if len(angles) >= _NUMPY_MIN_POINTS else None
+    if numpy is None:
+        xs = [-distance*sin(angle*ANGLE_TO_RADS)*STRUCTURE_TO_FUNNEL
+              for angle, distance in zip(angles, distances)]
+        ys = [-distance*cos(angle*ANGLE_TO_RADS)*STRUCTURE_TO_FUNNEL
+              for angle, distance in zip(angles, distances)]
+        if rounded:
+            return [round(x) for x in xs], [round(y) for y in ys]
+        return xs, ys
+
+    radians = numpy.asarray(angles, dtype=numpy.float64)*ANGLE_TO_RADS
+    distances = numpy.asarray(distances, dtype=numpy.float64)
+    xs = -distances*numpy.sin(radians)*STRUCTURE_TO_FUNNEL
+    ys = -distances*numpy.cos(radians)*STRUCTURE_TO_FUNNEL
+    if not rounded:
+        return xs.tolist(), ys.tolist()
+
+    def exact_x(index):
+        return round(-float(distances[index])*sin(float(radians[index]))*STRUCTURE_TO_FUNNEL)
+
+    def exact_y(index):
+        return round(-float(distances[index])*cos(float(radians[index]))*STRUCTURE_TO_FUNNEL)
+
+    return _round_checked(xs, exact_x), _round_checked(ys, exact_y)
+
+
+def to_rtw(xs, ys, centerline_angle=None):
+    """Convert points from funnel coordinates to the ship file's polar coordinates
+
+    Args:
+        xs (sequence of numbers): x coordinates, funnel coordinates
+        ys (sequence of numbers): y coordinates, funnel coordinates
+        centerline_angle (int): if not None, angle given to all the points with y == 0
+            instead of the computed angle
+    Returns:
+        (angles, distances): two lists of int, as written in the ship file
+    """
+    numpy = get_numpy() if len(xs) >= _NUMPY_MIN_POINTS else None
+    if numpy is None:
+        angles = [_exact_angle(x, y, centerline_angle) for x, y in zip(xs, ys)]
+        distances = [_exact_distance(x, y) for x, y in zip(xs, ys)]
+        return angles, distances
+
+    xs = numpy.asarray(xs, dtype=numpy.float64)
+    ys = numpy.asarray(ys, dtype=numpy.float64)
+    raw_angles = numpy.arctan2(-xs, -ys)*1.0/ANGLE_TO_RADS
+    raw_distances = numpy.sqrt(xs*xs + ys*ys)/STRUCTURE_TO_FUNNEL
+
+    def exact_angle(index):
+        return _exact_angle(float(xs[index]), float(ys[index]), centerline_angle)
+
+    def exact_distance(index):
+        return _exact_distance(float(xs[index]), float(ys[index]))
+
+    angles = _truncate_checked(raw_angles, exact_angle)
+    if centerline_angle is not None:
+        for index in numpy.flatnonzero(ys == 0):
+            angles[index] = centerline_angle
+    return angles, _truncate_checked(raw_distances, exact_distance)
+
+
+def points_to_funnel(point_lists, rounded=False):
+    """to_funnel for many lists of points at once, like all the structures of a fleet
+
+    Args:
+        point_lists (list): lists of (angle, distance)
+        rounded (bool): see to_funnel
+    Returns:
+        a list with, for each list of points, the list of (x, y) in funnel coordinates
+    """
+    angles = [point[0] for points in point_lists for point in points]
+    distances = [point[1] for points in point_lists for point in points]
+    return _split(to_funnel(angles, distances, rounded), point_lists)
+
+
+def points_to_rtw(point_lists, centerline_angle=None):
+    """to_rtw for many lists of points at once, like all the structures of a fleet
+
+    Args:
+        point_lists (list): lists of (x, y) in funnel coordinates
+        centerline_angle (int): see to_rtw
+    Returns:
+        a list with, for each list of points, the list of (angle, distance)
+    """
+    xs = [point[0] for points in point_lists for point in points]
+    ys = [point[1] for points in point_lists for point in points]
+    return _split(to_rtw(xs, ys, centerline_angle), point_lists)
+
+
+def _exact_angle(x, y, centerline_angle):
+    if centerline_angle is not None and y == 0:
+        return centerline_angle
+    return int(atan2(-x, -y) * 1.0/ANGLE_TO_RADS)
+
+
+def _exact_distance(x, y):
+    return int(sqrt(pow(x, 2) + pow(y, 2))/STRUCTURE_TO_FUNNEL)
+
+
+def _split(columns, point_lists):
+    """From two flat columns, rebuild lists of pairs with the same lengths as point_lists"""
+    pairs = list(zip(*columns))
+    result = []
+    start = 0
+    for points in point_lists:
+        result.append(pairs[start:start + len(points)])
+        start += len(points)
+    return result
+
+
+def _truncate_checked(values, exact):
+    """int() of each value of a numpy array
+
+    values that are nearly an integer might be truncated to the other side
+    because of the vectorized maths, they are given by exact(index) instead
+    """
+    numpy = get_numpy()
+    result = numpy.trunc(values).astype(numpy.int64).tolist()
+    boundary = numpy.rint(values)
+    for index in numpy.flatnonzero(numpy.abs(values - boundary)
+                                   <= numpy.abs(values)*_RELATIVE_TOLERANCE
+                                   + _ABSOLUTE_TOLERANCE):
+        result[index] = exact(index)
+    return result
+
+
+def _round_checked(values, exact):
+    """round() of each value of a numpy array
+
+    values that are nearly halfway between two integers are given by exact(index) instead
+    """
+    numpy = get_numpy()
+    result = numpy.rint(values).astype(numpy.int64).tolist()
+    boundary = numpy.floor(values) + 0.5
+    for index in numpy.flatnonzero(numpy.abs(values - boundary)
+                                   <= numpy.abs(values)*_RELATIVE_TOLERANCE
+                                   + _ABSOLUTE_TOLERANCE):
+        result[index] = exact(index)
+    return result
@@ -0,0 +1,166 @@
+"""Read many ship files at once, for example a whole Save/Game<x> folder
+
+The files are parsed on a pool of processes.
+Each worker process loads the parameters only once, then parses as many files as it is given.
+Results are streamed back in completion order, so the whole corpus is never held in memory
+unless the caller decides to keep it.
+"""
+import concurrent.futures
+import glob
+import os
+import pathlib
+import parameters_loader
+import model.shipdata as sd
+
+# glob pattern used when a directory is given
+SHIP_FILES_PATTERN = "*.?0d"
+
+# per worker, how many files can be waiting to be parsed or to be consumed
+_PENDING_PER_WORKER = 4
+
+# parameters of the current worker process, set up once by _init_worker
+_worker_parameters = None
+
+
+class FleetEntry:
+    """Result of the loading of one ship file
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        ship_data (shipdata.ShipData): the loaded ship, None if the loading failed
+        error (Exception): why the loading failed, None if it succeeded.
+            a shipdata.ShipFileInvalidException or an OSError
+    """
+
+    def __init__(self, path, ship_data=None, error=None):
+        self.path = path
+        self.ship_data = ship_data
+        self.error = error
+
+    @property
+    def ok(self):
+        """True if the file was loaded without error"""
+        return self.error is None
+
+
+def iter_ship_files(location):
+    """Give all the ship files from a location
+
+    Args:
+        location (str or pathlib.Path): a directory, a glob pattern or the path to a single file.
+            For a directory, all the files matching SHIP_FILES_PATTERN are given
+    Returns:
+        a generator of pathlib.Path, sorted by name
+    """
+    path = pathlib.Path(location)
+    if path.is_dir():
+        paths = path.glob(SHIP_FILES_PATTERN)
+    elif path.is_file():
+        paths = [path]
+    else:
+        paths = (pathlib.Path(p) for p in glob.glob(str(location), recursive=True))
+    for ship_path in sorted(paths):
+        if ship_path.is_file():
+            yield ship_path
+
+
+def map_ship_files(function, paths, workers=None):
+    """Apply a function to every ship file on a pool of processes
+
+    Args:
+        function (callable): function(path, parameters) that does the work for one file.
+            Must be picklable, so a module-level function.
+            parameters is a parameters_loader.Parameters loaded once per worker process
+        paths (iterable): paths to the ship files. Consumed lazily
+        workers (int): number of processes. None means one per core.
+            1 does everything in the current process
+    Returns:
+        a generator of (path, result) in completion order
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        parameters = parameters_loader.Parameters("")
+        for path in paths:
+            yield path, function(path, parameters)
+        return
+
+    max_pending = workers*_PENDING_PER_WORKER
+    paths = iter(paths)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=_init_worker) as executor:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    path = next(paths)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[executor.submit(_run_in_worker, function, path)] = path
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def load_fleet(location, workers=None, pictures=False, store=None):
+    """Load all the ship files of a location on a pool of processes
+
+    Args:
+        location (str or pathlib.Path): see iter_ship_files
+        workers (int): see map_ship_files
+        pictures (bool): if False, the side pictures are not sent back from the workers,
+            side_pict is None for all ships. Saves a lot of time and memory
+        store (geometry.GeometryStore): if given, the ships are interned in it as they come:
+            the identical structures of the fleet share their points
+    Returns:
+        a generator of FleetEntry, in completion order
+    """
+    loader = load_ship if pictures else load_ship_without_picture
+    for _path, entry in map_ship_files(loader, iter_ship_files(location), workers):
+        if store is not None and entry.ok:
+            store.intern(entry.ship_data, entry.path)
+        yield entry
+
+
+def load_ship(path, parameters):
+    """Load one ship file, never raises for a broken file
+
+    Args:
+        path (pathlib.Path): path to the ship file
+        parameters (parameters_loader.Parameters):
+    Returns:
+        FleetEntry
+    """
+    try:
+        with open(path) as file:
+            return FleetEntry(path, ship_data=sd.ShipData(file, parameters))
+    except (sd.ShipFileInvalidException, OSError) as error:
+        return FleetEntry(path, error=error)
+    except (KeyError, ValueError, IndexError) as error:
+        # unknown ship type, option that cannot be parsed as int...
+        return FleetEntry(path, error=sd.ShipFileInvalidException(
+            pathlib.Path(path).resolve(), message=repr(error)))
+
+
+def load_ship_without_picture(path, parameters):
+    """As load_ship, but without the side picture"""
+    entry = load_ship(path, parameters)
+    if entry.ship_data is not None and entry.ship_data.side_pict is not None:
+        entry.ship_data.side_pict.close()
+        entry.ship_data.side_pict = None
+    return entry
+
+
+def _init_worker():
+    """Load the parameters once for the whole life of the worker process"""
+    global _worker_parameters
+    _worker_parameters = parameters_loader.Parameters("")
+
+
+def _run_in_worker(function, path):
+    return function(path, _worker_parameters)
@@ -1,14 +1,6 @@
 """docstring"""
 from window.framework import Observable, Command
-from math import atan2, sin, cos, pi, sqrt
-
-# superstructures and funnels have different coordinates system
-# I decide to use the funnel
-# might be a bad idea
-STRUCTURE_TO_FUNNEL = 1.0/45.0
-
-# To convert the angle's value in superstructure's points to radiants
-ANGLE_TO_RADS = pi/972000000.0
+from model.coordinates import to_funnel, to_rtw
 
 
 class Funnel(Observable):
@@ -20,16 +12,20 @@ class Funnel(Observable):
         TODO
         position=0: funnel position on the vertical axis. 0 is the center of the ship.
     Attrs:
+        dirty: if the funnel changed since it was read or last saved
         oval: if the funnel should be displayed as an oval, or not
         TODO
         position: Position of the funnel along the length of the ship, in funnel coordinates
     """
 
+    __slots__ = ("_oval", "_x", "_y", "dirty")
+
     def __init__(self, oval=False, x_coord=0, y_coord=0):
         super().__init__()
         self._oval = oval
         self._x = x_coord
         self._y = y_coord
+        self.dirty = False
 
     @property
     def oval(self):
@@ -40,6 +36,7 @@ class Funnel(Observable):
     def oval(self, value):
         if value != self._oval:
             self._oval = value
+            self.dirty = True
             self._notify("set_oval", {"oval": value})
 
     @property
@@ -50,6 +47,7 @@ class Funnel(Observable):
     def x(self, value):
         if value != self._x:
             self._x = value
+            self.dirty = True
             self._notify("set_position", {"position": [self._x, self._y]})
 
     @property
@@ -60,6 +58,7 @@ class Funnel(Observable):
     def y(self, value):
         if value != self._y:
             self._y = value
+            self.dirty = True
             self._notify("set_position", {"position": [self._x, self._y]})
 
 
@@ -93,6 +92,18 @@ class MoveFunnel(Command):
             self._funnel.x = self._old_x
             self._funnel.y = self._old_y
 
+    def merge(self, command):
+        """A following move of the same funnel replaces this one's destination"""
+        if not isinstance(command, MoveFunnel) or command._funnel is not self._funnel:
+            return False
+        self._x = command._x
+        self._y = command._y
+        return True
+
+    def journal_records(self, undone=False):
+        x, y = (self._old_x, self._old_y) if undone else (self._x, self._y)
+        return [(self._funnel, "move", {"x": x, "y": y})]
+
 
 class OvalFunnel(Command):
     """Change the funnel from oval to circular and the opposite
@@ -118,6 +129,9 @@ class OvalFunnel(Command):
         if self._old_oval != self._funnel.oval:
             self._funnel.oval = self._old_oval
 
+    def journal_records(self, undone=False):
+        return [(self._funnel, "set_oval", {"oval": self._old_oval if undone else self._oval})]
+
 
 def funnels_as_ini_section(funnels, is_rtw2):
     """from a list of funnels, gives back a dict that can be exported to a
@@ -125,12 +139,12 @@ def funnels_as_ini_section(funnels, is_rtw2):
     """
     section_content = {}
     if (is_rtw2):
-        for name, funnel in funnels.items():
-            angle = int(atan2(-funnel.x, -funnel.y) * 1.0/ANGLE_TO_RADS)
-            section_content[name+"Angle"] = round(angle)
-            distance = int(
-                sqrt(pow(funnel.x, 2) + pow(funnel.y, 2))/STRUCTURE_TO_FUNNEL)
-            section_content[name+"Distance"] = round(distance)
+        angles, distances = to_rtw([funnel.x for funnel in funnels.values()],
+                                   [funnel.y for funnel in funnels.values()])
+        for name, funnel, angle, distance in zip(funnels.keys(), funnels.values(),
+                                                 angles, distances):
+            section_content[name+"Angle"] = angle
+            section_content[name+"Distance"] = distance
             section_content[name+"Oval"] = 1 if funnel.oval else 0
 
     else:
@@ -154,14 +168,12 @@ def parse_funnels(funnels_section, is_rtw2):
     funnels_indexes = {int(''.join(filter(str.isdigit, k)))
                        for k in funnels_section.keys()}
     if(is_rtw2):
-        for i in funnels_indexes:
+        angles = [funnels_section.getint(f'Funnel{i}Angle') for i in funnels_indexes]
+        distances = [funnels_section.getint(f'Funnel{i}Distance') for i in funnels_indexes]
+        xs, ys = to_funnel(angles, distances, rounded=True)
+        for i, x, y in zip(funnels_indexes, xs, ys):
             funnel_name = f'Funnel{i}'
             is_oval = funnels_section.getboolean(f'Funnel{i}Oval')
-
-            angle = funnels_section.getint(f'Funnel{i}Angle')
-            distance = funnels_section.getint(f'Funnel{i}Distance')
-            x = round(-distance*sin(angle*ANGLE_TO_RADS)*STRUCTURE_TO_FUNNEL)
-            y = round(-distance*cos(angle*ANGLE_TO_RADS)*STRUCTURE_TO_FUNNEL)
             funnels[funnel_name] = Funnel(oval=is_oval, x_coord=x, y_coord=y)
 
     else:
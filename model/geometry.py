@@ -0,0 +1,192 @@
+"""Content-addressed store of the structures and funnel layouts of many ships
+
+The geometry is identified by a hash of its canonical form:
+    - a structure by its points, in funnel coordinates. Its name and fill state are not part of it
+    - a variant of a structure by its points moved so the outline starts at 0 along the ship:
+      the same outline at another place along the ship has the same variant
+    - a funnel layout by the positions and oval state of the funnels in use
+
+Ships of the same class, and the successive saves of a campaign, have the same structures.
+The store keeps one array of coordinates per distinct structure, shared by all the ships,
+and tells which structures and funnel layouts are duplicated across the ships.
+"""
+import hashlib
+import struct
+from collections import defaultdict
+
+# the coordinates are rounded to that many decimals in the hashes,
+# the conversions from the ship files can give tiny differences
+_DECIMALS = 6
+
+_DIGEST_SIZE = 16
+
+
+def structure_digest(coordinates):
+    """Hash of the points of a structure
+
+    Args:
+        coordinates (iterable): x0, y0, x1, y1... in funnel coordinates, see Structure.coordinates
+    Returns:
+        str, hexadecimal
+    """
+    return _digest(coordinates)
+
+
+def variant_digest(coordinates):
+    """Hash of the points of a structure, whatever its place along the ship
+
+    Args:
+        coordinates (iterable): see structure_digest
+    Returns:
+        str, hexadecimal
+    """
+    coordinates = list(coordinates)
+    start = min(coordinates[1::2], default=0.0)
+    coordinates[1::2] = [y - start for y in coordinates[1::2]]
+    return _digest(coordinates)
+
+
+def funnels_digest(funnels):
+    """Hash of the layout of the funnels of a ship, the funnels not in use are left out
+
+    Args:
+        funnels (dict): {name: Funnel}, see ShipData.funnels
+    Returns:
+        str, hexadecimal. None if no funnel is in use
+    """
+    layout = sorted((name, round(funnel.x, _DECIMALS) + 0.0, round(funnel.y, _DECIMALS) + 0.0,
+                     bool(funnel.oval))
+                    for name, funnel in funnels.items() if funnel.x != 0 or funnel.y != 0)
+    if not layout:
+        return None
+    return hashlib.blake2b(repr(layout).encode("utf-8"), digest_size=_DIGEST_SIZE).hexdigest()
+
+
+def ship_geometry(ship_data):
+    """The hashes of the geometry of a ship, small enough to be sent between processes
+
+    Returns:
+        dict: "structures": list of (name, digest, variant digest, points count),
+            the empty structures are left out.
+            "funnels": funnels_digest of the ship
+    """
+    return {"structures": [(structure.name, structure_digest(structure.coordinates),
+                            variant_digest(structure.coordinates), len(structure.points))
+                           for structure in ship_data.structures if len(structure.points)],
+            "funnels": funnels_digest(ship_data.funnels)}
+
+
+class GeometryStore:
+    """The distinct structures of many ships, and where each one is used
+
+    Attrs:
+        shared_bytes (int): memory of the coordinates arrays not held again thanks to intern
+    """
+
+    def __init__(self):
+        # digest -> the coordinates array shared by the structures
+        self._coordinates = {}
+        # digest -> list of (ship, structure name)
+        self._structures = defaultdict(list)
+        # variant digest -> set of digests
+        self._variants = defaultdict(set)
+        # digest -> points count
+        self._points_counts = {}
+        # funnels digest -> list of ships
+        self._funnel_layouts = defaultdict(list)
+        self.shared_bytes = 0
+
+    def __len__(self):
+        """Number of distinct structures"""
+        return len(self._structures)
+
+    def intern(self, ship_data, ship=None):
+        """Record the geometry of a ship, and share its structures' points with the same ones
+        already in the store
+
+        A shared array is copied when its structure is edited, see Structure.share_coordinates
+        Args:
+            ship_data (shipdata.ShipData):
+            ship (str or pathlib.Path): identifies the ship in the report, its path by default
+        Returns:
+            how many structures of the ship now share their points
+        """
+        geometry = ship_geometry(ship_data)
+        shared = 0
+        structures = [structure for structure in ship_data.structures if len(structure.points)]
+        for structure, (_name, digest, _variant, _count) in zip(structures,
+                                                                geometry["structures"]):
+            coordinates = structure.coordinates
+            existing = self._coordinates.setdefault(digest, coordinates)
+            if existing is not coordinates and existing == coordinates:
+                structure.share_coordinates(existing)
+                self.shared_bytes += coordinates.itemsize*len(coordinates)
+                shared += 1
+            elif existing is coordinates:
+                # the first one, the next structures will hold its array
+                structure.share_coordinates(existing)
+        self.record(ship_data.path if ship is None else ship, geometry)
+        return shared
+
+    def record(self, ship, geometry):
+        """Record the geometry of a ship, without sharing anything
+
+        Args:
+            ship (str or pathlib.Path): identifies the ship in the report
+            geometry (dict): see ship_geometry
+        """
+        ship = str(ship)
+        for name, digest, variant, points_count in geometry["structures"]:
+            self._structures[digest].append((ship, name))
+            self._variants[variant].add(digest)
+            self._points_counts[digest] = points_count
+        if geometry["funnels"] is not None:
+            self._funnel_layouts[geometry["funnels"]].append(ship)
+
+    def coordinates(self, digest):
+        """The shared coordinates array of a structure, None if not interned"""
+        return self._coordinates.get(digest)
+
+    def report(self):
+        """The duplicated geometry, the most copied first
+
+        The ships are recorded in the order the workers finish, the report is sorted
+        so the same ships always give the same report
+
+        Returns:
+            dict of JSON values:
+                "structures": number of structures recorded
+                "distinct": number of distinct structures
+                "duplicates": list of {"digest", "points", "copies": [[ship, name]...]},
+                    the structures found more than once
+                "variants": list of {"variant", "points", "digests": {digest: [[ship, name]...]}},
+                    the outlines found at more than one place along the ship
+                "funnel_layouts": list of {"digest", "ships": [ship...]},
+                    the funnel layouts found on more than one ship
+        """
+        duplicates = [{"digest": digest, "points": self._points_counts[digest],
+                       "copies": [list(copy) for copy in sorted(copies)]}
+                      for digest, copies in self._structures.items() if len(copies) > 1]
+        duplicates.sort(key=lambda group: (-len(group["copies"]), group["digest"]))
+        variants = [{"variant": variant,
+                     "points": self._points_counts[next(iter(digests))],
+                     "digests": {digest: [list(copy) for copy in sorted(self._structures[digest])]
+                                 for digest in sorted(digests)}}
+                    for variant, digests in self._variants.items() if len(digests) > 1]
+        variants.sort(key=lambda group: (-len(group["digests"]), group["variant"]))
+        funnel_layouts = [{"digest": digest, "ships": sorted(ships)}
+                          for digest, ships in self._funnel_layouts.items() if len(ships) > 1]
+        funnel_layouts.sort(key=lambda group: (-len(group["ships"]), group["digest"]))
+        return {"structures": sum(len(copies) for copies in self._structures.values()),
+                "distinct": len(self._structures),
+                "duplicates": duplicates,
+                "variants": variants,
+                "funnel_layouts": funnel_layouts}
+
+
+def _digest(coordinates):
+    # + 0.0 so -0.0 and 0.0 give the same bytes, little endian so the hashes are the same
+    # on every machine
+    canonical = [round(value, _DECIMALS) + 0.0 for value in coordinates]
+    return hashlib.blake2b(struct.pack(f"<{len(canonical)}d", *canonical),
+                           digest_size=_DIGEST_SIZE).hexdigest()
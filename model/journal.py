@@ -0,0 +1,272 @@
+"""Crash-recovery journal of the edits of a ship file
+
+Each command done, undone or redone is appended to the journal of the file as JSON lines,
+so an edit costs a small append instead of a save.
+The first line identifies the content of the ship file the edits apply to.
+When the file is opened again after a crash, the edits are replayed onto the ship data
+read from disk, if the file did not change in the meantime.
+Journaling is best effort: if the journal cannot be written, the error is logged once
+and the edits go on without it.
+The journal is started again once a save is written, with the edits done since the ship
+was snapshotted for it, and deleted when the editor is closed normally.
+
+Format, one JSON object per line:
+    {"journal": 1, "file": path of the ship file, "sha1": hash of its content}
+    {"structure": section name, "op": operation, ...values}
+    {"funnel": funnel name, "op": operation, ...values}
+"""
+import hashlib
+import json
+import logging
+import pathlib
+import appdirs
+
+JOURNALS_DIR = pathlib.Path(appdirs.user_data_dir("Draftnought")).joinpath("journals")
+
+_VERSION = 1
+
+details = logging.getLogger("Details")
+
+
+class Journal:
+    """The journal of the edits of one ship
+
+    Args:
+        ship_data (shipdata.ShipData): the ship being edited
+        file_path (str or pathlib.Path): the ship file the edits will be saved to.
+            If None, the file the ship was read from
+        journals_dir (str or pathlib.Path): where the journals are kept
+    """
+
+    def __init__(self, ship_data, file_path=None, journals_dir=JOURNALS_DIR):
+        self._journals_dir = pathlib.Path(journals_dir)
+        self._file_path = pathlib.Path(file_path if file_path is not None
+                                       else ship_data.path).resolve()
+        self._file = None
+        # set on the first error writing the journal, see _disable
+        self._disabled = False
+        # records appended in the session, and that count when the journal was started again:
+        # the records of the journal file after the recovered ones, see mark
+        self._count = 0
+        self._start = 0
+        # the targets of the records, by object and by (kind, name)
+        self._names = {}
+        self._targets = {}
+        for structure in ship_data.structures:
+            self._names[id(structure)] = ("structure", structure.name)
+            self._targets[("structure", structure.name)] = structure
+        for name, funnel in ship_data.funnels.items():
+            self._names[id(funnel)] = ("funnel", name)
+            self._targets[("funnel", name)] = funnel
+
+    @property
+    def path(self):
+        """Path of the journal file"""
+        return journal_path(self._file_path, self._journals_dir)
+
+    def recover(self):
+        """Replay the journal left by a previous session onto the ship data
+
+        Only if the journal is about the current content of the ship file.
+        Then the journal continues after the recovered edits, else it is started again.
+        Returns:
+            how many edits were replayed
+        """
+        header, records = self._read()
+        replayed = 0
+        if header is not None:
+            for record in records:
+                try:
+                    self._apply(record)
+                except (KeyError, IndexError, TypeError, ValueError) as error:
+                    details.warning("Journal %s: cannot replay %s\n%s", self.path, record, error)
+                    break
+                replayed += 1
+        if replayed:
+            # the replayed records stay, the next ones are appended after them.
+            # Written again without what could not be read or replayed
+            self.close()
+            try:
+                with open(self.path, "w") as file:
+                    file.write(header)
+                    for record in records[:replayed]:
+                        file.write(json.dumps(record) + "\n")
+                self._file = open(self.path, "a")
+            except OSError as error:
+                self._disable(error)
+        else:
+            self.restart()
+        return replayed
+
+    def mark(self):
+        """Where the journal is, taken when the ship is snapshotted to be saved
+
+        Returns:
+            int, to give to restart once the snapshot is written
+        """
+        return self._count
+
+    def append(self, records):
+        """Add the changes of a command, see Command.journal_records
+
+        The journal is flushed to the system after each command
+        """
+        if self._file is None:
+            self.restart()
+        if self._disabled:
+            return
+        try:
+            for target, operation, values in records:
+                kind, name = self._names[id(target)]
+                self._file.write(json.dumps({kind: name, "op": operation, **values}) + "\n")
+                self._count += 1
+            self._file.flush()
+        except OSError as error:
+            self._disable(error)
+
+    def restart(self, text=None, file_path=None, since=None):
+        """Start the journal again, like when the ship is saved
+
+        Args:
+            text (str): the content of the ship file the next edits apply to,
+                if None it is read from the file
+            file_path (str or pathlib.Path): if given, the ship is now saved to that file.
+                The journal of the previous file is deleted
+            since (int): the mark taken when text was snapshotted, the edits done after it
+                are kept. If None, the journal is started empty
+        """
+        if self._disabled or since is not None and since < self._start:
+            # or started again already, from a later snapshot
+            return
+        try:
+            kept = self._lines_since(since) if since is not None else []
+            if file_path is not None and pathlib.Path(file_path).resolve() != self._file_path:
+                self.discard()
+                if self._disabled:
+                    return
+                self._file_path = pathlib.Path(file_path).resolve()
+            if text is None:
+                text = _read_text(self._file_path)
+            self.close()
+            self._journals_dir.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w")
+            self._file.write(json.dumps({"journal": _VERSION, "file": str(self._file_path),
+                                         "sha1": _text_hash(text or "")}) + "\n")
+            for line in kept:
+                self._file.write(line + "\n")
+            self._file.flush()
+        except OSError as error:
+            self._disable(error)
+            return
+        self._start = self._count if since is None else since
+
+    def close(self):
+        """Close the journal file, it is kept on disk"""
+        if self._file is not None:
+            file, self._file = self._file, None
+            try:
+                file.close()
+            except OSError as error:
+                self._disable(error)
+
+    def discard(self):
+        """Close and delete the journal file, when the edits do not need to be recovered"""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            self._disable(error)
+
+    def _disable(self, error):
+        """Stop journaling for this ship, the error is logged the first time only"""
+        if not self._disabled:
+            details.warning("Journal %s cannot be written, the edits will not be recoverable "
+                            "after a crash:\n%s", self.path, error)
+        self._disabled = True
+        self.close()
+
+    def _lines_since(self, since):
+        """The lines of the records appended after a mark, they are the last of the file"""
+        count = self._count - since
+        if not count:
+            return []
+        with open(self.path) as file:
+            lines = file.read().splitlines()
+        return lines[-count:]
+
+    def _read(self):
+        """The records of the journal on disk
+
+        Returns:
+            (header line, list of dict), (None, []) if there is no journal
+            for the current content of the ship file
+        """
+        try:
+            with open(self.path) as file:
+                lines = file.read().splitlines()
+        except OSError:
+            return None, []
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None, []
+        text = _read_text(self._file_path)
+        if (not isinstance(header, dict) or header.get("journal") != _VERSION or text is None
+                or header.get("sha1") != _text_hash(text)):
+            details.warning("Journal %s is not about the current content of %s, ignored",
+                            self.path, self._file_path)
+            return None, []
+        records = []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # the last line can be cut short by the crash
+                break
+        return lines[0] + "\n", records
+
+    def _apply(self, record):
+        """Do again the change of a record on the ship data"""
+        kind = "structure" if "structure" in record else "funnel"
+        target = self._targets[(kind, record[kind])]
+        operation = record["op"]
+        if operation == "update_point":
+            target.update_point(record["index"], record["x"], record["y"])
+        elif operation == "add_point":
+            if not 0 <= record["index"] <= len(target.points):
+                raise IndexError(f"no point {record['index']}")
+            target.add_point(record["index"], record["x"], record["y"])
+        elif operation == "delete_point":
+            target.delete_point(record["index"])
+        elif operation == "set_fill":
+            target.fill = bool(record["fill"])
+        elif operation == "set_points":
+            target.points = [tuple(point) for point in record["points"]]
+        elif operation == "move":
+            target.x = record["x"]
+            target.y = record["y"]
+        elif operation == "set_oval":
+            target.oval = bool(record["oval"])
+        else:
+            raise ValueError(f"unknown operation {operation}")
+
+
+def journal_path(file_path, journals_dir=JOURNALS_DIR):
+    """Path of the journal of a ship file: named after the hash of the file's absolute path"""
+    name = hashlib.sha1(str(pathlib.Path(file_path).resolve()).encode("utf-8")).hexdigest()
+    return pathlib.Path(journals_dir).joinpath(f"{name}.jsonl")
+
+
+def _read_text(path):
+    """Content of a ship file as ShipData reads it, None if it cannot be read"""
+    try:
+        with open(path) as file:
+            return file.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
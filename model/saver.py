@@ -0,0 +1,172 @@
+"""Save the ship files from a background thread, so a slow disk never blocks the editor
+
+The ship is encoded on the calling thread, which gives a snapshot of its state:
+the edits done while the file is being written go to the next save.
+Only the file writing is done in the background. Saves to a path that is already
+waiting to be written replace the waiting one, so only the latest content is written.
+The results are reported through the Summary logger, and to the caller's on_written
+functions by deliver_results, on the caller's thread.
+The app config file is only written once the ship file it records is written.
+"""
+import logging
+import pathlib
+import queue
+import threading
+import parameters_loader
+from model.shipdata import atomic_write
+
+summary = logging.getLogger("Summary")
+details = logging.getLogger("Details")
+
+
+class BackgroundSaver:
+    """The thread that writes the ship files, and the saves waiting to be written"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # path -> (text, newline, recent files data or None, on_written or None),
+        # in the order of the saves
+        self._pending = {}
+        # (on_written, written) of the saves done, see deliver_results
+        self._results = queue.Queue()
+        # latest recent files data of a written ship file, to write once the ship files are written
+        self._recent_files = None
+        # the paths whose last write failed, left out of the recent files. Saver's thread only
+        self._failed = set()
+        self._busy = False
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="BackgroundSaver", daemon=True)
+        self._thread.start()
+
+    def save(self, ship_data, path, parameters=None, on_written=None):
+        """Take a snapshot of a ship and queue it to be written to path
+
+        Returns at once, the file is written atomically by the saver's thread
+        Args:
+            ship_data (shipdata.ShipData):
+            path (str or pathlib.Path): where to write the ship file
+            parameters (parameters_loader.Parameters): if given, path is recorded
+                as the most recent file and the app config file is written too,
+                if the ship file could be written
+            on_written (function): on_written(written) is called by deliver_results once
+                the file is written, written is False if it could not be.
+                Not called if a newer save to the same path replaces this one before it is written
+        Returns:
+            str, the snapshot: the content that will be written
+        """
+        text = ship_data.ini_text()
+        recent_files = None
+        if parameters is not None:
+            recent_files = parameters.update_recent_files(str(path), saved=True)
+        with self._condition:
+            if self._closing:
+                raise RuntimeError("the saver is closed")
+            # coalesced: the older snapshot waiting for this path is dropped
+            self._pending.pop(str(path), None)
+            self._pending[str(path)] = (text, ship_data.newline, recent_files, on_written)
+            self._condition.notify_all()
+        return text
+
+    def flush(self, timeout=None):
+        """Wait until all the saves are written
+
+        Args:
+            timeout (float): in seconds, None to wait as long as needed
+        Returns:
+            True if everything is written, False if the timeout expired before
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._busy and not self._pending and self._recent_files is None,
+                timeout)
+
+    def deliver_results(self):
+        """Call the on_written functions of the saves done since the last call
+
+        Called from the thread that saves, like from a timer of the GUI
+        Returns:
+            True if saves are still waiting to be written
+        """
+        # checked first: the results of the saves done by then are all in the queue
+        with self._condition:
+            waiting = self._busy or bool(self._pending)
+        while True:
+            try:
+                on_written, written = self._results.get_nowait()
+            except queue.Empty:
+                return waiting
+            on_written(written)
+
+    def close(self, timeout=None):
+        """Write the waiting saves, then stop the thread
+
+        Args:
+            timeout (float): see flush
+        Returns:
+            True if everything was written
+        """
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: (self._pending or self._recent_files is not None
+                                                  or self._closing))
+                if self._pending:
+                    path = next(iter(self._pending))
+                    job = self._pending.pop(path)
+                    recent_files = None
+                elif self._recent_files is not None:
+                    job = None
+                    recent_files, self._recent_files = self._recent_files, None
+                else:
+                    return
+                self._busy = True
+            try:
+                if job is not None:
+                    self._write(path, *job)
+                else:
+                    parameters_loader.write_recent_files(
+                        {recent_path: view for recent_path, view in recent_files.items()
+                         if recent_path not in self._failed or pathlib.Path(recent_path).exists()})
+            except Exception:  # pylint: disable=broad-except
+                # the thread must keep going for the next saves
+                summary.error("Could not save file: %s", path if job is not None else
+                              "app config file")
+                details.exception("Unexpected error in the background saver")
+                if job is not None and job[3] is not None:
+                    self._results.put((job[3], False))
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _write(self, path, text, newline, recent_files, on_written):
+        """Write a ship file, then hand its recent files data to the writer if it succeeded"""
+        written = _write_ship_file(path, text, newline)
+        if not written:
+            self._failed.add(path)
+        else:
+            self._failed.discard(path)
+            if recent_files is not None:
+                with self._condition:
+                    self._recent_files = recent_files
+        if on_written is not None:
+            self._results.put((on_written, written))
+
+
+def _write_ship_file(path, text, newline):
+    """Returns True if the file was written, the errors are logged"""
+    try:
+        atomic_write(path, text, newline)
+    except OSError as error:
+        summary.error("Could not save file:\n%s", error)
+        details.error("Could not save file:\n%s", error)
+        return False
+    summary.info("saved %s", path)
+    return True
@@ -1,12 +1,18 @@
 """Reads and write ship data from/to RTW's ship files
 """
 import configparser
+import contextlib
+import io
+import os
 import pathlib
+import shutil
+import tempfile
 from math import pi
 from PIL import Image
-from model.structure import Structure
-from model.turrets_torps import Turret, Torpedo
-from model.funnel import funnels_as_ini_section, parse_funnels, ANGLE_TO_RADS, STRUCTURE_TO_FUNNEL
+from model.structure import read_structures, structures_as_ini_sections
+from model.turrets_torps import Turret, Torpedo, occupied_mask
+from model.funnel import funnels_as_ini_section, parse_funnels
+from model.coordinates import ANGLE_TO_RADS, STRUCTURE_TO_FUNNEL
 
 # to set up the display if starting without loading a file
 DEFAULT_HALF_LENGTH = 200
@@ -31,6 +37,9 @@ class ShipData:
             {"funnelname": {"Pos":number, "Oval":number}}
         half_length (int): lengths from center to bow, in funnel coordinates
         ship_type (string): ship type, like "BC", "DD"...
+        displacement (int): displacement in tons
+        caliber (int): caliber of the main guns in inches, None if not in the file
+        picture_name (string): name of the side picture file, as in the ship file
         side_pict (PIL.Image or None): A PIL Image if a side picture path was set in the file,
             and this path can be found and read as a picture. Else None
     """
@@ -44,11 +53,17 @@ class ShipData:
         self._parser = configparser.ConfigParser(strict=False)
         # we preserve the case of the option names, instead of converting all to lower case
         self._parser.optionxform = str
+        content = file.read()
         try:
-            self._parser.read_file(file)
+            self._parser.read_string(content, source=str(self.path))
         except configparser.Error as error:
             raise ShipFileInvalidException(
                 self.path.resolve(), error) from error
+        # the text of each section as read, written back as is if the section is not edited
+        self._raw_sections = split_raw_sections(content, self._parser.sections())
+        # keep the line endings of the file when writing it back
+        newlines = getattr(file, "newlines", None)
+        self._newline = newlines if isinstance(newlines, str) else None
 
         for section in MANDATORY_SECTIONS_OPTIONS:
             if section not in self._parser.keys():
@@ -69,21 +84,23 @@ class ShipData:
         # No length data in the ship file, length is determined from tonnage and ship type
         # reverse-engineered from in game ships
         self.ship_type = self._parser['Data']['ShipType']
-        displacement = self._parser['Data'].getint('Displacement')
+        self.displacement = self._parser['Data'].getint('Displacement')
+        self.caliber = caliber
+        self.picture_name = self._parser["Data"]["PictureName"]
 
         # grab the first length whose tonnage is above our tonnage for the correct ship type
         # assumes the length to tonnage are ordered
         # the lengths are in "funnel coordinates"
         self.half_length = [v for k, v in
                             parameters.ships_hlengths[self.ship_type].items()
-                            if k > displacement][0]
+                            if k > self.displacement][0]
 
         turret_data = {}
         torps = []
+        structures_sections = []
         for section, section_content in self._parser.items():
             if "Superstructure" in section:
-                new_struct = Structure(section, section_content, self.is_rtw2)
-                self.structures.append(new_struct)
+                structures_sections.append((section, section_content))
             elif "Turret" in section:
                 turret_data[self._parser[section]["Pos"]
                             ] = self._parser[section].getint("Guns")
@@ -93,7 +110,12 @@ class ShipData:
                         section_content, self.half_length, parameters)
                     torps.append(new_torp)
 
-        self.turrets_torps = [Turret(caliber, k, v, self.half_length, turret_data, parameters)
+        # all the points of all the structures are converted in one go
+        self.structures = read_structures(structures_sections, self.is_rtw2)
+
+        # the turrets positions are looked up from the mask of all the used positions
+        occupied = occupied_mask(turret_data)
+        self.turrets_torps = [Turret(caliber, k, v, self.half_length, occupied, parameters)
                               for k, v in turret_data.items()] + torps
 
         self.funnels = parse_funnels(self._parser["Funnels"], self.is_rtw2)
@@ -111,6 +133,12 @@ class ShipData:
     def write_as_ini(self, file_object=None, file_path=None):
         """Write the ship data in a RTW-readable format to the given file path or file object
         Choose one or the other method!
+        If none, the file the ship was read from is overwritten
+
+        Only the edited structures and funnels are encoded again,
+        the other sections are written exactly as they were read.
+        The files are written atomically: to a temporary file in the same folder
+        that then replaces the target, so a crash never leaves a half-written ship file.
 
         OSErrors should be handled by the caller
 
@@ -118,25 +146,167 @@ class ShipData:
             file_path (str): file path to save
             file_object (IOstram): writeable file-like object to save
         """
-        for struct in self.structures:
-            self._parser[struct.name] = struct.as_ini_section()
-
-        self._parser["Funnels"] = funnels_as_ini_section(
-            self.funnels, self.is_rtw2)
-        if file_path is not None:
-            with open(file_path, "w") as file:
-                self._parser.write(file, space_around_delimiters=False)
-        elif file_object is not None:
-            self._parser.write(file_object, space_around_delimiters=False)
+        text = self.ini_text()
+        if file_object is not None and file_path is None:
+            file_object.write(text)
+        else:
+            if file_path is None:
+                file_path = self.path.resolve()
+            atomic_write(file_path, text, newline=self._newline)
+
+    def ini_text(self):
+        """The content of the ship file with the current data, as write_as_ini writes it
+
+        The returned text becomes the reference for the next save:
+        the structures and funnels are not dirty anymore.
+        Used to take a snapshot of the ship that is written later, see model.saver
+        Returns:
+            str, with "\n" newlines
+        """
+        edited = {}
+        dirty_structures = [struct for struct in self.structures if struct.dirty]
+        for struct, section in zip(dirty_structures,
+                                   structures_as_ini_sections(dirty_structures)):
+            edited[struct.name] = section
+        if any(funnel.dirty for funnel in self.funnels.values()):
+            edited["Funnels"] = funnels_as_ini_section(self.funnels, self.is_rtw2)
+
+        raw_sections = self._edited_raw_sections(edited)
+        if raw_sections is None:
+            text = self._edited_ini_text(edited)
         else:
-            with open(self.path.resolve(), "w") as file:
-                self._parser.write(file, space_around_delimiters=False)
+            text = "".join(section_text for _name, section_text in raw_sections)
+
+        # the new content is now the reference for the next save
+        for name, section in edited.items():
+            self._parser[name] = section
+        if raw_sections is not None:
+            self._raw_sections = raw_sections
+        for struct in dirty_structures:
+            struct.dirty = False
+        for funnel in self.funnels.values():
+            funnel.dirty = False
+        return text
+
+    @property
+    def newline(self):
+        """The newline of the file the ship was read from, None if it is not known"""
+        return self._newline
+
+    def _edited_raw_sections(self, edited):
+        """The raw sections of the file, with the edited sections encoded again
+
+        Args:
+            edited (dict): {section name: section content} for the edited sections
+        Returns:
+            list of (section name, text), None if the sections of the file
+            could not be split, see split_raw_sections
+        """
+        if self._raw_sections is None:
+            return None
+        raw_sections = []
+        written = set()
+        for name, section_text in self._raw_sections:
+            if name in edited:
+                # a section repeated in the file is merged by the parser, written once
+                if name in written:
+                    continue
+                written.add(name)
+                section_text = _section_as_text(name, edited[name])
+            if raw_sections and not raw_sections[-1][1].endswith("\n"):
+                raw_sections[-1] = (raw_sections[-1][0], raw_sections[-1][1] + "\n")
+            raw_sections.append((name, section_text))
+        return raw_sections
+
+    def _edited_ini_text(self, edited):
+        """The whole file encoded again by the parser, with the edited sections"""
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.optionxform = str
+        for name in self._parser.sections():
+            if name in edited:
+                parser[name] = edited[name]
+            else:
+                parser[name] = dict(self._parser.items(name, raw=True))
+        text = io.StringIO()
+        parser.write(text, space_around_delimiters=False)
+        return text.getvalue()
+
+
+def split_raw_sections(content, section_names):
+    """Split the text of an INI file in sections, as written in the file
+
+    Args:
+        content (str): the text of the file
+        section_names (list): the sections found by the parser, to check the split
+    Returns:
+        list of (section name, text) in the order of the file, the text includes the header
+        and all the lines up to the next header.
+        The text before the first section has the name None.
+        None if the sections do not match the parser's
+    """
+    raw_sections = []
+    name = None
+    lines = []
+    for line in content.splitlines(keepends=True):
+        header = None
+        if line[:1] not in (" ", "\t"):
+            header = configparser.ConfigParser.SECTCRE.match(line.strip())
+        if header is not None:
+            if lines:
+                raw_sections.append((name, "".join(lines)))
+            name = header.group("header")
+            lines = []
+        lines.append(line)
+    if lines:
+        raw_sections.append((name, "".join(lines)))
+    if {name for name, _text in raw_sections if name is not None} != set(section_names):
+        return None
+    return raw_sections
+
+
+def atomic_write(path, text, newline=None):
+    """Write a text file that is never left half-written
+
+    The text is written to a temporary file in the same folder, then the temporary file
+    replaces the target in one operation. The target keeps its permissions
+
+    Args:
+        path (str or pathlib.Path): the file to write
+        text (str): the new content
+        newline (str): line endings, as for open()
+    """
+    path = pathlib.Path(path)
+    temporary = tempfile.NamedTemporaryFile("w", dir=path.parent, prefix=f".{path.name}.",
+                                            suffix=".tmp", delete=False, newline=newline)
+    try:
+        with temporary:
+            temporary.write(text)
+            temporary.flush()
+            os.fsync(temporary.fileno())
+        if path.exists():
+            shutil.copymode(path, temporary.name)
+        os.replace(temporary.name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temporary.name)
+        raise
+
+
+def _section_as_text(name, section):
+    """A section formatted like the parser writes it"""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.optionxform = str
+    parser[name] = section
+    text = io.StringIO()
+    parser.write(text, space_around_delimiters=False)
+    return text.getvalue()
 
 
 class ShipFileInvalidException(Exception):
     """Errors that can be raised while reading a ship data file"""
 
     def __init__(self, file_path, root_error=None, message=None):
+        self.file_path = file_path
         if isinstance(root_error, configparser.Error):
             super().__init__(
                 f"Could not parse as INI the file {file_path}\n{root_error.message}")
@@ -148,3 +318,7 @@ class ShipFileInvalidException(Exception):
         else:
             super().__init__(
                 f"Unspecified error trying to read file {file_path}")
+
+    def __reduce__(self):
+        """Keep the message when sent to another process, the root error may not be picklable"""
+        return (self.__class__.__new__, (self.__class__, str(self)), self.__dict__)
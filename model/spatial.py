@@ -0,0 +1,143 @@
+"""Spatial index of the shapes drawn on the top view, to find what is under the mouse
+
+The shapes are structures (their vertices and edges) and funnels (their centre),
+in funnel coordinates so the index does not change with the zoom or the scrolling.
+They are stored in a uniform grid of square cells: a query only looks at the few cells
+around the queried point, whatever the number of shapes on the ship.
+"""
+import math
+from collections import defaultdict, namedtuple
+
+VERTEX = "vertex"
+EDGE = "edge"
+
+# what a query found:
+#   key: the key the shape was added with
+#   kind: VERTEX or EDGE
+#   index: index of the vertex, or of the first vertex of the edge
+#   distance: from the queried point to the vertex, edge or funnel outline, 0 if inside
+Hit = namedtuple("Hit", ["key", "kind", "index", "distance"])
+
+
+class SpatialIndex:
+    """Uniform grid of the vertices and edges of shapes
+
+    Args:
+        cell_size (number): side of the cells, in funnel coordinates.
+            About the length of the edges is a good choice.
+    """
+
+    def __init__(self, cell_size):
+        self._cell_size = cell_size
+        # (column, row) -> set of (key, kind, index)
+        self._cells = defaultdict(set)
+        # key -> (points, closed, radius, cells the shape is in)
+        self._shapes = {}
+        self._max_radius = 0.0
+
+    def __contains__(self, key):
+        return key in self._shapes
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def set_shape(self, key, points, closed=False, radius=0.0):
+        """Add a shape, or replace the shape already added with that key
+
+        Args:
+            key (hashable): identifies the shape, given back in the hits
+            points (list): the vertices, (x, y) in funnel coordinates
+            closed (bool): there is an edge from the last vertex to the first
+            radius (number): the vertices are discs of that radius, like the funnels
+        """
+        self.remove(key)
+        points = [tuple(point) for point in points]
+        cells = set()
+        for index, point in enumerate(points):
+            cell = self._cell(point)
+            self._cells[cell].add((key, VERTEX, index))
+            cells.add(cell)
+        for index in range(len(points) - 1 + (closed and len(points) > 2)):
+            entry = (key, EDGE, index)
+            for cell in self._segment_cells(points[index], points[(index + 1) % len(points)]):
+                self._cells[cell].add(entry)
+                cells.add(cell)
+        self._shapes[key] = (points, closed, radius, cells)
+        self._max_radius = max(self._max_radius, radius)
+
+    def remove(self, key):
+        """Forget a shape, nothing happens if there is none with that key"""
+        shape = self._shapes.pop(key, None)
+        if shape is None:
+            return
+        for cell in shape[3]:
+            entries = self._cells[cell]
+            entries.difference_update([entry for entry in entries if entry[0] == key])
+            if not entries:
+                del self._cells[cell]
+
+    def points(self, key):
+        """The vertices of a shape, as given to set_shape"""
+        return self._shapes[key][0]
+
+    def nearest(self, point, radius, accept=None):
+        """What is nearest to a point, within a radius
+
+        Vertices come first: an edge is only found if there is no vertex within the radius.
+        Args:
+            point (x, y): in funnel coordinates
+            radius (number): search radius, in funnel coordinates
+            accept (function): if given, takes (key, kind, index) and returns False
+                for the vertices and edges that must be ignored
+        Returns:
+            Hit, None if nothing is within the radius
+        """
+        search = radius + self._max_radius
+        min_column, min_row = self._cell((point[0] - search, point[1] - search))
+        max_column, max_row = self._cell((point[0] + search, point[1] + search))
+        best = {VERTEX: None, EDGE: None}
+        seen = set()
+        for column in range(min_column, max_column + 1):
+            for row in range(min_row, max_row + 1):
+                for entry in self._cells.get((column, row), ()):
+                    if entry in seen or (accept is not None and not accept(*entry)):
+                        continue
+                    seen.add(entry)
+                    key, kind, index = entry
+                    points, _closed, shape_radius, _cells = self._shapes[key]
+                    if kind == VERTEX:
+                        distance = _distance(point, points[index])
+                    else:
+                        distance = _segment_distance(point, points[index],
+                                                     points[(index + 1) % len(points)])
+                    distance = max(0.0, distance - shape_radius)
+                    if distance <= radius and (best[kind] is None
+                                               or distance < best[kind].distance):
+                        best[kind] = Hit(key, kind, index, distance)
+        return best[VERTEX] or best[EDGE]
+
+    def _cell(self, point):
+        return (math.floor(point[0]/self._cell_size), math.floor(point[1]/self._cell_size))
+
+    def _segment_cells(self, start, end):
+        """The cells of the bounding box of a segment"""
+        min_column, min_row = self._cell((min(start[0], end[0]), min(start[1], end[1])))
+        max_column, max_row = self._cell((max(start[0], end[0]), max(start[1], end[1])))
+        return [(column, row) for column in range(min_column, max_column + 1)
+                for row in range(min_row, max_row + 1)]
+
+
+def _segment_distance(point, start, end):
+    """Distance from a point to the segment [start, end]"""
+    delta_x = end[0] - start[0]
+    delta_y = end[1] - start[1]
+    length_squared = delta_x*delta_x + delta_y*delta_y
+    if length_squared == 0:
+        return _distance(point, start)
+    ratio = ((point[0] - start[0])*delta_x + (point[1] - start[1])*delta_y)/length_squared
+    ratio = min(1.0, max(0.0, ratio))
+    return _distance(point, (start[0] + ratio*delta_x, start[1] + ratio*delta_y))
+
+
+def _distance(point_a, point_b):
+    return math.hypot(point_a[0] - point_b[0], point_a[1] - point_b[1])
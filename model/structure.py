@@ -1,76 +1,88 @@
 """Class for the superstructures data
 And the commands that change it
 """
-from math import atan2, sin, cos, pi, sqrt
+import itertools
+from array import array
+from collections.abc import Sequence
+from math import pi
 from window.framework import Observable, Command
-import model.shipdata as sd
+from model.coordinates import points_to_funnel, points_to_rtw, ANGLE_TO_RADS
 
 STRUCTURE_POINTS_MAX_RTW1 = 21
 STRUCTURE_POINTS_MAX_RTW2 = 25
 
+# angle written for the points on the y == 0 line
+_CENTERLINE_ANGLE = int(pi/2.0 * 1.0/ANGLE_TO_RADS)
+
+
+class PointsView(Sequence):
+    """Read-only view of the points of a structure, as (x, y) tuples in funnel coordinates
+
+    It follows the changes of the structure: take a list of it to keep the current points
+    Args:
+        coordinates (array): x0, y0, x1, y1...
+    """
+
+    __slots__ = ("_coordinates",)
+
+    def __init__(self, coordinates):
+        self._coordinates = coordinates
+
+    def __len__(self):
+        return len(self._coordinates)//2
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[point_index] for point_index in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("point index out of range")
+        return (self._coordinates[2*index], self._coordinates[2*index + 1])
+
+    def __iter__(self):
+        coordinates = iter(self._coordinates)
+        return zip(coordinates, coordinates)
+
+    def __eq__(self, other):
+        if isinstance(other, PointsView):
+            return self._coordinates == other._coordinates
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"PointsView({list(self)})"
+
 
 class Structure(Observable):
     """Container for the data needed to draw a superstructure and their operations
 
         name (str): the name of the superstructure section in the ship file
         raw_data (dict): section about the superstructure straight from the parsed file
+        is_rtw2 (bool): the file is from RTW2
+        points (list): the points already converted to funnel coordinates.
+            If None, they are read from raw_data. See read_structures
+    Attrs:
+        dirty (bool): the structure changed since it was read or last saved,
+            so its section must be written again
     """
 
-    def __init__(self, name, raw_data, is_rtw2):
+    __slots__ = ("name", "_is_rtw2", "_fill", "_coordinates", "_points", "_shared", "dirty")
+
+    def __init__(self, name, raw_data, is_rtw2, points=None):
         super().__init__()
         self.name = name
-        self._points = []
         self._is_rtw2 = is_rtw2
-        rtw_points = []
-        self._fill = True
-        for k in raw_data.keys():
-            if "IsLine" in k:
-                self._fill = not raw_data.getboolean(k)
-            else:
-                value = raw_data.getint(k)
-                dist_string_index = k.find("Distance")
-                angle_string_index = k.find("Angle")
-                point_index = int(
-                    k[len("Point"):max(dist_string_index, angle_string_index)])
-
-                if point_index <= len(rtw_points)-1:
-                    # if the point has already been encountered, update it
-                    if dist_string_index != -1 and value != 0:
-                        rtw_points[point_index] = (
-                            rtw_points[point_index][0], value)
-                    elif angle_string_index != -1:
-                        rtw_points[point_index] = (
-                            value, rtw_points[point_index][1])
-                else:
-                    # if this is a new point, fill all the points between the last encountered point
-                    # and the new point with (0,0)
-                    # that's in case we go from point1 to point3 and then we have point2
-                    while len(rtw_points) < point_index-1:
-                        rtw_points.append((0, 0))
-                    if dist_string_index != -1:
-                        rtw_points.append((0, value))
-                    elif angle_string_index != -1:
-                        rtw_points.append((value, 0))
-
-        # get rid of "empty" points
-        # that's what the game seems to do
-        rtw_points[:] = [point for point in rtw_points if (
-            point[0] != 0 or point[1] != 0)]
-
-        # all duplicates are deleted, and the circular coordinates are converted to cartesian
-        temp_point = (0, 0)
-        for point in rtw_points:
-            if point != temp_point:
-                # origin is more or less the middle of the ship
-                # x to the right
-                # y to the bow
-                # the magic value for the angle is from estimations from the game
-                x = (-point[1]*sin(point[0]*sd.ANGLE_TO_RADS)
-                     * sd.STRUCTURE_TO_FUNNEL)
-                y = (-point[1]*cos(point[0]*sd.ANGLE_TO_RADS)
-                     * sd.STRUCTURE_TO_FUNNEL)
-                self._points.append((x, y))
-                temp_point = (point[0], point[1])
+        self._fill = read_fill(raw_data)
+        if points is None:
+            points = points_to_funnel([read_rtw_points(raw_data)])[0]
+        # the points as a flat array of the coordinates, x0, y0, x1, y1...
+        self._coordinates = array("d", itertools.chain.from_iterable(points))
+        self._points = PointsView(self._coordinates)
+        # the coordinates array is held by other structures too, see share_coordinates
+        self._shared = False
+        self.dirty = False
 
     @property
     def fill(self):
@@ -83,37 +95,71 @@ class Structure(Observable):
     def fill(self, value):
         if self._fill != value:
             self._fill = value
+            self.dirty = True
             self._notify("fill", {"fill": value})
 
     @property
     def points(self):
-        """expose the structure's point list"""
+        """expose the structure's points, a read-only PointsView"""
         return self._points
 
     @points.setter
     def points(self, value):
-        self._points = value
-        self._notify("replace_poits", {"new_points": value})
+        self._own_coordinates()
+        self._coordinates[:] = array("d", itertools.chain.from_iterable(value))
+        self.dirty = True
+        self._notify("replace_poits", {"new_points": value}, merge_key=None)
+
+    @property
+    def coordinates(self):
+        """The points as a flat array of the coordinates, x0, y0, x1, y1...
 
-    def as_ini_section(self):
+        Can be shared with other structures: never modify it
+        """
+        return self._coordinates
+
+    def share_coordinates(self, coordinates):
+        """Hold the points in an array shared with other structures with the same points
+
+        The array is copied on the first edit of the structure, see model.geometry
+        Args:
+            coordinates (array): equal to the structure's coordinates
+        """
+        if coordinates != self._coordinates:
+            raise ValueError(f"{self.name}: the shared coordinates are not the structure's")
+        self._coordinates = coordinates
+        self._points._coordinates = coordinates
+        self._shared = True
+
+    def _own_coordinates(self):
+        """Copy the shared coordinates before they are edited"""
+        if self._shared:
+            self._coordinates = array("d", self._coordinates)
+            # the views already given out follow the copy
+            self._points._coordinates = self._coordinates
+            self._shared = False
+
+    @property
+    def max_points(self):
+        """How many points the game can handle for this structure"""
+        return STRUCTURE_POINTS_MAX_RTW2 if self._is_rtw2 else STRUCTURE_POINTS_MAX_RTW1
+
+    def as_ini_section(self, rtw_points=None):
         """returns a dict that looks like the raw data loaded from the ship file
 
                 but with the edited points
             intended to be used to write a new ship file with the modifications
+        Args:
+            rtw_points (list): the points already converted to (angle, distance).
+                If None, they are converted here. See structures_as_ini_sections
         """
-
-        max_points = STRUCTURE_POINTS_MAX_RTW2 if self._is_rtw2 else STRUCTURE_POINTS_MAX_RTW1
+        max_points = self.max_points
+        if rtw_points is None:
+            rtw_points = points_to_rtw([self._points[:max_points]], _CENTERLINE_ANGLE)[0]
         section_content = {}
-        for index, point in enumerate(self._points):
-            angle = int(pi/2.0 * 1.0/sd.ANGLE_TO_RADS)
-            if point[1] != 0:
-                angle = int(atan2(-point[0], -point[1]) * 1.0/sd.ANGLE_TO_RADS)
-            distance = int(
-                sqrt(pow(point[0], 2) + pow(point[1], 2))/sd.STRUCTURE_TO_FUNNEL)
+        for index, (angle, distance) in enumerate(rtw_points[:max_points]):
             section_content[f"Point{index}Angle"] = angle
             section_content[f"Point{index}Distance"] = distance
-            if len(section_content)//2 >= max_points:
-                break
 
         # pad the dict to the specified point amount with "empty" points
         if len(section_content)/2 < max_points:
@@ -137,8 +183,12 @@ class Structure(Observable):
             new_x (number): new value for x coordinate, funnel coordinates
             new_y (number):  new value for y coordinate, funnel coordinates
         """
-        self._points[point_index] = (new_x, new_y)
-        self._notify("update", {"index": point_index, "x": new_x, "y": new_y})
+        position = _position(point_index, len(self._points))
+        self._own_coordinates()
+        self._coordinates[2*position:2*position + 2] = array("d", (new_x, new_y))
+        self.dirty = True
+        self._notify("update", {"index": point_index, "x": new_x, "y": new_y},
+                     merge_key=point_index)
 
     def add_point(self, point_index, new_x, new_y):
         """Call this when adding a point
@@ -151,9 +201,14 @@ class Structure(Observable):
             new_x (number): new value for x coordinate, funnel coordinates
             new_y (number):  new value for y coordinate, funnel coordinates
         """
-        self._points.insert(point_index, (new_x, new_y))
+        # like list.insert, out of range indexes insert at the start or the end
+        position = max(0, min(point_index + len(self._points) if point_index < 0 else point_index,
+                              len(self._points)))
+        self._own_coordinates()
+        self._coordinates[2*position:2*position] = array("d", (new_x, new_y))
+        self.dirty = True
         self._notify(
-            "add_point", {"index": point_index, "x": new_x, "y": new_y})
+            "add_point", {"index": point_index, "x": new_x, "y": new_y}, merge_key=None)
 
     def delete_point(self, point_index):
         """Call this when updating a point
@@ -163,8 +218,108 @@ class Structure(Observable):
         Args:
             point_index (int): the index of the point to be changed in the points list
         """
-        self._points.pop(point_index)
-        self._notify("delete_point", {"index": point_index})
+        position = _position(point_index, len(self._points))
+        self._own_coordinates()
+        del self._coordinates[2*position:2*position + 2]
+        self.dirty = True
+        self._notify("delete_point", {"index": point_index}, merge_key=None)
+
+
+def _position(point_index, points_count):
+    """Index of a point from the start, raises IndexError like a list would"""
+    position = point_index + points_count if point_index < 0 else point_index
+    if not 0 <= position < points_count:
+        raise IndexError("point index out of range")
+    return position
+
+
+def read_fill(raw_data):
+    """Fill state of a structure from its section in the ship file: the opposite of IsLine"""
+    fill = True
+    for k in raw_data.keys():
+        if "IsLine" in k:
+            fill = not raw_data.getboolean(k)
+    return fill
+
+
+def read_rtw_points(raw_data):
+    """Points of a structure from its section in the ship file, as (angle, distance)
+
+    The empty and duplicated points are removed, as the game seems to do
+
+    Args:
+        raw_data (dict): section about the superstructure straight from the parsed file
+    Returns:
+        list of (angle, distance)
+    """
+    rtw_points = []
+    for k in raw_data.keys():
+        if "IsLine" in k:
+            continue
+        value = raw_data.getint(k)
+        dist_string_index = k.find("Distance")
+        angle_string_index = k.find("Angle")
+        point_index = int(
+            k[len("Point"):max(dist_string_index, angle_string_index)])
+
+        if point_index <= len(rtw_points)-1:
+            # if the point has already been encountered, update it
+            if dist_string_index != -1 and value != 0:
+                rtw_points[point_index] = (
+                    rtw_points[point_index][0], value)
+            elif angle_string_index != -1:
+                rtw_points[point_index] = (
+                    value, rtw_points[point_index][1])
+        else:
+            # if this is a new point, fill all the points between the last encountered point
+            # and the new point with (0,0)
+            # that's in case we go from point1 to point3 and then we have point2
+            while len(rtw_points) < point_index-1:
+                rtw_points.append((0, 0))
+            if dist_string_index != -1:
+                rtw_points.append((0, value))
+            elif angle_string_index != -1:
+                rtw_points.append((value, 0))
+
+    # get rid of "empty" points
+    # that's what the game seems to do
+    rtw_points[:] = [point for point in rtw_points if (
+        point[0] != 0 or point[1] != 0)]
+
+    # all duplicates are deleted
+    unique_points = []
+    temp_point = (0, 0)
+    for point in rtw_points:
+        if point != temp_point:
+            unique_points.append(point)
+            temp_point = (point[0], point[1])
+    return unique_points
+
+
+def read_structures(sections, is_rtw2):
+    """Build the structures of a ship, all the points are converted in one batch
+
+    Args:
+        sections (list): (name, raw_data) of each superstructure section of the ship file
+        is_rtw2 (bool): the file is from RTW2
+    Returns:
+        list of Structure
+    """
+    all_points = points_to_funnel([read_rtw_points(raw_data) for _name, raw_data in sections])
+    return [Structure(name, raw_data, is_rtw2, points)
+            for (name, raw_data), points in zip(sections, all_points)]
+
+
+def structures_as_ini_sections(structures):
+    """as_ini_section for many structures, all the points are converted in one batch
+
+    Returns:
+        list of dict, in the same order as structures
+    """
+    all_rtw_points = points_to_rtw([structure.points[:structure.max_points]
+                                    for structure in structures], _CENTERLINE_ANGLE)
+    return [structure.as_ini_section(rtw_points)
+            for structure, rtw_points in zip(structures, all_rtw_points)]
 
 
 class UpdatePoint(Command):
@@ -199,6 +354,19 @@ class UpdatePoint(Command):
         """
         self.structure.update_point(self.point_index, self.old_x, self.old_y)
 
+    def merge(self, command):
+        """A following update of the same point replaces this one's new value"""
+        if (not isinstance(command, UpdatePoint) or command.structure is not self.structure
+                or command.point_index != self.point_index):
+            return False
+        self.new_x = command.new_x
+        self.new_y = command.new_y
+        return True
+
+    def journal_records(self, undone=False):
+        x, y = (self.old_x, self.old_y) if undone else (self.new_x, self.new_y)
+        return [(self.structure, "update_point", {"index": self.point_index, "x": x, "y": y})]
+
 
 class DeletePoint(Command):
     """Command to delete a point
@@ -224,6 +392,12 @@ class DeletePoint(Command):
         """
         self._structure.add_point(self._point_index, *self._old_point)
 
+    def journal_records(self, undone=False):
+        if undone:
+            x, y = self._old_point
+            return [(self._structure, "add_point", {"index": self._point_index, "x": x, "y": y})]
+        return [(self._structure, "delete_point", {"index": self._point_index})]
+
 
 class AddPoint(Command):
     """Command to add a point
@@ -252,6 +426,12 @@ class AddPoint(Command):
         """
         self._structure.delete_point(self._point_index)
 
+    def journal_records(self, undone=False):
+        if undone:
+            return [(self._structure, "delete_point", {"index": self._point_index})]
+        x, y = self._new_point
+        return [(self._structure, "add_point", {"index": self._point_index, "x": x, "y": y})]
+
 
 class SetFill(Command):
     """Command to change the fill state of a structure
@@ -279,6 +459,10 @@ class SetFill(Command):
         if self._old_fill_state != self._fill_state:
             self._structure.fill = self._old_fill_state
 
+    def journal_records(self, undone=False):
+        fill = self._old_fill_state if undone else self._fill_state
+        return [(self._structure, "set_fill", {"fill": fill})]
+
 
 class ApplySymmetry(Command):
     """Make a structure symmetrical
@@ -290,8 +474,8 @@ class ApplySymmetry(Command):
     def __init__(self, structure):
         super().__init__()
         self._structure = structure
-        # fun with pass by reference vs pass by value
-        self._old_points = structure.points
+        # a copy: structure.points is a view that follows the changes
+        self._old_points = list(structure.points)
 
         self._new_points = []
         port_side_first = True
@@ -325,3 +509,7 @@ class ApplySymmetry(Command):
 
     def undo(self):
         self._structure.points = self._old_points
+
+    def journal_records(self, undone=False):
+        points = self._old_points if undone else self._new_points
+        return [(self._structure, "set_points", {"points": [list(point) for point in points]})]
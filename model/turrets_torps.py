@@ -1,7 +1,54 @@
 """Turrets and torpedo mpunt data in a useable form"""
 
+from array import array
 from schemas import TURRETS
 
+
+class _OutlineCache:
+    """Outlines already mirrored and scaled, only left to be moved to the mount's position
+
+    Stored flat in arrays of doubles: x0, y0, x1, y1...
+    The cache is emptied when it is given another list of outlines than the previous time,
+    because the parameters give a new list when the parameter file changed.
+    """
+    def __init__(self):
+        self._raw_outlines = None
+        self._outlines = {}
+
+    def outline(self, raw_outlines, count, scale, to_bow, starboard, position):
+        """The outline of a mount, in funnel coordinates
+
+        Args:
+            raw_outlines (list): outlines from the parameters, one per guns or tubes count
+            count (int): guns or tubes count
+            scale (float): scale factor of the outline
+            to_bow (bool): False if the outline must be mirrored toward the stern
+            starboard (bool): True if the outline must be mirrored toward starboard
+            position ((x, y)): where the mount is, in funnel coordinates
+        Returns:
+            list[(x,y)]
+        """
+        if raw_outlines is not self._raw_outlines:
+            self._raw_outlines = raw_outlines
+            self._outlines = {}
+        key = (count, scale, to_bow, starboard)
+        outline = self._outlines.get(key)
+        if outline is None:
+            outline = array("d")
+            for vertex in raw_outlines[count]:
+                outline.append((-vertex[0] if starboard else vertex[0])*scale)
+                outline.append((vertex[1] if to_bow else -vertex[1])*scale)
+            self._outlines[key] = outline
+        coordinates = iter(outline)
+        return [(x+position[0], y+position[1]) for x, y in zip(coordinates, coordinates)]
+
+
+# bit of each turret position in the masks of occupied_mask
+_TURRET_BITS = {turret: 1 << bit for bit, turret in enumerate(TURRETS)}
+
+_TURRETS_OUTLINES = _OutlineCache()
+_TORPEDO_OUTLINES = _OutlineCache()
+
 class Turret:
     """Container for the data needed to draw a turret
     Args:
@@ -10,31 +57,29 @@ class Turret:
             positions 1 to 4 are also passed as strings
         guns (int): how many guns in the turret
         half_length (int): the length from middle to bow of the ship, in funnel coordinates
-        all_turrs (list[string]): the list of all the turret position used on the ship
+        all_turrs (list[string] or int): the list of all the turret position used on the ship,
+            or its occupied_mask
         parameters (Parameters): parameters for the whole program
     Attr:
+        pos (string): the letter of the turret
+        guns (int): how many guns in the turret
+        caliber (int): caliber of the guns in inches
         outline (list[(x,y)]): a list of vertexes for the turret's outline. In funnel coordinates
     """
     def __init__(self, caliber, pos, guns, half_length, all_turrs, parameters):
+        self.pos = pos
+        self.guns = guns
+        self.caliber = caliber
         to_bow = parameters.turrets_positions[pos]["to_bow"]
         scale = parameters.turrets_scale[caliber]
 
         rel_position = rel_tur_or_torp_position(pos, all_turrs, parameters)
 
         position = (rel_position[0]*half_length, rel_position[1]*half_length)
-        raw_outline = parameters.turrets_outlines[guns]
-        #mirror if the turret should be backward
-        if not to_bow:
-            mirrored_outline = [(vertex[0], -vertex[1]) for vertex in raw_outline]
-        else:
-            mirrored_outline = raw_outline
-        #also mirror if the turret is to starboard
-        if position[0] >0:
-            mirrored_outline = [(-vertex[0], vertex[1]) for vertex in mirrored_outline]
-        #scale according to gun caliber
-        scaled_outline = [(vertex[0]*scale, vertex[1]*scale) for vertex in mirrored_outline]
-        #move according to position
-        self.outline = [(vertex[0]+position[0], vertex[1]+position[1]) for vertex in scaled_outline]
+        #mirror if the turret should be backward, or is to starboard
+        #scale according to gun caliber, then move according to position
+        self.outline = _TURRETS_OUTLINES.outline(parameters.turrets_outlines, guns, scale,
+                                                 to_bow, position[0] > 0, position)
 
 def rel_tur_or_torp_position(pos, all_turrs, parameters):
     """Apply the game's logic to get a turret or toorp mount position
@@ -42,51 +87,75 @@ def rel_tur_or_torp_position(pos, all_turrs, parameters):
     Args:
         pos (string): the letter of the turret, like "A", "X", etc...
             positions 1 to 4 are also passed as strings
-        all_turrs (list[string]): the list of all the turret position used on the ship
+        all_turrs (list[string] or int): the list of all the turret position used on the ship,
+            or its occupied_mask
         parameters (Parameters): parameters for the whole program
     """
-    rel_position = parameters.turrets_positions[pos]["positions"][0]
-
-    if pos == "X":
-        if ("W" in all_turrs or "V" in all_turrs or
-                "R" in all_turrs or "C" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "W":
-        if ("X" in all_turrs or "V" in all_turrs or "B" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "A":
-        if ("V" in all_turrs or
-                {"W", "X", "Y"}.issubset(all_turrs) or
-                "C" in all_turrs and "X" in all_turrs or
-                "B" in all_turrs and "R" in all_turrs and (
-                    ("W" in all_turrs or "X" in all_turrs or "Y" in all_turrs))):
-            rel_position = parameters.turrets_positions[pos]["positions"][2]
-        elif ("X" in all_turrs or  "W" in all_turrs or
-              "B" in all_turrs and ("C" in all_turrs or "R" in all_turrs or "W" in all_turrs)):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "B":
-        if ("V" in all_turrs or
-                "W" in all_turrs or
-                "C" in all_turrs and ("X" in all_turrs or "Y" in all_turrs) or
-                "A" in all_turrs and "R" in all_turrs and ("X" in all_turrs or "Y" in all_turrs)):
-            rel_position = parameters.turrets_positions[pos]["positions"][2]
-        elif ("X" in all_turrs or "Y" in all_turrs or "C" in all_turrs or "R" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-
-    elif pos == "Y":
-        if (("X" in all_turrs and "W" in all_turrs.keys()) or
-                ("V" in all_turrs and "W"in all_turrs)):
-            rel_position = parameters.turrets_positions[pos]["positions"][3]
-        elif ("V" in all_turrs or "W" in all_turrs or
-              ({"A", "B", "C"}.issubset(all_turrs)) or
-              ({"A", "B", "R"}.issubset(all_turrs))):
-            rel_position = parameters.turrets_positions[pos]["positions"][2]
-        elif ("B" in all_turrs or "C" in all_turrs or "R" in all_turrs or "X" in all_turrs):
-            rel_position = parameters.turrets_positions[pos]["positions"][1]
-    return rel_position
+    if not isinstance(all_turrs, int):
+        all_turrs = occupied_mask(all_turrs)
+    index = parameters.turrets_rules.position_index(pos, all_turrs)
+    return parameters.turrets_positions[pos]["positions"][index]
+
+
+def occupied_mask(all_turrs):
+    """Bitmask of the turret positions used on a ship, one bit per position of schemas.TURRETS
+
+    Args:
+        all_turrs (iterable[string]): the turret positions used on the ship
+    """
+    mask = 0
+    for turret in all_turrs:
+        mask |= _TURRET_BITS.get(turret, 0)
+    return mask
+
+
+class PositionRules:
+    """The rules that choose the position of a turret depending on the other turrets
+
+    Compiled to bitmasks of turret positions, see occupied_mask.
+    For each turret position, the result for each combination of the turrets that matter
+    is computed once then remembered.
+    Args:
+        rules (dict): see schemas.TURRETS_RULES_SCHEMA
+    """
+    def __init__(self, rules):
+        # pos: list of (index of the position, list of masks that must be all present)
+        self._rules = {}
+        # pos: mask of all the turrets used by its rules
+        self._relevant = {}
+        # pos: {relevant occupied turrets mask: index of the position}
+        self._table = {}
+        for pos, pos_rules in rules.items():
+            self._rules[pos] = [(rule["position"],
+                                 [occupied_mask(turrets) for turrets in rule["any"]])
+                                for rule in pos_rules]
+            self._relevant[pos] = occupied_mask(turret for rule in pos_rules
+                                                for turrets in rule["any"] for turret in turrets)
+            self._table[pos] = {}
+
+    def position_index(self, pos, occupied):
+        """Index of the position to use for a turret
+
+        Args:
+            pos (string): the letter of the turret
+            occupied (int): the mask of the turret positions used on the ship
+        Returns:
+            index in the turret's positions list of turrets_positions.json
+        """
+        table = self._table.get(pos)
+        if table is None:
+            return 0
+        key = occupied & self._relevant[pos]
+        index = table.get(key)
+        if index is None:
+            index = 0
+            for rule_index, masks in self._rules[pos]:
+                if any(key & mask == mask for mask in masks):
+                    index = rule_index
+                    break
+            table[key] = index
+        return index
+
 
 class Torpedo:
     """Container for the data needed to draw a torpedo mount
@@ -96,11 +165,15 @@ class Torpedo:
         half_length (int): the length from middle to bow of the ship, in funnel coordinates
         parameters (Parameters): parameters for the whole program
     Attr:
+        pos (string): the position of the mount, like the turrets
+        tubes (int): how many tubes in the mount
         outline (list[(x,y)]): a list of vertexes for the mount's outline. In funnel coordinates
     """
     def __init__(self, section_content, half_length, parameters):
         pos = section_content["Pos"]
         tubes_count = int(section_content["Tubes"])
+        self.pos = pos
+        self.tubes = tubes_count
 
         if pos in TURRETS:
             to_bow = parameters.turrets_positions[pos]["to_bow"]
@@ -112,11 +185,6 @@ class Torpedo:
             rel_position = [0, 1.5]
 
         position = (rel_position[0]*half_length, rel_position[1]*half_length)
-        raw_outline = parameters.torpedo_outlines[tubes_count]
-        #rotate if the turret should be backward
-        if not to_bow:
-            rotated_outline = [(point[0], -point[1]) for point in raw_outline]
-        else:
-            rotated_outline = raw_outline
-        #move according to position
-        self.outline = [(point[0]+position[0], point[1]+position[1]) for point in rotated_outline]
+        #rotate if the turret should be backward, then move according to position
+        self.outline = _TORPEDO_OUTLINES.outline(parameters.torpedo_outlines, tubes_count, 1.0,
+                                                 to_bow, False, position)
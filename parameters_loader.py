@@ -1,16 +1,17 @@
 """Centralize all the loading of data  from external files that are not in the ship file"""
+import copy
 import json
 import logging
 import pathlib
-import jsonschema
 import schemas
+from model.turrets_torps import PositionRules
 
 summary = logging.getLogger("Summary")
 details = logging.getLogger("Details")
 
 MAX_RECENT_FILES = 21
 
-def read_json(path, json_schema, default_data):
+def read_json(path, json_schema, default_data, validator=None):
     """Read a json file and validate it against a schema
 
     If an exception occurs, the default data is returned
@@ -18,9 +19,13 @@ def read_json(path, json_schema, default_data):
         path (string): path to json file
         json_schema (dict) a dict with the json schema info
         default_data (dict): what should be returned in case of failure
+        validator (jsonschema validator): validator already built for json_schema.
+            If None, the schema is checked and compiled for this call only
     returns:
         a dict with the json data if everything works fine, default_data if not
     """
+    # imported on first use, it is slow to import
+    import jsonschema
     try:
         details.debug("loading parameter file %s", pathlib.Path(path).name)
         with open(path) as file:
@@ -39,7 +44,10 @@ def read_json(path, json_schema, default_data):
         return default_data
 
     try:
-        jsonschema.validate(json_data, json_schema)
+        if validator is None:
+            jsonschema.validate(json_data, json_schema)
+        else:
+            validator.validate(json_data)
     except jsonschema.ValidationError as error:
         summary.warning("Valid JSON but invalid Schema in: %s\nLoading default values instead",
                         path)
@@ -48,6 +56,96 @@ def read_json(path, json_schema, default_data):
 
     return json_data
 
+
+class ParameterStore:
+    """Process-wide cache of the parameter files, validated and post-processed
+
+    The schemas are compiled once.
+    A file is only read and validated again if its modification time or its size changed.
+    The data given back is shared between all the callers: it must not be modified.
+    """
+    def __init__(self):
+        # id of the schema: (schema, compiled validator), the schema is kept so the id stays valid
+        self._validators = {}
+        # path: (file signature, data)
+        self._files = {}
+
+    def validator(self, json_schema):
+        """The compiled validator for a schema, built on first use"""
+        cached = self._validators.get(id(json_schema))
+        if cached is None:
+            import jsonschema
+            validator_class = jsonschema.validators.validator_for(json_schema)
+            validator_class.check_schema(json_schema)
+            cached = (json_schema, validator_class(json_schema))
+            self._validators[id(json_schema)] = cached
+        return cached[1]
+
+    def load(self, path, json_schema, default_data, post_process=None):
+        """Same as read_json, but the result is cached until the file changes
+
+        Args:
+            path, json_schema, default_data: see read_json
+            post_process (function): applied to the data once after loading, before caching
+        returns:
+            the validated and post-processed data, shared: do not modify it!
+        """
+        signature = file_signature(path)
+        cached = self._files.get(str(path))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        data = read_json(path, json_schema, default_data, self.validator(json_schema))
+        if post_process is not None:
+            data = post_process(data)
+        self._files[str(path)] = (signature, data)
+        return data
+
+    def remember(self, path, data):
+        """Record data that was just written to path, so the file is not read again"""
+        self._files[str(path)] = (file_signature(path), data)
+
+
+def write_recent_files(recent_files):
+    """Write the recent files data to the application config file
+
+    The errors are logged, not raised.
+    Args:
+        recent_files (dict): see Parameters.update_recent_files
+    """
+    try:
+        details.info("Saving app parameters to %s", schemas.RECENT_FILES_PATH)
+        pathlib.Path(schemas.RECENT_FILES_PATH).parent.mkdir(parents=True, exist_ok=True)
+        with open(schemas.RECENT_FILES_PATH, "w") as file:
+            json.dump(recent_files, file)
+            details.info("Saved app parameters to %s", schemas.RECENT_FILES_PATH)
+        # recorded once the file is closed, so its signature is final
+        STORE.remember(schemas.RECENT_FILES_PATH, recent_files)
+    except OSError as error:
+        summary.warning("Could not save app config file to: %s", schemas.RECENT_FILES_PATH)
+        details.warning("Could not save app config file to: %s\n%s",
+                        schemas.RECENT_FILES_PATH, error)
+
+
+def file_signature(path):
+    """What is checked to know if a file changed: modification time and size
+
+    None if the file cannot be accessed
+    """
+    try:
+        stat = pathlib.Path(path).stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+STORE = ParameterStore()
+
+
+def _convert_hlengths(raw_hlengths):
+    return {ship_type: convert_str_key_to_int(lengths_dicts)
+            for ship_type, lengths_dicts in raw_hlengths.items()}
+
+
 class Parameters:
     """Main class that contains all the parameters
 
@@ -61,6 +159,8 @@ class Parameters:
             and if the grid was displayed or not
         turrets_positions (dict): for each turret positions, a list of (int,int)
             that describe their possible positions. Relative coordinates.
+        turrets_rules (PositionRules): which of its positions a turret uses,
+            depending on the other turrets of the ship
         turrets_outlines(dict): for each amount of gun per turret (0=casemate), the turret's outline
             that will be drawn in the top view. Absolute coordinates
         turrets_scale (dict): scale factor for the turret outlines, per gun caliber
@@ -69,32 +169,33 @@ class Parameters:
         grid (bool): if the grid was displayed or not when the ship file was saved
     """
     def __init__(self, ship_file_path):
-        self._recent_files = read_json(schemas.RECENT_FILES_PATH,
-                                       schemas.RECENT_FILES_SCHEMA,
-                                       schemas.DEFAULT_RECENT_FILES)
-        self.hulls_shapes = read_json(schemas.HULLS_SHAPES_PATH,
-                                      schemas.HULLS_SHAPES_SCHEMA,
-                                      schemas.DEFAULT_HULLS_SHAPES)
-        self.turrets_positions = read_json(schemas.TURRETS_POSITION_PATH,
-                                           schemas.TURRETS_POSITION_SCHEMA,
-                                           schemas.DEFAULT_TURRETS_POSITION)
-        self.turrets_scale = read_json(schemas.TURRETS_SCALE_PATH,
-                                       schemas.TURRETS_SCALE_SCHEMA,
-                                       schemas.DEFAULT_TURRETS_SCALE)
-        self.turrets_outlines = read_json(schemas.TURRETS_OUTLINES_PATH,
-                                          schemas.TURRETS_OUTLINE_SCHEMA,
-                                          schemas.DEFAULT_TURRETS_OUTLINE)
-        self.torpedo_outlines = read_json(schemas.TORPEDO_OUTLINES_PATH,
-                                          schemas.TORPEDO_OUTLINES_SCHEMA,
-                                          schemas.DEFAULT_TORPEDO_OUTLINES)
-
-        raw_hlengths = read_json(schemas.HALF_LENGTHS_PATH,
-                                 schemas.HALF_LENGTHS_SCHEMA,
-                                 schemas.DEFAULT_HALF_LENGTHS)
-
-        self.ships_hlengths = {}
-        for ship_type, lengths_dicts in raw_hlengths.items():
-            self.ships_hlengths[ship_type] = convert_str_key_to_int(lengths_dicts)
+        # the recent files are modified by write_app_param, so each instance has its own copy
+        self._recent_files = copy.deepcopy(STORE.load(schemas.RECENT_FILES_PATH,
+                                                      schemas.RECENT_FILES_SCHEMA,
+                                                      schemas.DEFAULT_RECENT_FILES))
+        self.hulls_shapes = STORE.load(schemas.HULLS_SHAPES_PATH,
+                                       schemas.HULLS_SHAPES_SCHEMA,
+                                       schemas.DEFAULT_HULLS_SHAPES)
+        self.turrets_positions = STORE.load(schemas.TURRETS_POSITION_PATH,
+                                            schemas.TURRETS_POSITION_SCHEMA,
+                                            schemas.DEFAULT_TURRETS_POSITION)
+        self.turrets_rules = STORE.load(schemas.TURRETS_RULES_PATH,
+                                        schemas.TURRETS_RULES_SCHEMA,
+                                        schemas.DEFAULT_TURRETS_RULES,
+                                        post_process=PositionRules)
+        self.turrets_scale = STORE.load(schemas.TURRETS_SCALE_PATH,
+                                        schemas.TURRETS_SCALE_SCHEMA,
+                                        schemas.DEFAULT_TURRETS_SCALE)
+        self.turrets_outlines = STORE.load(schemas.TURRETS_OUTLINES_PATH,
+                                           schemas.TURRETS_OUTLINE_SCHEMA,
+                                           schemas.DEFAULT_TURRETS_OUTLINE)
+        self.torpedo_outlines = STORE.load(schemas.TORPEDO_OUTLINES_PATH,
+                                           schemas.TORPEDO_OUTLINES_SCHEMA,
+                                           schemas.DEFAULT_TORPEDO_OUTLINES)
+        self.ships_hlengths = STORE.load(schemas.HALF_LENGTHS_PATH,
+                                         schemas.HALF_LENGTHS_SCHEMA,
+                                         schemas.DEFAULT_HALF_LENGTHS,
+                                         post_process=_convert_hlengths)
 
         #if the requested file is in the list of recent files,
         #use its zoom and offset for the side pict
@@ -127,11 +228,23 @@ class Parameters:
             current_file_path (str): path to the file for the current ship.
                 used to rcord the path of the recently saved files
         """
+        write_recent_files(self.update_recent_files(current_file_path))
+
+    def update_recent_files(self, current_file_path, saved=False):
+        """Record the current file and its view parameters as the most recently saved file
+
+        Only in memory, the returned copy is for write_recent_files
+        Args:
+            current_file_path (str): path to the file for the current ship.
+            saved (bool): the file is being saved: it is recorded even if it does not exist yet
+        Returns:
+            a copy of the recent files data
+        """
         if current_file_path is not None:
             self._current_file_path = current_file_path
         if self._current_file_path in self._recent_files.keys():
             del self._recent_files[self._current_file_path]
-        if pathlib.Path(self._current_file_path).exists():
+        if saved or pathlib.Path(self._current_file_path).exists():
             self._recent_files[self._current_file_path] = {}
             self._recent_files[self._current_file_path]["sideview_zoom"] = self.sideview_zoom
             self._recent_files[self._current_file_path]["sideview_offset"] = self.sideview_offset
@@ -142,17 +255,7 @@ class Parameters:
             self._recent_files = {f:self._recent_files[f]
                                   for f in list(self._recent_files.keys())[len(self._recent_files)
                                                                            -MAX_RECENT_FILES:]}
-
-        try:
-            details.info("Saving app parameters to %s", schemas.RECENT_FILES_PATH)
-            pathlib.Path(schemas.RECENT_FILES_PATH).parent.mkdir(parents=True, exist_ok=True)
-            with open(schemas.RECENT_FILES_PATH, "w") as file:
-                json.dump(self._recent_files, file)
-                details.info("Saved app parameters to %s", schemas.RECENT_FILES_PATH)
-        except OSError as error:
-            summary.warning("Could not save app config file to: %s", schemas.RECENT_FILES_PATH)
-            details.warning("Could not save app config file to: %s\n%s",
-                            schemas.RECENT_FILES_PATH, error)
+        return copy.deepcopy(self._recent_files)
 
     @property
     def last_file_path(self):
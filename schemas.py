@@ -1,11 +1,19 @@
-import appdirs
+import sys
 import pathlib
+import appdirs
+
+# the data files are looked up relative to the program, not the current working directory
+if getattr(sys, "frozen", False):
+    # pyinstaller executable, build.bat copies the data folder next to it
+    DATA_DIR = pathlib.Path(sys.executable).resolve().parent.joinpath("data")
+else:
+    DATA_DIR = pathlib.Path(__file__).resolve().parent.joinpath("data")
 
 #Turret positions
 TURRETS = ["1", "2", "A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L",
            "P", "Q", "R", "S", "T", "V", "W", "X", "Y", "3", "4"]
 
-TURRETS_POSITION_PATH = "./data/turrets_positions.json"
+TURRETS_POSITION_PATH = DATA_DIR.joinpath("turrets_positions.json")
 TURRETS_POSITION_SCHEMA = (
 {
   "$schema" : "http://json-schema.org/draft-04/schema#",
@@ -42,9 +50,61 @@ _DEFAULT_TURRET_POSITION = {"positions": [(1000, 1000), (1000, 1000), (1000, 100
                            "to_bow": True}
 DEFAULT_TURRETS_POSITION = {turret:_DEFAULT_TURRET_POSITION for turret in TURRETS}
 
+#turret position rules
+#for each turret position, which of its positions is used depending on the other turrets
+#the first rule with one of its "any" sets of turrets all present on the ship wins
+#if none, the first position is used
+TURRETS_RULES_PATH = DATA_DIR.joinpath("turrets_rules.json")
+TURRETS_RULES_SCHEMA = (
+{
+  "$schema" : "http://json-schema.org/draft-04/schema#",
+  "type":"object",
+  "properties":
+  {
+    turret:
+    {
+      "type":"array",
+      "items":
+      {
+        "type":"object",
+        "properties":
+        {
+          "position": {"type":"integer", "minimum":0, "maximum":3},
+          "any":
+          {
+            "type":"array",
+            "items":
+            {
+              "type":"array",
+              "items":{"enum":TURRETS},
+              "minItems":1
+            }
+          }
+        },
+        "required":["position", "any"],
+        "additionalProperties":False
+      }
+    } for turret in TURRETS
+  },
+  "additionalProperties":False
+})
+#the game's logic, used if the file is missing
+DEFAULT_TURRETS_RULES = {
+    "X": [{"position": 1, "any": [["W"], ["V"], ["R"], ["C"]]}],
+    "W": [{"position": 1, "any": [["X"], ["V"], ["B"]]}],
+    "A": [{"position": 2, "any": [["V"], ["W", "X", "Y"], ["C", "X"],
+                                  ["B", "R", "W"], ["B", "R", "X"], ["B", "R", "Y"]]},
+          {"position": 1, "any": [["X"], ["W"], ["B", "C"], ["B", "R"], ["B", "W"]]}],
+    "B": [{"position": 2, "any": [["V"], ["W"], ["C", "X"], ["C", "Y"],
+                                  ["A", "R", "X"], ["A", "R", "Y"]]},
+          {"position": 1, "any": [["X"], ["Y"], ["C"], ["R"]]}],
+    "Y": [{"position": 3, "any": [["X", "W"], ["V", "W"]]},
+          {"position": 2, "any": [["V"], ["W"], ["A", "B", "C"], ["A", "B", "R"]]},
+          {"position": 1, "any": [["B"], ["C"], ["R"], ["X"]]}]}
+
 #turret outlines
 MAX_GUNS_PER_TURRET = 4
-TURRETS_OUTLINES_PATH = "./data/turrets_outlines.json"
+TURRETS_OUTLINES_PATH = DATA_DIR.joinpath("turrets_outlines.json")
 TURRETS_OUTLINE_SCHEMA =(
 {
   "$schema" : "http://json-schema.org/draft-04/schema#",
@@ -70,7 +130,7 @@ _DEFAULT_TURRET_OUTLINE = [(-7.4, 12.9), (-10, -0.1), (-6.5, -7.4), (-1.2, -9.6)
 DEFAULT_TURRETS_OUTLINE = [_DEFAULT_TURRET_OUTLINE for i in range(MAX_GUNS_PER_TURRET+1)]
 
 MAX_TORP_PER_MOUNT = 5
-TORPEDO_OUTLINES_PATH = "./data/torpedo_outlines.json"
+TORPEDO_OUTLINES_PATH = DATA_DIR.joinpath("torpedo_outlines.json")
 TORPEDO_OUTLINES_SCHEMA = (
 {
   "$schema" : "http://json-schema.org/draft-04/schema#",
@@ -95,7 +155,7 @@ DEFAULT_TORPEDO_OUTLINES = [_DEFAULT_TURRET_OUTLINE for i in range(MAX_TORP_PER_
 
 #turret scale
 MIN_MAX_GUN_CALIBER = 18
-TURRETS_SCALE_PATH = "./data/turrets_scale.json"
+TURRETS_SCALE_PATH = DATA_DIR.joinpath("turrets_scale.json")
 TURRETS_SCALE_SCHEMA = (
 {
   "$schema" : "http://json-schema.org/draft-04/schema#",
@@ -115,7 +175,7 @@ DEFAULT_TURRETS_SCALE = [0.22, 0.26, 0.306, 0.347, 0.387, 0.422, 0.458, 0.536,
 
 #hull shapes
 SHIP_TYPES = ["BB", "BC", "B", "CA", "CL", "DD", "MS", "AMC"]
-HULLS_SHAPES_PATH= "./data/hull_shapes.json"
+HULLS_SHAPES_PATH = DATA_DIR.joinpath("hull_shapes.json")
 HULLS_SHAPES_SCHEMA = (
 {
   "$schema" : "http://json-schema.org/draft-04/schema#",
@@ -141,7 +201,7 @@ HULLS_SHAPES_SCHEMA = (
 })
 DEFAULT_HULLS_SHAPES = {ship_type:[[[100, 100],[-100, 100],[-100, -100],[100, -100]]] for ship_type in SHIP_TYPES}
 
-HALF_LENGTHS_PATH = "./data/lengths.json"
+HALF_LENGTHS_PATH = DATA_DIR.joinpath("lengths.json")
 HALF_LENGTHS_SCHEMA = (
 {
   "$schema" : "http://json-schema.org/draft-04/schema#",
@@ -1,6 +1,44 @@
 """Helper classes for everybody"""
+import collections
+import contextlib
+import functools
+import math
+import time
 from abc import ABC, abstractmethod
 
+# commands done less than that many seconds apart can be merged in a single undo entry
+MERGE_WINDOW = 1.0
+
+# maximum number of commands that can be undone
+MAX_UNDO_ENTRIES = 1000
+
+# the views are updated at most once per frame, in milliseconds: about 60 frames per second
+FRAME_MS = 16
+
+# half width of the funnels, relative to the half length of the ship
+HFUNNELS_TO_HLENGTH = 0.028
+# how much longer than wide the oval funnels are
+FUNNEL_OVAL = 1.38
+
+
+class _NotificationQueue(dict):
+    """{key: (observable, event_type, event_info, merge_key)}, see _hold"""
+
+    # the key of the last notification never merged
+    barrier = None
+    # for the deferred notifications: what the scheduler returned, and the function cancelling it
+    scheduled = None
+    cancel = None
+
+
+# notifications held back until the end of the outermost batch_notifications block
+_held_notifications = _NotificationQueue()
+_batch_depth = 0
+
+# notifications waiting for their delivery to deferred subscribers
+# {callback: _NotificationQueue}
+_deferred_notifications = {}
+
 
 class Command(ABC):
     """base class for the commands
@@ -22,21 +60,76 @@ class Command(ABC):
         """undo the command"""
         pass
 
+    def merge(self, command):
+        """Try to absorb a command done just after this one
+
+        Used to make a single undo entry from a burst of small edits,
+        like the keystrokes typing a coordinate.
+        Subclasses that can be merged override this method.
+
+        Args:
+            command (Command): the following command, already executed
+        Returns:
+            True if this command now does the work of both,
+            False if the command cannot be merged
+        """
+        return False
+
+    def journal_records(self, undone=False):
+        """The changes done by execute, or by undo, for the crash-recovery journal
+
+        Subclasses that change the ship override this method, see model.journal
+        Args:
+            undone (bool): the changes of undo instead of execute
+        Returns:
+            list of (target, operation, values): target is the changed Structure or Funnel,
+            operation a str and values a dict of JSON values
+        """
+        return []
+
 
 class CommandStack:
-    """Undo/redo stacks for command pattern"""
+    """Undo/redo stacks for command pattern
 
-    def __init__(self):
-        self._undo_stack = []
+    Consecutive commands done within merge_window seconds are merged
+    in a single undo entry when the first one accepts it, see Command.merge
+
+    Args:
+        merge_window (float): in seconds, 0 to never merge commands
+        max_entries (int): number of commands kept in the undo stack,
+            the oldest ones are forgotten. None for no limit
+        journal (model.journal.Journal): if given, the changes of each command done,
+            undone or redone are appended to it
+    """
+
+    def __init__(self, merge_window=MERGE_WINDOW, max_entries=MAX_UNDO_ENTRIES, journal=None):
+        self.journal = journal
+        self._merge_window = merge_window
+        self._undo_stack = collections.deque(maxlen=max_entries)
         self._redo_stack = []
+        # when the command on top of the undo stack was last done or merged,
+        # None if it cannot receive merges anymore
+        self._last_done = None
 
     def do(self, command):
         """Execute the command, add it to the undo stack
         And purge the redo stack
+
+        If the command follows closely the one on top of the undo stack,
+        they are merged instead.
+        The notifications sent while executing the command are batched, see batch_notifications
         """
         self._redo_stack = []
+        with batch_notifications():
+            command.execute()
+        self._record(command)
+        now = time.monotonic()
+        if (self._last_done is not None and now - self._last_done < self._merge_window
+                and self._undo_stack and self._undo_stack[-1].merge(command)):
+            self._last_done = now
+            return
         self._undo_stack.append(command)
-        command.execute()
+        self._last_done = now
 
     def undo(self):
         """Undo the command on top of the undoing stack
@@ -44,10 +137,13 @@ class CommandStack:
 
         If undo stack is empty, do nothing
         """
+        self._last_done = None
         if self._undo_stack:
             command = self._undo_stack.pop()
             self._redo_stack.append(command)
-            command.undo()
+            with batch_notifications():
+                command.undo()
+            self._record(command, undone=True)
 
     def redo(self):
         """Redo the command on top of the redoing stack
@@ -55,29 +151,48 @@ class CommandStack:
 
         If redo stack is empty, do nothing
         """
+        self._last_done = None
         if self._redo_stack:
             command = self._redo_stack.pop()
             self._undo_stack.append(command)
-            command.execute()
+            with batch_notifications():
+                command.execute()
+            self._record(command)
+
+    def _record(self, command, undone=False):
+        if self.journal is not None:
+            self.journal.append(command.journal_records(undone))
 
 
 class Observable:
     """Observable for the observer pattern"""
 
+    # the model objects are many when a whole fleet is loaded, they have no __dict__
+    __slots__ = ("_subscribers",)
+
     def __init__(self):
         self._subscribers = []
 
-    def subscribe(self, callback):
+    def subscribe(self, callback, scheduler=None, cancel=None):
         """Called from a subscriber to subscribe to the notifications from an observable object
 
         Args:
             callback (method): the function that should be called when a notification is send
                 callback should be analog to:
                 def callback(self, observable_object, event_type, dict_with_event_info)
+            scheduler (function): if None, the callback is called right away.
+                If not, the notifications are queued and delivered later, all together:
+                scheduler(function) must call function later, like the after_idle of a widget.
+                While queued, the notifications are merged like in batch_notifications,
+                also with the notifications of the other observables for the same callback
+            cancel (function): cancel(handle) cancels a call scheduled by scheduler,
+                like the after_cancel of a widget. Used by cancel_deferred
         Returns:
             an unsuscribe function that should be called to stop receiving notification
             to the callback
         """
+        if scheduler is not None:
+            callback = _DeferredCallback(callback, scheduler, cancel)
         self._subscribers.append(callback)
 
         def _unsubscribe():
@@ -88,16 +203,179 @@ class Observable:
 
         return _unsubscribe
 
-    def _notify(self, event_type, event_info):
+    def _notify(self, event_type, event_info, merge_key=()):
         """The observalbe object should run this method to notify the subscribers
 
         Args:
             event_type (str): event type identifier
             event_info (dict): schema should depend on the event type,
                 and contains all that the subscribers need
+            merge_key: when the notifications are batched or deferred, only the last one
+                with the same event type and merge key is sent.
+                The default merges all the notifications of the same type,
+                None never merges the notification, nor the ones before it with the ones after
+        """
+        if _batch_depth > 0:
+            _hold(_held_notifications, self, event_type, event_info, merge_key)
+        else:
+            self._deliver(event_type, event_info, merge_key)
+
+    def _deliver(self, event_type, event_info, merge_key):
+        """Send a notification to the subscribers, or to their queue for the deferred ones"""
+        for call in list(self._subscribers):
+            if isinstance(call, _DeferredCallback):
+                call.hold(self, event_type, event_info, merge_key)
+            else:
+                call(self, event_type, event_info)
+
+
+@contextlib.contextmanager
+def batch_notifications():
+    """Hold back the notifications of all the observables until the end of the block
+
+    Then each change is notified only once: for an observable, only the last notification
+    with a given event type and merge key is sent, see Observable._notify.
+    The blocks can be nested, the notifications are sent at the end of the outermost one.
+    Used like:
+        with batch_notifications():
+            funnel.x = 1
+            funnel.y = 2
+    """
+    global _batch_depth
+    _batch_depth += 1
+    try:
+        yield
+    finally:
+        _batch_depth -= 1
+        if _batch_depth == 0:
+            held = list(_held_notifications.values())
+            _held_notifications.clear()
+            for observable, event_type, event_info, merge_key in held:
+                observable._deliver(event_type, event_info, merge_key)
+
+
+def _hold(queue, observable, event_type, event_info, merge_key):
+    """Queue a notification, replacing the previous one with the same key
+
+    The queue is kept in the order of the last notifications. A notification never merged
+    is a barrier: the ones after it are not merged with the ones before, so an update of
+    a point is not moved across the insertion or deletion of a point that shifts its index
+    """
+    if merge_key is None:
+        key = queue.barrier = object()
+    else:
+        key = (queue.barrier, id(observable), event_type, merge_key)
+    queue.pop(key, None)
+    queue[key] = (observable, event_type, event_info, merge_key)
+
+
+class _DeferredCallback:
+    """A subscriber's callback that receives the notifications when scheduled, see subscribe"""
+
+    def __init__(self, callback, scheduler, cancel):
+        self._callback = callback
+        self._scheduler = scheduler
+        self._cancel = cancel
+
+    def hold(self, observable, event_type, event_info, merge_key):
+        """Queue the notification, and schedule the delivery if none is scheduled yet"""
+        queue = _deferred_notifications.get(self._callback)
+        if queue is None:
+            queue = _deferred_notifications[self._callback] = _NotificationQueue()
+            queue.scheduled = self._scheduler(functools.partial(_deliver_deferred, self._callback))
+            queue.cancel = self._cancel
+        _hold(queue, observable, event_type, event_info, merge_key)
+
+
+def _deliver_deferred(callback):
+    queue = _deferred_notifications.pop(callback, {})
+    for observable, event_type, event_info, _merge_key in queue.values():
+        callback(observable, event_type, event_info)
+
+
+def cancel_deferred(callback):
+    """Drop the notifications waiting for a deferred callback, and cancel their delivery
+
+    Called when the subscriber is destroyed, so the delivery does not run on a dead widget
+    Args:
+        callback (method): as given to Observable.subscribe with a scheduler and cancel
+    """
+    queue = _deferred_notifications.pop(callback, None)
+    if queue is not None and queue.cancel is not None:
+        queue.cancel(queue.scheduled)
+
+
+class FrameScheduler:
+    """Collect the work asked by the input events, and do it at most once per frame
+
+    The handlers of the high rate events (mouse moves, wheel, resizes) invalidate
+    what they change instead of updating it at once. The waiting work is done all together
+    by a timer of the widget, at most once per frame_ms, in the order of the invalidations.
+    A new invalidation with the same key replaces the waiting one: superseded work is dropped.
+    Work invalidated while flushing waits for the next frame.
+    The scheduler must be closed before its widget, or the widgets of the work, are destroyed.
+
+    Args:
+        widget (tk.Misc): its after method runs the flushes
+        frame_ms (int): minimal time between two flushes, in milliseconds
+    Attrs:
+        counters (collections.Counter): "invalidated", "superseded" and "done" count the work,
+            "frames" the flushes
+    """
+
+    def __init__(self, widget, frame_ms=FRAME_MS):
+        self._widget = widget
+        self._frame_ms = frame_ms
+        # {key: (function, args)}
+        self._pending = {}
+        self._after_id = None
+        self._last_flush = -math.inf
+        self._closed = False
+        self.counters = collections.Counter()
+
+    def invalidate(self, key, function, *args):
+        """Ask for function(*args) to be called on the next frame
+
+        Args:
+            key (hashable): identifies the work, like (widget, "redraw")
+            function (callable): does the work
         """
-        for call in self._subscribers:
-            call(self, event_type, event_info)
+        if self._closed:
+            return
+        self.counters["invalidated"] += 1
+        if self._pending.pop(key, None) is not None:
+            self.counters["superseded"] += 1
+        self._pending[key] = (function, args)
+        if self._after_id is None:
+            elapsed_ms = min(self._frame_ms, (time.monotonic() - self._last_flush)*1000)
+            self._after_id = self._widget.after(round(self._frame_ms - elapsed_ms), self.flush)
+
+    def cancel(self, key):
+        """Drop the waiting work with that key, if any"""
+        self._pending.pop(key, None)
+
+    def close(self):
+        """Drop all the waiting work and stop the timer, the later invalidations are ignored
+
+        Called before the widgets are destroyed, so no flush runs on dead widgets
+        """
+        self._closed = True
+        self._pending.clear()
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def flush(self):
+        """Do all the waiting work now"""
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._last_flush = time.monotonic()
+        pending, self._pending = self._pending, {}
+        self.counters["frames"] += 1
+        for function, args in pending.values():
+            function(*args)
+            self.counters["done"] += 1
 
 
 class Subscriber(ABC):
@@ -123,6 +401,55 @@ class Subscriber(ABC):
         pass
 
 
+def make_converters(width, height, half_length, zoom):
+    """give converters from funnel to view coordinates and vice-versa
+
+    The view is the top view: bow at the left, x to the right and y downward, like a canvas.
+    scaled so that the full length of the ship fits exactly the width of the view at zoom 1
+    Args:
+        width (number): width of the view
+        height (number): height of the view
+        half_length (number): the half-length of the ship.
+        zoom (number): zoom factor
+
+    Returns:
+        a tupple of two converter functions:
+            funnel to view
+            view to funnel
+    """
+    coord_factor = (width/2.1) / half_length*zoom
+    xoffset = width/2.0
+    yoffset = height/2.0
+
+    def funnel_to_canvas(point):
+        """convert from funnel to view coordinates
+
+        Args:
+            point (number, number): point in funnel coordinates
+
+        Returns:
+            (int, int) in view coordinates
+        """
+        if not point:
+            return []
+        return (point[1]*coord_factor + xoffset, -point[0]*coord_factor + yoffset)
+
+    def canvas_to_funnel(point):
+        """convert from view to funnel coordinates
+
+        Args:
+            point (number, number): point in view coordinates
+
+        Returns:
+            (int, int) in funnel coordinates
+        """
+        if not point:
+            return []
+        return (-(point[1] - yoffset)/coord_factor, (point[0] - xoffset)/coord_factor)
+
+    return (funnel_to_canvas, canvas_to_funnel)
+
+
 def is_int(possible_number):
     """Returns true if the passed string can be parsed to an int, false if not
 
@@ -136,6 +136,14 @@ class FunnelEditor(tk.Frame, Subscriber, Observable):
         self._command_stack.do(model.funnel.MoveFunnel(self._funnel, point[0],
                                                        point[1]))
 
+    def select(self):
+        """Make this editor the active one
+
+        Intended to be called from click on the top view
+        """
+        self.x_entry.focus_set()
+        self._on_get_focus()
+
     def _force_centerline(self):
         self._x_var.set(0)
 
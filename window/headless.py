@@ -0,0 +1,305 @@
+"""Draw the top view of a ship without any display, to a PIL image or to SVG
+
+Same drawing as window.topview.TopView, with the same coordinates transform,
+but straight from the ShipData and without tkinter.
+The batch mode renders thumbnails for all the ship files of a location on a pool of processes,
+and can put them together on an overview sheet.
+
+Command line use, from the root of the project:
+    python -m window.headless <directory or glob> <output directory> --format svg
+    python -m window.headless <directory or glob> <output directory> --sheet fleet.png
+"""
+import argparse
+import functools
+import math
+import pathlib
+import sys
+from PIL import Image, ImageDraw
+from model import fleet
+from window.framework import make_converters, HFUNNELS_TO_HLENGTH, FUNNEL_OVAL
+
+# same size as the top view of the editor
+DEFAULT_WIDTH = 701
+DEFAULT_HEIGHT = 261
+
+# the size of the thumbnails in batch mode
+THUMBNAIL_WIDTH = 350
+THUMBNAIL_HEIGHT = 130
+
+FORMATS = ["png", "svg"]
+
+# like the tk canvas' "smooth" lines, each curve is approximated by that many segments
+_SMOOTH_STEPS = 12
+# the line width is 2 on the editor's canvas, scaled with the image's width
+_LINE_WIDTH_TO_WIDTH = 2/DEFAULT_WIDTH
+# size of the label under each thumbnail on the overview sheet
+_LABEL_HEIGHT = 14
+
+
+def draw_ship(ship_data, parameters, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, zoom=1.0):
+    """The shapes of the top view of a ship, in drawing order
+
+    Args:
+        ship_data (shipdata.ShipData):
+        parameters (parameters_loader.Parameters):
+        width (int): width of the view
+        height (int): height of the view
+        zoom (number): 1 to fit the ship's length in the width
+    Returns:
+        a list of (kind, points, options), kind being "line", "polygon" or "oval"
+        points: list of (x, y) in view coordinates, the bounding box corners for the ovals
+        options: dict with "fill", "outline" and "width"
+    """
+    funnel_to_view, _view_to_funnel = make_converters(width, height,
+                                                      ship_data.half_length, zoom)
+    line_width = max(1, round(width*_LINE_WIDTH_TO_WIDTH))
+    shapes = []
+
+    half_length = ship_data.half_length
+    for line in parameters.hulls_shapes[ship_data.ship_type]:
+        points = [funnel_to_view((point[0]*half_length, point[1]*half_length))
+                  for point in line]
+        shapes.append(("line", _smooth(points),
+                       {"fill": None, "outline": "black", "width": line_width}))
+
+    for structure in ship_data.structures:
+        if len(structure.points) < 2:
+            continue
+        points = [funnel_to_view(point) for point in structure.points]
+        if structure.fill:
+            shapes.append(("polygon", points,
+                           {"fill": "cyan", "outline": "black", "width": line_width}))
+        else:
+            shapes.append(("line", points,
+                           {"fill": None, "outline": "black", "width": line_width}))
+
+    funnel_half_width = half_length*HFUNNELS_TO_HLENGTH
+    for funnel in ship_data.funnels.values():
+        if funnel.y == 0:
+            continue
+        delta = funnel_half_width*FUNNEL_OVAL if funnel.oval else funnel_half_width
+        corners = [funnel_to_view((funnel.x - funnel_half_width, funnel.y - delta)),
+                   funnel_to_view((funnel.x + funnel_half_width, funnel.y + delta))]
+        shapes.append(("oval", corners, {"fill": "black", "outline": "black", "width": 1}))
+
+    for mount in ship_data.turrets_torps:
+        points = [funnel_to_view(point) for point in mount.outline]
+        shapes.append(("polygon", points, {"fill": "green", "outline": "black", "width": 1}))
+    return shapes
+
+
+def render_image(ship_data, parameters, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, zoom=1.0):
+    """Top view of a ship as a PIL image
+
+    Args:
+        see draw_ship
+    Returns:
+        PIL.Image.Image in RGB mode, white background
+    """
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    # the outlines are drawn by hand: the width of polygon and ellipse,
+    # and the joint of line, need a more recent Pillow than requirements.txt asks for
+    for kind, points, options in draw_ship(ship_data, parameters, width, height, zoom):
+        if kind == "line":
+            _draw_outline(draw, points, options["outline"], options["width"])
+        elif kind == "polygon":
+            if options["width"] <= 1:
+                draw.polygon(points, fill=options["fill"], outline=options["outline"])
+            else:
+                draw.polygon(points, fill=options["fill"])
+                _draw_outline(draw, points + points[:1], options["outline"], options["width"])
+        else:
+            left, top, right, bottom = _bounding_box(points)
+            if options["width"] <= 1:
+                draw.ellipse((left, top, right, bottom), fill=options["fill"],
+                             outline=options["outline"])
+            else:
+                # the outline is what the inner ellipse leaves of the outer one
+                inset = options["width"]
+                draw.ellipse((left, top, right, bottom), fill=options["outline"])
+                draw.ellipse((left + inset, top + inset, right - inset, bottom - inset),
+                             fill=options["fill"])
+    return image
+
+
+def _draw_outline(draw, points, color, width):
+    """A polyline with round joints, like joint="curve" of Pillow 5.3+"""
+    draw.line(points, fill=color, width=width)
+    if width > 1:
+        radius = (width - 1)/2
+        for x, y in points[1:-1]:
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+
+
+def render_svg(ship_data, parameters, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, zoom=1.0):
+    """Top view of a ship as an SVG document
+
+    Args:
+        see draw_ship
+    Returns:
+        str, the SVG document
+    """
+    elements = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'viewBox="0 0 {width} {height}">',
+                f'<rect width="{width}" height="{height}" fill="white"/>']
+    for kind, points, options in draw_ship(ship_data, parameters, width, height, zoom):
+        style = (f'fill="{options["fill"] or "none"}" stroke="{options["outline"]}" '
+                 f'stroke-width="{options["width"]}"')
+        if kind == "oval":
+            left, top, right, bottom = _bounding_box(points)
+            elements.append(f'<ellipse cx="{(left + right)/2:.2f}" cy="{(top + bottom)/2:.2f}" '
+                            f'rx="{(right - left)/2:.2f}" ry="{(bottom - top)/2:.2f}" {style}/>')
+        else:
+            tag = "polyline" if kind == "line" else "polygon"
+            coordinates = " ".join(f"{x:.2f},{y:.2f}" for x, y in points)
+            elements.append(f'<{tag} points="{coordinates}" stroke-linejoin="round" {style}/>')
+    elements.append("</svg>")
+    return "\n".join(elements) + "\n"
+
+
+def render_file(path, parameters, output_dir, image_format="png",
+                width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT):
+    """Render one ship file to output_dir, run in the worker processes
+
+    The output file has the name of the ship file, with the image format as extension
+    Args:
+        path (pathlib.Path): path to the ship file
+        parameters (parameters_loader.Parameters):
+        output_dir (pathlib.Path): where to write the image
+        image_format (str): one of FORMATS
+        width (int): width of the image
+        height (int): height of the image
+    Returns:
+        (output path, None) if it worked, (None, error message) if not
+    """
+    entry = fleet.load_ship_without_picture(path, parameters)
+    if not entry.ok:
+        return None, str(entry.error)
+    output_path = pathlib.Path(output_dir).joinpath(f"{pathlib.Path(path).name}.{image_format}")
+    try:
+        if image_format == "svg":
+            with open(output_path, "w") as file:
+                file.write(render_svg(entry.ship_data, parameters, width, height))
+        else:
+            render_image(entry.ship_data, parameters, width, height).save(output_path)
+    except OSError as error:
+        return None, str(error)
+    return output_path, None
+
+
+def render_thumbnails(location, output_dir, image_format="png", workers=None,
+                      width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT):
+    """Render all the ship files of a location on a pool of processes
+
+    Args:
+        location (str or pathlib.Path): see fleet.iter_ship_files
+        output_dir (str or pathlib.Path): where to write the images, created if needed
+        image_format (str): one of FORMATS
+        workers (int): see fleet.map_ship_files
+        width (int): width of the images
+        height (int): height of the images
+    Returns:
+        a generator of (ship file path, output path, error message) in completion order,
+        output path is None if the file could not be rendered, error message None if it was
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    render = functools.partial(render_file, output_dir=output_dir, image_format=image_format,
+                               width=width, height=height)
+    for path, (output_path, error) in fleet.map_ship_files(
+            render, fleet.iter_ship_files(location), workers):
+        yield path, output_path, error
+
+
+def make_sheet(image_paths, columns=4):
+    """Put images side by side on an overview sheet, each one with its name under it
+
+    Args:
+        image_paths (list): paths to images of the same size
+        columns (int): images per row
+    Returns:
+        PIL.Image.Image, None if there are no images
+    """
+    if not image_paths:
+        return None
+    with Image.open(image_paths[0]) as first:
+        width, height = first.size
+    rows = math.ceil(len(image_paths)/columns)
+    sheet = Image.new("RGB", (columns*width, rows*(height + _LABEL_HEIGHT)), "white")
+    draw = ImageDraw.Draw(sheet)
+    for index, image_path in enumerate(image_paths):
+        left = (index % columns)*width
+        top = (index // columns)*(height + _LABEL_HEIGHT)
+        with Image.open(image_path) as image:
+            sheet.paste(image.convert("RGB"), (left, top))
+        draw.text((left + 2, top + height), pathlib.Path(image_path).stem, fill="black")
+    return sheet
+
+
+def _smooth(points):
+    """Points along the curve drawn by a tk canvas line with smooth=True
+
+    Like tk: quadratic Bézier curves between the middles of the segments,
+    the line still starts and ends at its first and last points
+    """
+    if len(points) < 3:
+        return points
+    smoothed = [points[0]]
+    for index in range(1, len(points) - 1):
+        previous, control, following = points[index - 1], points[index], points[index + 1]
+        start = previous if index == 1 else _middle(previous, control)
+        end = following if index == len(points) - 2 else _middle(control, following)
+        for step in range(1, _SMOOTH_STEPS + 1):
+            t = step/_SMOOTH_STEPS
+            smoothed.append(tuple((1 - t)**2*start[axis] + 2*(1 - t)*t*control[axis]
+                                  + t**2*end[axis] for axis in (0, 1)))
+    return smoothed
+
+
+def _middle(point_a, point_b):
+    return ((point_a[0] + point_b[0])/2, (point_a[1] + point_b[1])/2)
+
+
+def _bounding_box(corners):
+    """(left, top, right, bottom) from two opposite corners in any order"""
+    (x_a, y_a), (x_b, y_b) = corners
+    return (min(x_a, x_b), min(y_a, y_b), max(x_a, x_b), max(y_a, y_b))
+
+
+def main(argv=None):
+    """Command line interface, see the module docstring"""
+    parser = argparse.ArgumentParser(prog="headless", description=__doc__.splitlines()[0])
+    parser.add_argument("location", help="directory, glob pattern or ship file")
+    parser.add_argument("output", help="directory where the images are written")
+    parser.add_argument("--format", dest="image_format", choices=FORMATS, default="png")
+    parser.add_argument("--width", type=int, default=THUMBNAIL_WIDTH)
+    parser.add_argument("--height", type=int, default=THUMBNAIL_HEIGHT)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes, one per core by default")
+    parser.add_argument("--sheet", help="also put all the thumbnails on this overview sheet, "
+                                        "png format only")
+    parser.add_argument("--columns", type=int, default=4, help="thumbnails per row on the sheet")
+    args = parser.parse_args(argv)
+    if args.sheet and args.image_format != "png":
+        parser.error("--sheet needs the png format")
+
+    rendered = []
+    failures = 0
+    for path, output_path, error in render_thumbnails(args.location, args.output,
+                                                      args.image_format, args.workers,
+                                                      args.width, args.height):
+        if error is None:
+            rendered.append(output_path)
+        else:
+            failures += 1
+            print(f"{path}: {error}")
+    print(f"{len(rendered)} rendered, {failures} failed")
+    if args.sheet and rendered:
+        make_sheet(sorted(rendered), args.columns).save(args.sheet)
+        print(f"overview sheet: {args.sheet}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
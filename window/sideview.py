@@ -1,13 +1,25 @@
 """Side view display of the ship"""
 
+import collections
+import math
 import tkinter as tk
-from PIL import Image, ImageTk, ImageDraw
-from window.framework import Subscriber
+from PIL import Image, ImageTk
+from window.framework import Subscriber, FrameScheduler
 
 _WIDTH = 701
 _HEIGHT = 301
 _GRID_STEPS = 25
-_GRID_RGBA = (0, 0, 0, 125)
+# Tk lines have no alpha: half of the pixels of black lines, like a 50% transparency
+_GRID_COLOR = "black"
+_GRID_STIPPLE = "gray50"
+GRID_TAG = "grid"
+
+# pyramid levels are not made smaller than that, in pixels
+_PYRAMID_MIN_SIZE = 64
+# zooms closer than that (0.1%) share the same bitmap
+_ZOOM_QUANTUM = math.log(1.001)
+# how many ready-to-display bitmaps are kept
+_PHOTO_CACHE_SIZE = 16
 
 class SideView(tk.Canvas, Subscriber):
     """Display the side view picture if one is defined in the ship data
@@ -19,8 +31,11 @@ class SideView(tk.Canvas, Subscriber):
         parent (tk.Frame): the parent frame where the picture goes
         shipdata (model.shipdata): shipdata that has, or does not have, a side_pict
         parameters: all the parameters for the program
+        sideview (TopView): the view the pans and zooms come from
+        frames (FrameScheduler): updates the view after the input events.
+            If None, the view has its own
     """
-    def __init__(self, parent, ship_data, parameters, sideview):
+    def __init__(self, parent, ship_data, parameters, sideview, frames=None):
         self._parameters = parameters
         Subscriber.__init__(self, sideview)
         if ship_data.side_pict:
@@ -29,7 +44,8 @@ class SideView(tk.Canvas, Subscriber):
         else:
             self._image = Image.new(mode="RGBA", size=(1, 1), color=(0, 0, 0, 0))
             self.borderwidth = 0
-        self._tkimage = ImageTk.PhotoImage(self._image)
+        self._pyramid = ZoomPyramid(self._image)
+        self._tkimage = self._pyramid.photo(parameters.sideview_zoom/ship_data.half_length)
         tk.Canvas.__init__(self, parent,
                            width=_WIDTH,
                            height=_HEIGHT,
@@ -42,7 +58,7 @@ class SideView(tk.Canvas, Subscriber):
 
         self.xview(tk.SCROLL, round(parameters.sideview_offset), tk.UNITS)
 
-        image_center = (0, round(self.winfo_height() - self._image.height/2.0))
+        image_center = (0, round(self.winfo_height() - self._tkimage.height()/2.0))
         self._image_id = self.create_image(image_center, image=self._tkimage)
         self.grid()
         self.bind("<B1-Motion>", self._on_move)
@@ -53,8 +69,9 @@ class SideView(tk.Canvas, Subscriber):
         self._half_length = ship_data.half_length
 
         self._grid_on = False
-        self._grid = make_grid(self.winfo_width(), self.winfo_height())
-        self._grid_id = -1
+        self._grid = CanvasGrid(self)
+        # the mouse events only invalidate, the view is updated once per frame
+        self._frames = frames if frames is not None else FrameScheduler(self)
 
         self.bind("<MouseWheel>", self._on_mousewheel)
 
@@ -62,13 +79,23 @@ class SideView(tk.Canvas, Subscriber):
         """Mark the start of the pan
         no pan along y axis
         """
+        # the end of a previous drag first, the pan starts again from here
+        self._frames.flush()
         self.scan_mark(event.x, 0)
 
     def _on_move(self, event):
         """If the button is down, pan the view
         no pan along y axis
         """
-        self.scan_dragto(event.x, 0, gain=1)
+        self._frames.invalidate((self, "pan"), self._pan, event.x)
+
+    def _pan(self, x):
+        """Scroll the view to the last drag position"""
+        self.scan_dragto(x, 0, gain=1)
+        self._view_moved()
+
+    def _view_moved(self):
+        """Keep the new offset in the parameters, and move the grid with the view"""
         self._parameters.sideview_offset = self.canvasx(0)
         self.refresh_grid(self._grid_on)
 
@@ -78,66 +105,168 @@ class SideView(tk.Canvas, Subscriber):
             self._parameters.sideview_zoom = self._parameters.sideview_zoom*1.01
         else:
             self._parameters.sideview_zoom = self._parameters.sideview_zoom*0.99
-        self._re_zoom(self._parameters.sideview_zoom)
+        self._invalidate_zoom()
+
+    def _invalidate_zoom(self):
+        """Zoom to the zoom of the parameters on the next frame"""
+        self._frames.invalidate((self, "zoom"), self._re_zoom, self._parameters.sideview_zoom)
 
     def _re_zoom(self, new_zoom):
         """When changing zoom, redraw the pict to the new zoom, resize the canvas"""
         corrected_zoom = new_zoom/self._half_length
-        new_size = [round(coord*corrected_zoom) for coord in  self._image.size]
-        self._tkimage = ImageTk.PhotoImage(self._image.resize(new_size))
+        self._tkimage = self._pyramid.photo(corrected_zoom)
         offset = (self.coords(self._image_id)[0], round(self.winfo_height() - self.borderwidth*2 - self._tkimage.height()/2.0))
-        self.delete(self._image_id)
-        self._image_id = self.create_image(*offset, image=self._tkimage)
+        self.coords(self._image_id, *offset)
+        self.itemconfig(self._image_id, image=self._tkimage)
         self._parameters.sideview_offset = self.canvasx(0)
         self.refresh_grid(self._grid_on)
 
     def refresh_grid(self, grid_on):
-        """Update the grid according to grid_on
-        Resize the grid if the previous grid was too small
-        No resize if the grid is too big!
+        """Update the grid according to grid_on, see CanvasGrid.show
+
+        When the view pans, the existing lines are only moved
         """
         self._grid_on = grid_on
-        if self._grid_id != -1:
-            self.delete(self._grid_id)
-        if grid_on:
-            if (self._grid.height() < self.winfo_height() or
-                    self._grid.width() < self.winfo_width()):
-                self._grid = make_grid(self.winfo_width(), self.winfo_height())
-            self._grid_id = self.create_image((self.canvasx(0),
-                                               self.canvasy(0)),
-                                              image=self._grid, anchor=tk.NW)
+        self._grid.show(grid_on)
 
     def _on_notification(self, observable, event_type, event_info):
         if event_type == "Drag":
+            # the scrolls add up, the rest is done once per frame
             self.xview(tk.SCROLL, round(event_info["x"]), tk.UNITS)
-            self._parameters.sideview_offset = self.canvasx(0)
-            self.refresh_grid(self._grid_on)
+            self._frames.invalidate((self, "moved"), self._view_moved)
         if event_type == "Apply_zoom":
             self._parameters.sideview_zoom = self._parameters.sideview_zoom*event_info["factor"]
-            self._re_zoom(self._parameters.sideview_zoom)
+            self._invalidate_zoom()
 
     def _on_resize(self, event):
-        self._re_zoom(self._parameters.sideview_zoom)
+        self._invalidate_zoom()
+
+class ZoomPyramid:
+    """Scaled versions of a picture, to avoid resizing the full resolution picture on each zoom
+
+    Mip-map style: level 0 is the original picture, each level is half the size of the previous.
+    A zoomed bitmap is resized from the smallest level that is still bigger than the result.
+    The last displayed bitmaps are kept ready in a LRU cache, keyed by quantized zoom.
+
+    Args:
+        image (PIL.Image): the full resolution picture
+        cache_size (int): how many bitmaps are kept in the LRU cache
+    """
+
+    def __init__(self, image, cache_size=_PHOTO_CACHE_SIZE):
+        self._levels = [image]
+        width, height = image.size
+        while width >= 2*_PYRAMID_MIN_SIZE and height >= 2*_PYRAMID_MIN_SIZE:
+            width, height = width//2, height//2
+            self._levels.append(self._levels[-1].resize((width, height), Image.BOX))
+        self._cache_size = cache_size
+        self._photos = collections.OrderedDict()
+
+    def photo(self, zoom):
+        """The picture as a PhotoImage scaled by zoom
+
+        Args:
+            zoom (number): scale factor relative to the original picture.
+                Rounded to the nearest _ZOOM_QUANTUM step
+        Returns:
+            ImageTk.PhotoImage
+        """
+        key = round(math.log(zoom)/_ZOOM_QUANTUM)
+        photo = self._photos.get(key)
+        if photo is not None:
+            self._photos.move_to_end(key)
+            return photo
+
+        quantized_zoom = math.exp(key*_ZOOM_QUANTUM)
+        new_size = [max(1, round(coord*quantized_zoom)) for coord in self._levels[0].size]
+        source = self._levels[0]
+        for level in self._levels[1:]:
+            if level.width < new_size[0] or level.height < new_size[1]:
+                break
+            source = level
+        photo = ImageTk.PhotoImage(source.resize(new_size))
+        self._photos[key] = photo
+        if len(self._photos) > self._cache_size:
+            self._photos.popitem(last=False)
+        return photo
+
+
+class CanvasGrid:
+    """Semi-transparent grid over a canvas, that stays in place in the window when the view pans
 
-def make_grid(width, height, horizontal=False):
-    """Build a semi-transparent grid in a picture
+    The lines are canvas items under one tag: they are created once, moved all together
+    by a single canvas call when the view pans, and only created again when the canvas
+    gets bigger than the area they cover. No picture is made.
 
     Args:
-        width (int): width of final image
-        height (int): height of final image
+        canvas (tk.Canvas): where the grid is drawn
         horizontal (bool): if true, the grid has horizontal and vertical lines
             if false, vertical only
+        tag (str): the tag of the lines
     """
-    grid = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(grid)
-    for x_coord in range(0, width, _GRID_STEPS):
-        draw.line([(x_coord, 0), (x_coord, height)], width=1, fill=_GRID_RGBA)
-
-    if horizontal:
-        draw.line([(0, height/2+1), (width, height/2+1)], width=1, fill=_GRID_RGBA)
-        for delta_y in range(_GRID_STEPS, int(height/2), _GRID_STEPS):
-            draw.line([(0, delta_y+ int(height/2)+1), (width, delta_y+ int(height/2)+1)],
-                      width=1, fill=_GRID_RGBA)
-            draw.line([(0, int(height/2)+1- delta_y), (width, int(height/2)+1- delta_y)],
-                      width=1, fill=_GRID_RGBA)
-    return ImageTk.PhotoImage(grid)
+
+    def __init__(self, canvas, horizontal=False, tag=GRID_TAG):
+        self._canvas = canvas
+        self._horizontal = horizontal
+        self.tag = tag
+        # area covered by the lines, in pixels
+        self._size = (0, 0)
+        # canvas coordinates of the top left corner of the lines, None if there are no lines
+        self._origin = None
+        self._shown = False
+
+    def show(self, grid_on=True):
+        """Show the grid over the visible part of the canvas, or hide it
+
+        Resize the grid if the previous grid was too small
+        No resize if the grid is too big!
+        """
+        canvas = self._canvas
+        if not grid_on:
+            if self._shown:
+                canvas.itemconfig(self.tag, state=tk.HIDDEN)
+                self._shown = False
+            return
+        size = (max(canvas.winfo_width(), canvas.winfo_reqwidth()),
+                max(canvas.winfo_height(), canvas.winfo_reqheight()))
+        origin = (canvas.canvasx(0), canvas.canvasy(0))
+        if self._origin is None or size[0] > self._size[0] or size[1] > self._size[1]:
+            self._draw(origin, (max(size[0], self._size[0]), max(size[1], self._size[1])))
+        elif origin != self._origin:
+            canvas.move(self.tag, origin[0] - self._origin[0], origin[1] - self._origin[1])
+            self._origin = origin
+        if not self._shown:
+            canvas.itemconfig(self.tag, state=tk.NORMAL)
+            self._shown = True
+        canvas.tag_raise(self.tag)
+
+    def clear(self):
+        """Delete the lines, like after the canvas items were scaled
+
+        They are created again by the next show
+        """
+        self._canvas.delete(self.tag)
+        self._origin = None
+        self._shown = False
+
+    def _draw(self, origin, size):
+        canvas = self._canvas
+        canvas.delete(self.tag)
+        left, top = origin
+        width, height = size
+        options = {"fill": _GRID_COLOR, "stipple": _GRID_STIPPLE, "width": 1,
+                   "state": tk.HIDDEN, "tags": self.tag}
+        for x_coord in range(0, width, _GRID_STEPS):
+            canvas.create_line(left + x_coord, top, left + x_coord, top + height, **options)
+
+        if self._horizontal:
+            center = top + int(height/2) + 1
+            canvas.create_line(left, center, left + width, center, **options)
+            for delta_y in range(_GRID_STEPS, int(height/2), _GRID_STEPS):
+                canvas.create_line(left, center + delta_y, left + width, center + delta_y,
+                                   **options)
+                canvas.create_line(left, center - delta_y, left + width, center - delta_y,
+                                   **options)
+        self._size = size
+        self._origin = origin
+        self._shown = False
@@ -1,5 +1,6 @@
 """All the classes to display the points and properties of a structure and edti them
 """
+import itertools
 import tkinter as tk
 from tkinter.ttk import Treeview, Scrollbar, Entry, Label, Checkbutton, Button, Style
 import model.shipdata
@@ -58,6 +59,10 @@ class StructEditor(tk.Frame, Subscriber, Observable):
         self._tree.configure(yscrollcommand=scroll.set)
 
         self._index_of_sel_point = -1
+        # one [iid, displayed values] per row, in the order of the points
+        # the iids stay with their row when points are added or deleted before it
+        self._rows = []
+        self._iids = itertools.count()
         self._fill_tree()
 
         self._edit_zone = EditZone(
@@ -68,11 +73,15 @@ class StructEditor(tk.Frame, Subscriber, Observable):
         """Set the selected point to the new_sel_index
 
         Gives correct focus, update, etc to the editor's widgets
+        at once, without waiting for the treeview's selection event
         if the index is outside of the self.points, does nothing
         """
         if new_sel_index >= 0 and new_sel_index <= len(self.points) - 1:
             iid = self._tree.get_children()[new_sel_index]
-            self._tree.selection_set(iid)
+            self._index_of_sel_point = new_sel_index
+            self._edit_zone.set_editable_point(new_sel_index)
+            if self._tree.selection() != (iid,):
+                self._tree.selection_set(iid)
 
     def _on_click(self, *_args):
         self._tree.focus_set()
@@ -91,8 +100,11 @@ class StructEditor(tk.Frame, Subscriber, Observable):
         """called back when a point is selected in the table/treeview
 
         Updates the editable fields
+        Nothing to do when the selection comes from _set_selection, it is already done
         """
         selected_iid = self._tree.selection()
+        if not selected_iid or self._tree.index(selected_iid) == self._index_of_sel_point:
+            return
         self._index_of_sel_point = self._tree.index(selected_iid)
         self._edit_zone.set_editable_point(
             self._tree.item(selected_iid)["values"][0])
@@ -102,24 +114,58 @@ class StructEditor(tk.Frame, Subscriber, Observable):
         """fills the treeview with data from the structure
         """
         self._tree.delete(*self._tree.get_children())
-        for point_index, point in enumerate(self._structure.points):
-            self._tree.insert('', 'end', values=[
-                              point_index, round(point[0]), round(point[1])])
-            if point_index == self._index_of_sel_point:
-                self._set_selection(point_index)
+        self._rows = []
+        self._sync_rows()
+
+    def _row_values(self, point_index):
+        point = self._structure.points[point_index]
+        return [point_index, round(point[0]), round(point[1])]
+
+    def _sync_rows(self):
+        """Bring the treeview up to date with the structure's points
+
+        Rows are added or removed at the end, and only the rows whose values changed are edited,
+        so the Tk calls are proportional to the changes and not to the points count.
+        Then select the selected point again
+        """
+        points_count = len(self._structure.points)
+        while len(self._rows) > points_count:
+            self._tree.delete(self._rows.pop()[0])
+        while len(self._rows) < points_count:
+            self._insert_row(len(self._rows))
+        for point_index, row in enumerate(self._rows):
+            values = self._row_values(point_index)
+            if row[1] != values:
+                self._tree.item(row[0], values=values)
+                row[1] = values
+        if 0 <= self._index_of_sel_point < points_count:
+            self._set_selection(self._index_of_sel_point)
+
+    def _insert_row(self, point_index):
+        """Add a row for the point at point_index, with a new iid"""
+        iid = f"point{next(self._iids)}"
+        values = self._row_values(point_index)
+        self._tree.insert('', point_index, iid=iid, values=values)
+        self._rows.insert(point_index, [iid, values])
 
     def _on_notification(self, observable, event_type, event_info):
-        """Rebuild the treeview on structure update
+        """Update the rows of the treeview touched by the structure update
         Depending on the structure state and the operation, change the selcted point
         """
+        points_count = len(self._structure.points)
         if event_type == "add_point":
             self._index_of_sel_point = event_info["index"]
-            self._fill_tree()
+            if event_info["index"] < points_count and len(self._rows) < points_count:
+                self._insert_row(event_info["index"])
         else:
-            if self._index_of_sel_point >= len(self._structure.points):
-                self._index_of_sel_point = len(self._structure.points)
+            if (event_type == "delete_point" and event_info["index"] < len(self._rows)
+                    and len(self._rows) > points_count):
+                self._tree.delete(self._rows.pop(event_info["index"])[0])
+            if self._index_of_sel_point >= points_count:
+                self._index_of_sel_point = points_count
                 self._edit_zone.unset_point()
-            self._fill_tree()
+        # the other rows, and the events merged in a batch
+        self._sync_rows()
         self._notify("focus", {})
 
     def update_to_coord(self, point):
@@ -136,11 +182,23 @@ class StructEditor(tk.Frame, Subscriber, Observable):
             self._command_stack.do(model.structure.AddPoint(
                 self._structure, self._index_of_sel_point+1, round(point[0]), round(point[1])))
         if self._index_of_sel_point+1 >= len(self.points):
-            self.winfo_toplevel().update()
+            # after the last point: the next click adds a point
             self._index_of_sel_point = len(self.points)
+            self._tree.selection_set(())
+            self._edit_zone.unset_point()
         else:
             self._set_selection(self._index_of_sel_point+1)
-            self.winfo_toplevel().update()
+        self._notify("focus", {})
+
+    def select_point(self, point_index):
+        """Make this editor the active one, with the point at point_index selected
+
+        Intended to be called from click on the top view
+        """
+        self._tree.focus_set()
+        self._index_of_sel_point = point_index
+        self._set_selection(point_index)
+        self._notify("focus", {})
 
     @property
     def points(self):
@@ -3,13 +3,27 @@
    Includes the main TopView canvas and all the commands that are started from there.
 """
 import tkinter as tk
-from window.sideview import make_grid
-from window.framework import Observable
+from model.spatial import SpatialIndex, VERTEX, EDGE
+from window.sideview import CanvasGrid
+from window.framework import (Observable, FrameScheduler, make_converters, cancel_deferred,
+                              HFUNNELS_TO_HLENGTH, FUNNEL_OVAL)
 
-_HFUNNELS_TO_HLENGTH = 0.028
-_FUNNEL_OVAL = 1.38
 _WIDTH = 701
 _HEIGHT = 261
+# the static layer: what cannot be edited, drawn once
+_STATIC_TAG = "static"
+_HULL_TAG = "hull"
+_TURRET_TAG = "turret"
+# the dynamic layer, between the hull and the turrets: the structures and funnels being edited
+_DYNAMIC_TAG = "dynamic"
+_HOVER_TAG = "hover"
+
+# a click that near a vertex, edge or funnel selects it, in pixels
+_PICK_RADIUS = 6
+# the cells of the spatial index, relative to the half length of the ship
+_INDEX_CELL_TO_HLENGTH = 1/8
+# with Shift held, a click always goes to the active editor, even near something pickable
+_SHIFT_MASK = 0x0001
 
 
 class TopView(tk.Canvas, Observable):
@@ -26,6 +40,8 @@ class TopView(tk.Canvas, Observable):
         funnel_editors (list): as the struct editors but for funnels
         command_stack (ComandStack): the undo/redo command stack common to the whole program
         parameters (parameters_loader.Parameters): set of data to draw the ship.
+        frames (FrameScheduler): updates the view after the input events.
+            If None, the view has its own
     """
 
     def __init__(self, parent,
@@ -33,7 +49,8 @@ class TopView(tk.Canvas, Observable):
                  struct_editors,
                  funnel_editors,
                  command_stack,
-                 parameters):
+                 parameters,
+                 frames=None):
         tk.Canvas.__init__(self, parent,
                            width=_WIDTH,
                            height=_HEIGHT,
@@ -46,6 +63,10 @@ class TopView(tk.Canvas, Observable):
         self._parameters = parameters
         self.command_stack = command_stack
         self._half_length = ship_data.half_length
+        # the mouse events only invalidate, the view is updated once per frame
+        self._frames = frames if frames is not None else FrameScheduler(self)
+        # zoom of the wheel events not applied yet
+        self._pending_zoom = 1.0
 
         self.xview(tk.SCROLL, round(parameters.topview_offset[0]), tk.UNITS)
         self.yview(tk.SCROLL, round(parameters.topview_offset[1]), tk.UNITS)
@@ -53,24 +74,39 @@ class TopView(tk.Canvas, Observable):
         self._funnel_to_canvas, self._canvas_to_funnel = self.make_converters(
             ship_data.half_length)
 
-        self._display_hull(
-            parameters.hulls_shapes[ship_data.ship_type], self._half_length)
-        self._drawings_ids = []
+        self._build_static_layer(ship_data, parameters)
         self._active_editor = None
-
+        # canvas items that persist for the whole session, updated in place
+        self._structure_items = {}
+        self._funnel_items = {}
+        self._structure_preview = self.create_line(0, 0, 0, 0, fill="red", width=2,
+                                                   state=tk.HIDDEN)
+        self._funnel_preview = self.create_oval(0, 0, 0, 0, fill="red", stipple="gray25",
+                                                state=tk.HIDDEN)
+        # what a click would select, see _pick
+        self._hover_vertex = self.create_oval(0, 0, 0, 0, outline="orange", width=2,
+                                              state=tk.HIDDEN, tags=_HOVER_TAG)
+        self._hover_edge = self.create_line(0, 0, 0, 0, fill="orange", width=4,
+                                            state=tk.HIDDEN, tags=_HOVER_TAG)
+        self._hover_hit = None
+        # the structures and funnels, by editor, in funnel coordinates
+        self._index = SpatialIndex(ship_data.half_length*_INDEX_CELL_TO_HLENGTH)
+
+        # the notifications are delivered when tk is idle, so several changes make one repaint
         self._struct_editors = struct_editors
-        for struct_editor in struct_editors:
-            struct_editor.subscribe(self._on_notification)
+        self._unsubscribes = [
+            struct_editor.subscribe(self._on_notification, scheduler=self.after_idle,
+                                    cancel=self.after_cancel)
+            for struct_editor in struct_editors]
 
-        self._funnel_half_width = ship_data.half_length*_HFUNNELS_TO_HLENGTH
+        self._funnel_half_width = ship_data.half_length*HFUNNELS_TO_HLENGTH
         self._funnel_editors = funnel_editors
-        for funnel_editor in funnel_editors:
-            funnel_editor.subscribe(self._on_notification)
-
-        self._turrets = ship_data.turrets_torps
+        self._unsubscribes += [
+            funnel_editor.subscribe(self._on_notification, scheduler=self.after_idle,
+                                    cancel=self.after_cancel)
+            for funnel_editor in funnel_editors]
 
-        self._grid = make_grid(self.winfo_reqwidth(),
-                               self.winfo_reqheight(), horizontal=True)
+        self._grid = CanvasGrid(self, horizontal=True)
         self._grid_on = False
 
         self.redraw()
@@ -79,10 +115,11 @@ class TopView(tk.Canvas, Observable):
         self.bind("<Motion>", self._on_mouse_move)
         self.bind("<B1-Motion>", self._on_drag)
         self.bind("<Enter>", self._on_mouse_move)
-        self.bind("<Leave>", self._on_mouse_move)
+        self.bind("<Leave>", self._on_mouse_leave)
         self.bind("<ButtonPress-1>", self._on_click)
         self.bind("<ButtonRelease-1>", self._on_left_release)
         self.bind("<MouseWheel>", self._on_mousewheel)
+        self.bind("<Configure>", self._on_resize)
 
     def make_converters(self, half_length):
         """give converters from funnel to canvas coordinates and vice-versa
@@ -97,38 +134,26 @@ class TopView(tk.Canvas, Observable):
                 funnel to canvas
                 canvas ti funnel
         """
-        coord_factor = (self.winfo_reqwidth()/2.1) / \
-            half_length*self._parameters.topview_zoom
-        xoffset = self.winfo_reqwidth()/2.0
-        yoffset = self.winfo_reqheight()/2.0
-
-        def funnel_to_canvas(point):
-            """convert from funnel to canvas coordinates
-
-            Args:
-                point (number, number): point in funnel coordinates
-
-            Returns:
-                (int, int) in canvas coordinates
-            """
-            if not point:
-                return []
-            return (point[1]*coord_factor + xoffset, -point[0]*coord_factor + yoffset)
-
-        def canvas_to_funnel(point):
-            """convert from canvas to funnel coordinates
+        return make_converters(self.winfo_reqwidth(), self.winfo_reqheight(),
+                               half_length, self._parameters.topview_zoom)
 
-            Args:
-                point (number, number): point in canvas coordinates
+    def _build_static_layer(self, ship_data, parameters):
+        """Draw what does not change while editing: the hull, turrets and torpedo mounts
 
-            Returns:
-                (int, int) in funnel coordinates
-            """
-            if not point:
-                return []
-            return (-(point[1] - yoffset)/coord_factor, (point[0] - xoffset)/coord_factor)
+        The static layer is drawn once, the zoom scales it with the rest of the canvas.
+        The structures and funnels are inserted below the turrets,
+        so nothing of the static layer is touched again
+        """
+        self._display_hull(parameters.hulls_shapes[ship_data.ship_type], self._half_length)
+        # the top of the dynamic layer, an invisible mark between the hull and the turrets
+        self._dynamic_top = self.create_line(0, 0, 0, 0, state=tk.HIDDEN, tags=_DYNAMIC_TAG)
+        for turret in ship_data.turrets_torps:
+            self._draw_turret(turret)
 
-        return (funnel_to_canvas, canvas_to_funnel)
+    def _add_dynamic_item(self, item_id):
+        """Put a newly created structure or funnel item in its layer, below the turrets"""
+        self.tag_lower(item_id, self._dynamic_top)
+        return item_id
 
     def _display_hull(self, hull_shape, half_length):
         """draw the hull outlines according to the ship type and half length
@@ -144,198 +169,362 @@ class TopView(tk.Canvas, Observable):
                 (point[0]*half_length,
                  point[1]*half_length))
                 for point in line]
-            self.create_line(*converted_points, smooth=True, width=2)
+            self.create_line(*converted_points, smooth=True, width=2,
+                             tags=(_STATIC_TAG, _HULL_TAG))
+
+    def _structure_color(self, editor):
+        if editor == self._active_editor and editor.selected_index != -1:
+            return "orange"
+        return "black"
+
+    def _sync_structure(self, editor):
+        """Update in place the canvas item of one structure so it matches the structure's state
 
-    def _draw_structure(self, points, fill, selected_index=-1, mouse_xy=(-1, -1)):
-        """Draw one structure on the canvas
+        The item is only re-created if the fill state changed, a line cannot become a polygon
 
-        If the structure is active, draws the potential new outline to the cursor position
         Args:
-            points list of (x, y): all the points of the superstructure in funel coordinates
-            fill bool: draw as a filled polygon or just a line
-            selected_index int: if a point of the structure has been selected by the user,
-                this is the index of the point in the points list
-                -1 means "none selected"
-            mouse_xy (x, y): position of the mouse in the canvas local coordinates.
-                (-1, -1) means "do not care"
-                If there is a mouse position and a selected index,
-                the potential new outline to the pointer is drawn.
+            editor (StructEditor): the editor of the structure to draw
         """
-        if selected_index != -1:
-            color = "orange"
+        item = self._structure_items.get(editor)
+        points = editor.points
+        if len(points) < 2:
+            if item is not None:
+                self.delete(item[0])
+                del self._structure_items[editor]
+            self._index.remove(editor)
+            return
+        self._index.set_shape(editor, points, closed=editor.fill)
+
+        converted_points = [self._funnel_to_canvas(point) for point in points]
+        color = self._structure_color(editor)
+        if item is not None and item[1] != editor.fill:
+            self.delete(item[0])
+            item = None
+        if item is None:
+            if editor.fill:
+                item_id = self.create_polygon(*converted_points, fill="cyan", outline=color,
+                                              width=2, tags=_DYNAMIC_TAG)
+            else:
+                item_id = self.create_line(*converted_points, fill=color, width=2,
+                                           tags=_DYNAMIC_TAG)
+            self._structure_items[editor] = (self._add_dynamic_item(item_id), editor.fill)
         else:
-            color = "black"
-        drawing_ids = []
-        if len(points) >= 2:
-            converted_points = [self._funnel_to_canvas(
-                point) for point in points]
-            if fill:
-                drawing_ids.append(self.create_polygon(*converted_points,
-                                                       fill="cyan", outline=color, width=2))
+            self.coords(item[0], *converted_points)
+            if editor.fill:
+                self.itemconfig(item[0], outline=color)
             else:
-                drawing_ids.append(self.create_line(
-                    *converted_points, fill=color, width=2))
-
-        if mouse_xy != (-1, -1) and selected_index != -1:
-            mouse_drawing_verteces = []
-            if selected_index - 1 >= 0 and points:
-                mouse_drawing_verteces.append(
-                    self._funnel_to_canvas(points[selected_index - 1]))
-            mouse_drawing_verteces.append(mouse_xy)
-            if selected_index + 1 <= len(points) - 1:
-                mouse_drawing_verteces.append(
-                    self._funnel_to_canvas(points[selected_index + 1]))
-
-            if len(mouse_drawing_verteces) >= 2:
-                drawing_ids.append(self.create_line(
-                    *mouse_drawing_verteces, fill="red", width=2))
-        return drawing_ids
-
-    def _draw_funnel(self, x, y, oval, mouse_x=-1, mouse_y=-1):
-        """Draw one funnel on the canvas
-
-        If the funnel is active, draws the potential new outline to the cursor position
-        Args:
-            position int:the funnel's coordinate in funnel system along the Y (length) axis
-            oval bool: draw as an oval or a disk
-            mouse_x int: position of the mouse in the canvas' coordinates' x axis (length of ship).
-                -1 means "do not care"
-                If there is a mouse position and a selected index,
-                the potential new funnel is drawn
-        """
-        drawing_ids = []
+                self.itemconfig(item[0], fill=color)
+
+    def _funnel_oval_corners(self, x, y, oval):
+        """Canvas coordinates of the corners of the bounding box of a funnel"""
         delta = self._funnel_half_width
         if oval:
-            delta = delta*_FUNNEL_OVAL
-        if x != 0 or y != 0:
-            vertex1_canvas = self._funnel_to_canvas(
-                (x-self._funnel_half_width, y-delta))
-            vertex2_canvas = self._funnel_to_canvas(
-                (x+self._funnel_half_width, y+delta))
-            drawing_ids.append(self.create_oval(
-                *vertex1_canvas, *vertex2_canvas, fill="black"))
-
-        if mouse_x != -1 and mouse_y != -1:
-            (mouse_funnel_x, mouse_funnel_y) = self._canvas_to_funnel(
-                (mouse_x, mouse_y))
-            vertex1_canvas = self._funnel_to_canvas(
-                (mouse_funnel_x-self._funnel_half_width, mouse_funnel_y-delta))
-            vertex2_canvas = self._funnel_to_canvas(
-                (mouse_funnel_x+self._funnel_half_width, mouse_funnel_y+delta))
-            drawing_ids.append(self.create_oval(*vertex1_canvas, *vertex2_canvas,
-                                                fill="red", stipple="gray25"))
-        return drawing_ids
+            delta = delta*FUNNEL_OVAL
+        return (self._funnel_to_canvas((x-self._funnel_half_width, y-delta))
+                + self._funnel_to_canvas((x+self._funnel_half_width, y+delta)))
+
+    def _sync_funnel(self, editor):
+        """Update in place the canvas item of one funnel so it matches the funnel's state
+
+        Args:
+            editor (FunnelEditor): the editor of the funnel to draw
+        """
+        if editor == self._active_editor:
+            visible = editor.x != 0 or editor.y != 0
+        else:
+            visible = editor.y != 0
+        item_id = self._funnel_items.get(editor)
+        if not visible:
+            if item_id is not None:
+                self.itemconfig(item_id, state=tk.HIDDEN)
+            self._index.remove(editor)
+            return
+        self._index.set_shape(editor, [(editor.x, editor.y)], radius=self._funnel_half_width)
+        corners = self._funnel_oval_corners(editor.x, editor.y, editor.oval)
+        if item_id is None:
+            self._funnel_items[editor] = self._add_dynamic_item(
+                self.create_oval(*corners, fill="black", tags=_DYNAMIC_TAG))
+        else:
+            self.coords(item_id, *corners)
+            self.itemconfig(item_id, state=tk.NORMAL)
+
+    def _update_preview(self, mouse_xy=(-1, -1)):
+        """Move the preview of the active editor's edit to the mouse position
+
+        For a structure, the potential new outline from the neighbours of the selected point
+        to the pointer. For a funnel, the potential new funnel.
+        Args:
+            mouse_xy (x, y): position of the mouse in the canvas local coordinates.
+                (-1, -1) means "outside of the canvas", the preview is hidden
+        """
+        editor = self._active_editor
+        structure_preview = []
+        funnel_preview = []
+        if mouse_xy != (-1, -1) and editor is not None:
+            if editor in self._funnel_editors:
+                (mouse_funnel_x, mouse_funnel_y) = self._canvas_to_funnel(mouse_xy)
+                funnel_preview = self._funnel_oval_corners(mouse_funnel_x, mouse_funnel_y,
+                                                           editor.oval)
+            elif editor.selected_index != -1:
+                points = editor.points
+                selected_index = editor.selected_index
+                if selected_index - 1 >= 0 and points:
+                    structure_preview.append(
+                        self._funnel_to_canvas(points[selected_index - 1]))
+                structure_preview.append(mouse_xy)
+                if selected_index + 1 <= len(points) - 1:
+                    structure_preview.append(
+                        self._funnel_to_canvas(points[selected_index + 1]))
+
+        if len(structure_preview) >= 2:
+            self.coords(self._structure_preview, *structure_preview)
+            self.itemconfig(self._structure_preview, state=tk.NORMAL)
+            self.tag_raise(self._structure_preview)
+        else:
+            self.itemconfig(self._structure_preview, state=tk.HIDDEN)
+
+        if funnel_preview:
+            self.coords(self._funnel_preview, *funnel_preview)
+            self.itemconfig(self._funnel_preview, state=tk.NORMAL)
+            self.tag_raise(self._funnel_preview)
+        else:
+            self.itemconfig(self._funnel_preview, state=tk.HIDDEN)
+
+    def _pick(self, mouse_xy):
+        """What a click at a position would select
+
+        Any vertex, structure edge or funnel, except what a click on it changes:
+        the selected point and the edges of the active structure, and the active funnel
+        Args:
+            mouse_xy (x, y): position of the mouse in the canvas local coordinates
+        Returns:
+            spatial.Hit, None if there is nothing to select there
+        """
+        active_editor = self._active_editor
+
+        def accept(editor, kind, index):
+            if editor != active_editor:
+                return True
+            if editor in self._funnel_editors:
+                return False
+            return kind == VERTEX and index != editor.selected_index
+
+        mouse_funnel = self._canvas_to_funnel(mouse_xy)
+        pixel = self._canvas_to_funnel((mouse_xy[0] + 1, mouse_xy[1]))
+        radius = _PICK_RADIUS*abs(pixel[1] - mouse_funnel[1])
+        return self._index.nearest(mouse_funnel, radius, accept)
+
+    def _update_hover(self, mouse_xy=(-1, -1)):
+        """Highlight what a click at the mouse position would select
+
+        Args:
+            mouse_xy (x, y): position of the mouse in the canvas local coordinates.
+                (-1, -1) means "outside of the canvas", nothing is highlighted
+        """
+        hit = self._pick(mouse_xy) if mouse_xy != (-1, -1) else None
+        # the highlight only changes when the pointer goes to another vertex, edge or funnel
+        target = hit[:3] if hit is not None else None
+        if target == self._hover_hit:
+            return
+        self._hover_hit = target
+        vertex = []
+        edge = []
+        if hit is not None:
+            points = self._index.points(hit.key)
+            if hit.key in self._funnel_editors:
+                vertex = self._funnel_oval_corners(*points[0], hit.key.oval)
+            elif hit.kind == VERTEX:
+                x, y = self._funnel_to_canvas(points[hit.index])
+                vertex = (x - _PICK_RADIUS, y - _PICK_RADIUS, x + _PICK_RADIUS, y + _PICK_RADIUS)
+            else:
+                edge = (self._funnel_to_canvas(points[hit.index])
+                        + self._funnel_to_canvas(points[(hit.index + 1) % len(points)]))
+        for item, coordinates in ((self._hover_vertex, vertex), (self._hover_edge, edge)):
+            if coordinates:
+                self.coords(item, *coordinates)
+                self.itemconfig(item, state=tk.NORMAL)
+                self.tag_raise(item)
+            else:
+                self.itemconfig(item, state=tk.HIDDEN)
+
+    def _select(self, hit, mouse_xy):
+        """Make the editor of what was clicked the active one, and select the clicked point
+
+        On an edge, the end of the edge nearest to the click is selected
+        """
+        if hit.key in self._funnel_editors:
+            hit.key.select()
+            return
+        index = hit.index
+        if hit.kind == EDGE:
+            points = self._index.points(hit.key)
+            following = (index + 1) % len(points)
+            mouse_funnel = self._canvas_to_funnel(mouse_xy)
+            if (_distance_squared(mouse_funnel, points[following])
+                    < _distance_squared(mouse_funnel, points[index])):
+                index = following
+        hit.key.select_point(index)
 
     def _draw_turret(self, turret):
         canvas_outline = [self._funnel_to_canvas(
             point) for point in turret.outline]
-        return [self.create_polygon(*canvas_outline, fill="green", outline="black")]
+        return self.create_polygon(*canvas_outline, fill="green", outline="black",
+                                   tags=(_STATIC_TAG, _TURRET_TAG))
 
-    def redraw(self, active_editor=None):
-        """Redraw all the canvas elements, except the hul outline
+    def _pointer_position(self):
+        """Position of the mouse pointer in the canvas local coordinates
 
-        Args:
-            active_editor: the struct or funnel editor that is currently active.
-                this editor will get the mouse clicks to modify the funnel or structure.
+        (-1, -1) if the pointer is outside of the canvas
         """
-
         mouse_x = self.winfo_pointerx() - self.winfo_rootx() + self.canvasx(0)
         mouse_y = self.winfo_pointery() - self.winfo_rooty() + self.canvasy(0)
         if (mouse_x >= 0 and mouse_y >= 0
                 and mouse_x <= self.winfo_width() - 1 and mouse_y <= self.winfo_height() - 1):
-            mouse_rel_pos = (mouse_x, mouse_y)
-        else:
-            mouse_rel_pos = (-1, -1)
-
-        for drawing_id in self._drawings_ids:
-            self.delete(drawing_id)
-        self._drawings_ids = []
+            return (mouse_x, mouse_y)
+        return (-1, -1)
 
-        for editor in self._struct_editors:
-            if editor == active_editor:
-                self._drawings_ids = (self._drawings_ids
-                                      + self._draw_structure(editor.points,
-                                                             editor.fill,
-                                                             selected_index=editor.selected_index,
-                                                             mouse_xy=mouse_rel_pos))
-            else:
-                self._drawings_ids = (self._drawings_ids
-                                      + self._draw_structure(editor.points, editor.fill))
+    def destroy(self):
+        """Stop the notifications, the ones waiting for tk to be idle are dropped"""
+        for unsubscribe in self._unsubscribes:
+            unsubscribe()
+        cancel_deferred(self._on_notification)
+        super().destroy()
 
-        for editor in self._funnel_editors:
-            if editor == active_editor:
-                self._drawings_ids = (self._drawings_ids
-                                      + self._draw_funnel(editor.x, editor.y,
-                                                          editor.oval,
-                                                          mouse_rel_pos[0],
-                                                          mouse_rel_pos[1]))
-            else:
-                if editor.y != 0:
-                    self._drawings_ids = (self._drawings_ids
-                                          + self._draw_funnel(editor.x, editor.y, editor.oval))
+    def redraw(self, active_editor=None):
+        """Bring all the canvas elements up to date, except the hull outline
 
-        for turret in self._turrets:
-            self._drawings_ids = self._drawings_ids + self._draw_turret(turret)
+        Args:
+            active_editor: the struct or funnel editor that is currently active.
+                this editor will get the mouse clicks to modify the funnel or structure.
+                If None, the active editor does not change.
+        """
+        if active_editor is not None:
+            self._active_editor = active_editor
 
+        for editor in self._struct_editors:
+            self._sync_structure(editor)
+        for editor in self._funnel_editors:
+            self._sync_funnel(editor)
+        pointer_position = self._pointer_position()
+        self._update_preview(pointer_position)
+        self._hover_hit = None
+        self._update_hover(pointer_position)
         self.refresh_grid()
 
     def refresh_grid(self):
-        """Update the grid according to grid_on
-        Resize the grid if the previous grid was too small
-        No resize if the grid is too big!
+        """Update the grid according to grid_on, see CanvasGrid.show
+
+        When the view pans, the existing lines are only moved
         """
-        if self._grid_on:
-            if (self._grid.height() < self.winfo_height() or
-                    self._grid.width() < self.winfo_width()):
-                self._grid = make_grid(
-                    self.winfo_width(), self.winfo_height(), horizontal=True)
-            self._drawings_ids.append(self.create_image((self.canvasx(0),
-                                                         self.canvasy(0)),
-                                                        image=self._grid, anchor=tk.NW))
+        self._grid.show(self._grid_on)
 
     def _on_drag(self, event):
         self._dragging = True
-        self.scan_dragto(event.x, event.y, gain=1)
+        self._frames.invalidate((self, "pan"), self._pan, event.x, event.y)
+
+    def _pan(self, x, y):
+        """Scroll the view to the last drag position"""
+        self.scan_dragto(x, y, gain=1)
         new_offset = (self.canvasx(0), self.canvasy(0))
         x_move = new_offset[0] - self._parameters.topview_offset[0]
         self._parameters.topview_offset = new_offset
+        self.refresh_grid()
         self._notify("Drag", {"x": x_move})
 
-    def _on_mouse_move(self, _event):
+    def _on_mouse_move(self, event):
+        """Only the preview follows the mouse, nothing else is redrawn"""
         if not self._dragging:
-            self.redraw(self._active_editor)
+            self._frames.invalidate((self, "pointer"), self._follow_pointer, (event.x, event.y))
+
+    def _on_mouse_leave(self, _event):
+        self._frames.invalidate((self, "pointer"), self._follow_pointer)
+
+    def _follow_pointer(self, event_xy=None):
+        """Move the preview and the hover highlight to the last pointer position
+
+        Args:
+            event_xy (x, y): position of the pointer in the window, None if it left the canvas
+        """
+        if event_xy is None:
+            self._update_preview()
+            self._update_hover()
+        elif not self._dragging:
+            mouse_xy = (self.canvasx(event_xy[0]), self.canvasy(event_xy[1]))
+            self._update_preview(mouse_xy)
+            self._update_hover(mouse_xy)
+
+    def _on_resize(self, _event):
+        self._frames.invalidate((self, "grid"), self.refresh_grid)
 
     def _on_mousewheel(self, event):
-        """Mouse wheel changes the zoom"""
+        """Mouse wheel changes the zoom
+
+        The steps of the wheel events received within a frame are applied together
+        """
         if event.delta > 0:
-            factor = 1.05
+            self._pending_zoom = self._pending_zoom*1.05
         else:
-            factor = 0.95
+            self._pending_zoom = self._pending_zoom*0.95
+        self._frames.invalidate((self, "zoom"), self._apply_zoom)
+
+    def _apply_zoom(self):
+        factor = self._pending_zoom
+        self._pending_zoom = 1.0
         self.scale("all", self.winfo_reqwidth()/2.0,
                    self.winfo_reqheight()/2.0, factor, factor)
+        # the grid keeps its spacing whatever the zoom
+        self._grid.clear()
+        self.refresh_grid()
         self._parameters.topview_zoom = self._parameters.topview_zoom*factor
         self._notify("Apply_zoom", {"factor": factor})
         self._funnel_to_canvas, self._canvas_to_funnel = self.make_converters(
             self._half_length)
+        self._hover_hit = None
+        self._update_hover(self._pointer_position())
 
     def _on_notification(self, observable, _event_type, _event_info):
-        """Notifications comming from funnel and structure editors"""
+        """Notifications comming from funnel and structure editors
+
+        Only the drawings of the notifying editor, and of the previously active one, are updated
+        """
+        previous_editor = self._active_editor
         self._active_editor = observable
-        self.redraw(observable)
+        for editor in {previous_editor, observable}:
+            if editor in self._struct_editors:
+                self._sync_structure(editor)
+            elif editor in self._funnel_editors:
+                self._sync_funnel(editor)
+        pointer_position = self._pointer_position()
+        self._update_preview(pointer_position)
+        self._hover_hit = None
+        self._update_hover(pointer_position)
 
     def _on_click(self, event):
+        # the end of a previous drag first, the pan starts again from here
+        self._frames.flush()
         self.scan_mark(event.x, event.y)
 
     def _on_left_release(self, event):
-        """Send to the active editor the coordinates of a mouse click, in funnel coordinates"""
+        """A click near a vertex, edge or funnel selects it
+
+        Else, or with Shift held, send to the active editor the coordinates of the click,
+        in funnel coordinates
+        """
         if self._dragging:
             self._dragging = False
             return
-        if self._active_editor is not None:
-            self._active_editor.update_to_coord(self._canvas_to_funnel((event.x + self.canvasx(0),
-                                                                        event.y + self.canvasy(0))))
+        mouse_xy = (event.x + self.canvasx(0), event.y + self.canvasy(0))
+        hit = None if event.state & _SHIFT_MASK else self._pick(mouse_xy)
+        if hit is not None:
+            self._select(hit, mouse_xy)
+        elif self._active_editor is not None:
+            self._active_editor.update_to_coord(self._canvas_to_funnel(mouse_xy))
 
     def switch_grid(self, grid_on):
         """Add or remove the grid according to the state of grid_on"""
         self._grid_on = grid_on
         self.redraw()
+
+
+def _distance_squared(point_a, point_b):
+    return (point_a[0] - point_b[0])**2 + (point_a[1] - point_b[1])**2